@@ -1,137 +1,3411 @@
 # connector.py
-from js import window
-from pyodide.ffi import create_proxy
-import traceback, json
+try:
+    import js
+    from pyodide.ffi import create_once_callable, create_proxy, to_js
+except ImportError:
+    # Plain CPython (tests, benchmarks): only the RecordingBackend is usable
+    js = create_once_callable = create_proxy = to_js = None
+# None inside a Web Worker, where the WorkerBackend is used instead
+window = getattr(js, 'window', None)
+from array import array
+import copy, traceback, json, weakref
+import heapq, itertools, math, random, struct, time
+from collections import OrderedDict, Counter, deque
+from operator import attrgetter
 
-import importlib
-import sys  # needed earlier for module registration
+import importlib, importlib.util
+import hashlib, marshal, os, sys
 
-ACTIVE_TEXTINPUT = None  # utilisé pour recevoir les frappes clavier
-ACTIVE_SLIDER = None  # slider actuellement en cours de « drag »
+# main.js injects the page's 2D context before running this file; otherwise
+# run_kivy_app() asks the backend for one.
+ctx = globals().get('ctx')
+
+# ------------------------------------------------------------
+#  Invalidation : on ne redessine que si quelque chose a changé
+# ------------------------------------------------------------
+_NEEDS_REDRAW = True      # the tree changed since the last rendered frame
+_REQUEST_FRAME = None     # installed by run_kivy_app, (re)arms requestAnimationFrame
+FRAME_STATS = {'rendered': 0, 'skipped': 0}
+
+def request_frame():
+    """Ask the frame loop for one more tick (no-op before run_kivy_app)."""
+    if _REQUEST_FRAME is not None:
+        _REQUEST_FRAME()
+
+def mark_dirty():
+    """Flag the widget tree for redraw and wake the frame loop if idle."""
+    global _NEEDS_REDRAW
+    _NEEDS_REDRAW = True
+    request_frame()
+
+def frame_stats():
+    """Rendered vs. skipped frame counters (skipped = woken but clean)."""
+    stats = dict(FRAME_STATS)
+    total = stats['rendered'] + stats['skipped']
+    stats['skip_ratio'] = stats['skipped'] / total if total else 0.0
+    return stats
+
+# ------------------------------------------------------------
+#  Propriétés Kivy : descripteurs, stockage par instance (__slots__)
+# ------------------------------------------------------------
+class Property:
+    """
+    Base descriptor for Kivy-style properties.
+
+    The value lives on the instance, in a ``_p_<name>`` slot added by
+    ``WidgetMetaclass`` (or in ``__dict__`` for classes without
+    ``__slots__``).  Assigning a different value notifies the owner through
+    ``_property_changed`` (redraw, layout, ``bind`` observers); plain
+    attributes never pay that cost.
+    """
+    __slots__ = ('name', 'slot', 'defaultvalue', 'allownone', 'refs', '_get')
+
+    def __init__(self, defaultvalue=None, allownone=False, **kwargs):
+        self.defaultvalue = defaultvalue
+        self.allownone = allownone or defaultvalue is None
+        self.refs = ()
+        self.name = self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = '_p_' + name
+        self._get = attrgetter(self.slot)
+
+    def default(self):
+        return self.defaultvalue
+
+    def convert(self, value):
+        return value
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            return self._get(obj)
+        except AttributeError:
+            return self.defaultvalue
+
+    def _store(self, obj, value):
+        """Store ``value``; notify and return True if it changed."""
+        if value is not None or not self.allownone:
+            value = self.convert(value)
+        try:
+            old = self._get(obj)
+        except AttributeError:
+            old = self.defaultvalue
+        if old is value or (type(old) is type(value) and old == value):
+            return False
+        object.__setattr__(obj, self.slot, value)
+        notify = getattr(obj, '_property_changed', None)
+        if notify is not None:
+            notify(self.name, value)
+        return True
+
+    def __set__(self, obj, value):
+        if self._store(obj, value) and self.refs:
+            # pos/size observers only need the tuple when someone listens
+            bindings = getattr(obj, '_bindings', None)
+            if bindings:
+                for ref in self.refs:
+                    if ref.name in bindings:
+                        obj._property_changed(ref.name, ref.__get__(obj))
+
+class NumericProperty(Property):
+    __slots__ = ()
+    def __init__(self, defaultvalue=0, **kwargs):
+        super().__init__(defaultvalue, **kwargs)
+    def convert(self, value):
+        if not isinstance(value, (int, float)):
+            raise ValueError(f"{self.name} accepts only numbers, got {value!r}")
+        return value
+
+class StringProperty(Property):
+    __slots__ = ()
+    def __init__(self, defaultvalue='', **kwargs):
+        super().__init__(defaultvalue, **kwargs)
+    def convert(self, value):
+        return value if isinstance(value, str) else str(value)
+
+class BooleanProperty(Property):
+    __slots__ = ()
+    def __init__(self, defaultvalue=False, **kwargs):
+        super().__init__(defaultvalue, **kwargs)
+    def convert(self, value):
+        return bool(value)
+
+class ObjectProperty(Property):
+    __slots__ = ()
+
+class OptionProperty(Property):
+    __slots__ = ('options',)
+    def __init__(self, defaultvalue=None, options=(), **kwargs):
+        super().__init__(defaultvalue, **kwargs)
+        self.options = tuple(options)
+    def convert(self, value):
+        if self.options and value not in self.options:
+            raise ValueError(f"{self.name} must be one of {self.options}, got {value!r}")
+        return value
+
+class ListProperty(Property):
+    __slots__ = ()
+    def __init__(self, defaultvalue=None, **kwargs):
+        super().__init__([] if defaultvalue is None else defaultvalue, **kwargs)
+        self.allownone = kwargs.get('allownone', False)
+    def default(self):
+        return list(self.defaultvalue)   # never share the default list
+    def convert(self, value):
+        return list(value)
+
+class DictProperty(Property):
+    __slots__ = ()
+    def __init__(self, defaultvalue=None, **kwargs):
+        super().__init__({} if defaultvalue is None else defaultvalue, **kwargs)
+        self.allownone = kwargs.get('allownone', False)
+    def default(self):
+        return dict(self.defaultvalue)
+
+class ReferenceListProperty(Property):
+    """Tuple view over other properties, e.g. ``pos = (x, y)``."""
+    __slots__ = ('props',)
+    def __init__(self, *props):
+        super().__init__(None)
+        self.props = props
+        for prop in props:
+            prop.refs += (self,)
+    def __set_name__(self, owner, name):
+        self.name = name
+        # attrgetter with several names builds the tuple in C
+        self._get = attrgetter(*[prop.slot for prop in self.props])
+    def default(self):
+        return None
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return self._get(obj)
+    def __set__(self, obj, value):
+        changed = False
+        for prop, item in zip(self.props, value):
+            changed = prop._store(obj, item) or changed
+        if changed:
+            obj._property_changed(self.name, self.__get__(obj))
+
+class _HintProperty(NumericProperty):
+    """size_hint_x / size_hint_y: remember that the hint was set explicitly."""
+    __slots__ = ('axis',)
+    def __init__(self, axis):
+        super().__init__(None, allownone=True)
+        self.axis = axis
+    def _store(self, obj, value):
+        obj._hint_set[self.axis] = True
+        return super()._store(obj, value)
+
+_FACTORY_CLASSES = {}   # class name -> widget class (kivy.factory.Factory)
+_KV_RULES = []          # KV class rules loaded by the Builder
+
+class WidgetMetaclass(type):
+    """
+    Add a storage slot per declared property and collect their defaults.
+
+    On widget classes every property is then exposed through a builtin
+    ``property(attrgetter(slot), setter)`` so reads stay C-level; the
+    descriptors themselves remain available via ``cls.properties()``.
+    Classes are registered with the Factory, and the KV rules matching a
+    class are applied once its instances are built.
+    """
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' in namespace:
+            storage = tuple('_p_' + key for key, value in namespace.items()
+                            if isinstance(value, Property)
+                            and not isinstance(value, ReferenceListProperty))
+            namespace['__slots__'] = tuple(namespace['__slots__']) + storage
+        own = {key: value for key, value in namespace.items() if isinstance(value, Property)}
+        cls = super().__new__(mcs, name, bases, namespace)
+        registry = {}
+        for base in reversed(cls.__mro__[1:]):
+            registry.update(getattr(base, '_properties', {}))
+        registry.update(own)
+        cls._properties = registry
+        cls._property_defaults = tuple(prop for prop in registry.values()
+                                       if not isinstance(prop, ReferenceListProperty))
+        for key, prop in own.items():
+            setattr(cls, key, property(prop._get, prop.__set__))
+        _FACTORY_CLASSES[name] = cls
+        return cls
+
+    def __call__(cls, *args, **kwargs):
+        self = super().__call__(*args, **kwargs)
+        # Constructor arguments win over the KV rules
+        if _KV_RULES and Builder.apply(self, kwargs):
+            on_kv_post = getattr(self, 'on_kv_post', None)
+            if on_kv_post is not None:
+                on_kv_post(self)
+        return self
+
+    def properties(cls):
+        """Declared properties by name (Kivy's ``EventDispatcher.properties``)."""
+        return dict(cls._properties)
+
+# Attributes that invalidate layouts when they change
+_PARENT_LAYOUT_PROPS = frozenset(('size', 'width', 'height', 'size_hint_x', 'size_hint_y'))
+_SELF_LAYOUT_PROPS = frozenset(('x', 'y', 'size', 'width', 'height', 'spacing',
+                                'orientation', 'padding', 'cols', 'row_default_height',
+                                'scroll_y'))
+_LAYOUT_PROPS = _PARENT_LAYOUT_PROPS | _SELF_LAYOUT_PROPS
+
+# ------------------------------------------------------------
+#  Bindings : notifications différées, une par (widget, propriété) et par frame
+# ------------------------------------------------------------
+# widget._bindings: name -> {callback key: (uid, ref, weak, args, kwargs)}.
+# Keying by callback makes unbind/funbind O(1); bound methods are held
+# through WeakMethod so a binding never keeps a discarded widget alive.
+_PENDING_BINDINGS = {}   # (widget, name) -> latest value, in first-change order
+_binding_uids = itertools.count(1)
+
+def _binding_key(callback, args):
+    owner = getattr(callback, '__self__', None)
+    func = getattr(callback, '__func__', None)
+    key = ((func, id(owner)) if func is not None and owner is not None else callback, args)
+    try:
+        hash(key)
+    except TypeError:
+        key = (key[0], tuple(map(id, args)))
+    return key
+
+def _make_binding(callback, args, kwargs):
+    ref, weak = callback, False
+    if getattr(callback, '__self__', None) is not None and hasattr(callback, '__func__'):
+        try:
+            ref, weak = weakref.WeakMethod(callback), True
+        except TypeError:
+            pass
+    return (next(_binding_uids), ref, weak, args, kwargs)
+
+def _call_bindings(widget, callbacks, values):
+    for key, (_, ref, weak, args, kwargs) in list(callbacks.items()):
+        if weak:
+            callback = ref()
+            if callback is None:     # owner collected: drop the binding
+                callbacks.pop(key, None)
+                continue
+        else:
+            callback = ref
+        try:
+            callback(*args, widget, *values, **kwargs)
+        except Exception:
+            # Silently ignore callback errors to avoid breaking the draw loop
+            pass
+
+def flush_bindings(max_passes=8):
+    """Deliver queued property changes: each (widget, property) once, with its latest value.
+
+    The frame loop calls it between the event and layout phases; changes
+    made by the callbacks are delivered in a further pass.  Returns True
+    if changes are still pending after ``max_passes`` (next frame).
+    """
+    for _ in range(max_passes):
+        if not _PENDING_BINDINGS:
+            return False
+        pending = dict(_PENDING_BINDINGS)
+        _PENDING_BINDINGS.clear()
+        for (widget, name), value in pending.items():
+            bindings = widget._bindings
+            callbacks = bindings.get(name) if bindings else None
+            if callbacks:
+                _call_bindings(widget, callbacks, (value,))
+    if _PENDING_BINDINGS:
+        request_frame()
+        return True
+    return False
 
 # --- Base widget ---
-class WidgetLite:
+class WidgetLite(metaclass=WidgetMetaclass):
+    # '__dict__' keeps arbitrary user attributes possible; it is only
+    # allocated for instances that actually use it.
+    __slots__ = ('children', '_bindings', '_hint_set', '_layer', '_layer_valid', '_canvas',
+                 '__dict__', '__weakref__')
+
+    parent = ObjectProperty(None)
+    x = NumericProperty(0)
+    y = NumericProperty(0)
+    pos = ReferenceListProperty(x, y)
+    width = NumericProperty(100)
+    height = NumericProperty(30)
+    size = ReferenceListProperty(width, height)
+    size_hint_x = _HintProperty(0)
+    size_hint_y = _HintProperty(1)
+    size_hint = ReferenceListProperty(size_hint_x, size_hint_y)
+    spacing = NumericProperty(0)
+    # Generic transparency like Kivy's `opacity` (0‒1 float)
+    opacity = NumericProperty(1.0)
+    # Opt-in offscreen bitmap cache of the whole subtree (see LayerCache)
+    cache = BooleanProperty(False)
+    cache_margin = NumericProperty(2)
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls)
+        self.children = []
+        self._bindings = None
+        self._hint_set = [False, False]
+        self._layer = None
+        self._layer_valid = False
+        self._canvas = None
+        setslot = object.__setattr__
+        for prop in cls._property_defaults:
+            setslot(self, prop.slot, prop.default())
+        return self
+
     def __init__(self, **kwargs):
         self.x = kwargs.get('x', 0)
         self.y = kwargs.get('y', 0)
         self.size = kwargs.get('size', (100, 30))
-        # Layout hints (Kivy style, optional)
-        self.size_hint_x = kwargs.get('size_hint_x', None)
-        self.size_hint_y = kwargs.get('size_hint_y', None)
+        # Layout hints (Kivy style, optional).  None on the main axis keeps the
+        # explicit size; on the cross axis an *explicit* None (size_hint=(None,
+        # None), size_hint_y=None, ...) keeps it too instead of stretching.
+        self.size_hint = kwargs.get('size_hint', (kwargs.get('size_hint_x'),
+                                                  kwargs.get('size_hint_y')))
+        self._hint_set = ['size_hint' in kwargs or 'size_hint_x' in kwargs,
+                          'size_hint' in kwargs or 'size_hint_y' in kwargs]
         self.spacing = kwargs.get('spacing', 0)
-        # Generic transparency like Kivy's `opacity` (0‒1 float)
         self.opacity = kwargs.get('opacity', 1.0)
-        self.width = self.size[0]
-        self.height = self.size[1]
-        self.children = []
-        self._bindings = {}
+        self.cache = kwargs.get('cache', False)
+
     # ------------------------------------------------------------------
-    #  Notify `bind()` listeners when an attribute value changes.
+    #  Notify `bind()` listeners when a property value changes.
     # ------------------------------------------------------------------
-    def __setattr__(self, name, value):
+    def _property_changed(self, name, value):
         """
-        Extended setattr that preserves normal assignment semantics
-        *and* triggers callbacks registered via ``bind(attr=callback)``.
+        Called by the property descriptors when a value really changed.
 
-        This keeps the syntax ``widget.bind(active=fn)`` working for
-        arbitrary properties (e.g. Checkbox → `active`) just like in
-        real Kivy, without requiring widgets to manually call bound
-        functions every time they mutate their own attributes.
+        Invalidates the frame / layouts / hit index right away, and queues
+        the change for the ``bind()`` observers (e.g. Checkbox → `active`):
+        they get the latest value once per frame, from ``flush_bindings()``.
         """
-        # Previous value (may be missing during __init__)
-        old_val = self.__dict__.get(name, None)
+        # Any real change invalidates the current frame
+        if not _NEEDS_REDRAW:
+            mark_dirty()
+        if name in _LAYOUT_PROPS:
+            self._geometry_changed(name)
+        if LAYER_CACHE.layers:
+            self._invalidate_layers()
+        bindings = self._bindings
+        if bindings and bindings.get(name):
+            if not _PENDING_BINDINGS:
+                request_frame()
+            _PENDING_BINDINGS[(self, name)] = value
 
-        # Standard attribute assignment
-        super().__setattr__(name, value)
-
-        # Fire callbacks only when the attribute really changed
-        if (name in getattr(self, "_bindings", {})) and (old_val != value):
-            for cb in self._bindings.get(name, []):
-                try:
-                    cb(self, value)
-                except Exception:
-                    # Silently ignore callback errors to avoid breaking the draw loop
-                    pass
+    @property
+    def canvas(self):
+        """Instructions drawn with the widget (``canvas.before`` / ``canvas.after``)."""
+        if self._canvas is None:
+            self._canvas = Canvas(owner=self)
+        return self._canvas
 
-    def add_widget(self, widget): self.children.append(widget)
-    def remove_widget(self, widget): self.children.remove(widget)
+    def add_widget(self, widget):
+        if isinstance(widget, Instruction):
+            # Old-style Rectangle / Line / Ellipse children: onto the canvas
+            self.canvas.add(widget)
+            return
+        self.children.append(widget)
+        if isinstance(widget, WidgetLite):
+            widget.parent = self
+        self._invalidate_layers()
+        HIT_INDEX.invalidate()
+        mark_dirty()
+    def remove_widget(self, widget):
+        if isinstance(widget, Instruction):
+            self.canvas.remove(widget)
+            return
+        self.children.remove(widget)
+        if isinstance(widget, WidgetLite):
+            widget.parent = None
+        self._invalidate_layers()
+        HIT_INDEX.invalidate()
+        mark_dirty()
     def clear_widgets(self):
         """Remove all child widgets (Kivy compatibility)."""
+        for child in self.children:
+            if isinstance(child, WidgetLite):
+                child.parent = None
         self.children.clear()
+        self._invalidate_layers()
+        HIT_INDEX.invalidate()
+        mark_dirty()
+
+    def _invalidate_layers(self):
+        # A change anywhere in a cached subtree stales the cached bitmap
+        widget = self
+        while widget is not None:
+            widget._layer_valid = False
+            widget = widget.parent
+    def _layer_margin(self):
+        """Extra pixels around the widget captured in its cached layer."""
+        return self.cache_margin
+
+    def _geometry_changed(self, name):
+        if self in HIT_INDEX.entries:
+            HIT_INDEX.moved(self)
+        # A hinted/sized child moved the goalposts of its parent layout
+        parent = self.parent
+        if (name in _PARENT_LAYOUT_PROPS and isinstance(parent, Layout)
+                and not parent._in_layout):
+            parent._trigger_layout()
+
+    def bind(self, **kwargs):
+        """Register callbacks for property changes / events (simplified)."""
+        for attr, callback in kwargs.items():
+            if callable(callback):
+                self.fbind(attr, callback)
+        # Return a noop object to mimic Kivy's Binding reference
+        return lambda *a, **k: None
+
+    def fbind(self, name, callback, *args, **kwargs):
+        """Bind ``callback(*args, instance, value, **kwargs)``; returns its uid."""
+        if self._bindings is None:
+            self._bindings = {}
+        callbacks = self._bindings.setdefault(name, {})
+        key = _binding_key(callback, args)
+        binding = callbacks.get(key)
+        if binding is None or (binding[2] and binding[1]() is None):
+            binding = callbacks[key] = _make_binding(callback, args, kwargs)
+        return binding[0]
+
+    def unbind(self, **kwargs):
+        for name, callback in kwargs.items():
+            self.funbind(name, callback)
+
+    def funbind(self, name, callback, *args, **kwargs):
+        """Remove a binding made with ``fbind(name, callback, *args)``."""
+        callbacks = self._bindings.get(name) if self._bindings else None
+        if callbacks:
+            callbacks.pop(_binding_key(callback, args), None)
+
+    def unbind_uid(self, name, uid):
+        callbacks = self._bindings.get(name) if self._bindings else None
+        for key, binding in list((callbacks or {}).items()):
+            if binding[0] == uid:
+                del callbacks[key]
+                return
+
+    def dispatch(self, event, *args):
+        """Call the callbacks bound to ``event`` with ``(self, *args)``."""
+        bindings = self._bindings
+        callbacks = bindings.get(event) if bindings else None
+        if callbacks:
+            _call_bindings(self, callbacks, args)
+
+    def setter(self, attr_name):
+        """Return a simple setter function (Kivy compatibility)."""
+        def _set(instance, value):
+            # Properties notify their own observers
+            setattr(self, attr_name, value)
+        return _set
+    # width/height and size are the same storage now; kept for old callers
+    def _update_scalar_sizes(self):
+        pass
+    def collide_point(self, x, y):
+        return self.x <= x <= self.x + self.size[0] and self.y <= y <= self.y + self.size[1]
+    def hit_children(self):
+        """Children that can receive pointer events, in paint order."""
+        return self.children
+    def on_touch_down(self, touch):
+        # Parcourt les enfants en sens inverse pour gérer le z‑order implicite
+        tried = _TOUCH_TRIED   # already offered this touch by dispatch_touch_down
+        for child in reversed(self.children):
+            if child in tried:
+                continue
+            if hasattr(child, 'on_touch_down') and child.on_touch_down(touch):
+                return True  # événement consommé
+        return False
+    # Only called for touches this widget grabbed (see MotionEvent.grab)
+    def on_touch_move(self, touch):
+        return False
+    def on_touch_up(self, touch):
+        return False
+    def draw(self):
+        """Dessine récursivement en ignorant les objets sans .draw(),
+        et loggue les erreurs plutôt que de casser la boucle JS."""
+        canvas = self._canvas
+        if canvas is not None and canvas.children:
+            canvas.draw()   # between the widget's own drawing and its children
+        for child in self.children:
+            if not isinstance(child, WidgetLite):
+                continue
+            if callable(getattr(child, "draw", None)):
+                try:
+                    draw_widget(child)
+                except Exception as exc:
+                    report_error(f"Draw error in child {child!r}: {exc}")
+
+# Alias pour compatibilité Kivy
+class Widget(WidgetLite):
+    """Alias minimal pour `kivy.uix.widget.Widget`."""
+    __slots__ = ()
+
+# ------------------------------------------------------------
+#  Hit-testing : index spatial (grille uniforme) des widgets interactifs
+# ------------------------------------------------------------
+class _PointerEvent:
+    """Pointer event with coordinates read from the DOM event once."""
+    __slots__ = ('x', 'y', 'button')
+    def __init__(self, x, y, button=0):
+        self.x, self.y, self.button = x, y, button
+    @classmethod
+    def from_dom(cls, evt):
+        return cls(float(evt.clientX), float(evt.clientY), int(evt.button or 0))
+    # Widgets written against raw DOM events keep working
+    @property
+    def clientX(self): return self.x
+    @property
+    def clientY(self): return self.y
+    @property
+    def pos(self): return (self.x, self.y)
+
+_BUTTONS = ('left', 'middle', 'right')
+
+class MotionEvent:
+    """
+    Kivy-style touch: one per pointer in contact (mouse button, pen, finger).
+
+    Created on pointerdown and updated in place until pointerup, so
+    several can be active at once.  ``pos`` / ``opos`` / ``ppos`` are the
+    current, initial and previous positions in window pixels.  Moves and
+    the release only reach the widgets that ``grab()``-ed the touch, with
+    ``grab_current`` set to the widget being called.
+    """
+    __slots__ = ('uid', 'id', 'device', 'button', 'x', 'y', 'ox', 'oy', 'px', 'py',
+                 'time_start', 'time_update', 'time_end', 'grab_list', 'grab_current',
+                 'grab_state', 'ud')
+    is_touch = True
+    _uids = itertools.count(1)
+
+    def __init__(self, id, x, y, device='mouse', button=0, time=0.0):
+        self.uid = next(MotionEvent._uids)
+        self.id = id
+        self.device = device
+        self.button = _BUTTONS[button] if 0 <= button < len(_BUTTONS) else 'left'
+        self.x = self.ox = self.px = x
+        self.y = self.oy = self.py = y
+        self.time_start = self.time_update = time
+        self.time_end = -1
+        self.grab_list = []       # weak references to the grabbing widgets
+        self.grab_current = None
+        self.grab_state = False
+        self.ud = {}              # user data, free for widgets
+
+    @classmethod
+    def from_dom(cls, evt, time=0.0):
+        return cls(int(evt.pointerId or 0), float(evt.clientX), float(evt.clientY),
+                   evt.pointerType or 'mouse', int(evt.button or 0), time)
+
+    def move(self, x, y, time=0.0):
+        self.px, self.py = self.x, self.y
+        self.x, self.y = x, y
+        self.time_update = time
+
+    def grab(self, widget):
+        """Receive this touch's moves and release, wherever the pointer goes."""
+        ref = weakref.ref(widget)
+        if ref not in self.grab_list:
+            self.grab_list.append(ref)
+
+    def ungrab(self, widget):
+        ref = weakref.ref(widget)
+        if ref in self.grab_list:
+            self.grab_list.remove(ref)
+
+    @property
+    def pos(self): return (self.x, self.y)
+    @property
+    def opos(self): return (self.ox, self.oy)
+    @property
+    def ppos(self): return (self.px, self.py)
+    @property
+    def dx(self): return self.x - self.px
+    @property
+    def dy(self): return self.y - self.py
+    @property
+    def dpos(self): return (self.x - self.px, self.y - self.py)
+    # Widgets written against raw DOM events keep working
+    @property
+    def clientX(self): return self.x
+    @property
+    def clientY(self): return self.y
+
+    def __repr__(self):
+        return f'<MotionEvent uid={self.uid} {self.device}#{self.id} pos={self.pos}>'
+
+class _HitEntry:
+    __slots__ = ('widget', 'z', 'clip', 'x0', 'y0', 'x1', 'y1', 'cells')
+
+class HitIndex:
+    """
+    Uniform-grid index of the widgets that handle pointer events.
+
+    Only widgets overriding ``on_touch_down`` (or defining ``on_enter`` /
+    ``on_leave`` for hover, ``on_mouse_wheel`` for scrolling) are indexed, with their paint order as z.
+    Structural changes (add/remove, screen switch, popup open) trigger a
+    full rebuild on the next query; geometry changes just move the
+    affected entries between cells.
+    """
+    CELL = 64
+
+    def __init__(self):
+        self.root = None
+        self.entries = {}
+        self._cells = {}
+        self._stale = True
+        self._moved = set()
+        self.rebuilds = 0
+
+    def invalidate(self):
+        self._stale = True
+
+    def moved(self, widget):
+        self._moved.add(widget)
+
+    @staticmethod
+    def _wants(widget):
+        cls = type(widget)
+        return (cls.on_touch_down is not WidgetLite.on_touch_down
+                or hasattr(widget, 'on_enter') or hasattr(widget, 'on_leave')
+                or hasattr(widget, 'on_mouse_wheel'))
+
+    def _place(self, entry):
+        w = entry.widget
+        x0, y0 = w.x, w.y
+        x1, y1 = x0 + w.size[0], y0 + w.size[1]
+        clip = entry.clip
+        if clip is not None:
+            x0, y0 = max(x0, clip[0]), max(y0, clip[1])
+            x1, y1 = min(x1, clip[2]), min(y1, clip[3])
+        entry.x0, entry.y0, entry.x1, entry.y1 = x0, y0, x1, y1
+        cells = []
+        if x0 <= x1 and y0 <= y1:
+            c = self.CELL
+            for cx in range(int(x0 // c), int(x1 // c) + 1):
+                for cy in range(int(y0 // c), int(y1 // c) + 1):
+                    self._cells.setdefault((cx, cy), []).append(entry)
+                    cells.append((cx, cy))
+        entry.cells = cells
+
+    def _unplace(self, entry):
+        for key in entry.cells:
+            bucket = self._cells[key]
+            bucket.remove(entry)
+            if not bucket:
+                del self._cells[key]
+
+    def rebuild(self):
+        self.entries.clear()
+        self._cells.clear()
+        self._moved.clear()
+        self._stale = False
+        self.rebuilds += 1
+        if self.root is None:
+            return
+        z = 0
+        stack = [(self.root, None)]
+        while stack:
+            widget, clip = stack.pop()
+            if isinstance(widget, WidgetLite) and self._wants(widget):
+                entry = _HitEntry()
+                entry.widget, entry.z, entry.clip = widget, z, clip
+                self.entries[widget] = entry
+                self._place(entry)
+                z += 1
+            own_clip = getattr(widget, 'hit_clip', None)
+            if own_clip is not None:
+                x0, y0, x1, y1 = own_clip()
+                clip = (x0, y0, x1, y1) if clip is None else (
+                    max(x0, clip[0]), max(y0, clip[1]), min(x1, clip[2]), min(y1, clip[3]))
+            children = widget.hit_children() if hasattr(widget, 'hit_children') else ()
+            # Depth-first, paint order: push in reverse so the first child pops first
+            for child in reversed(children):
+                stack.append((child, clip))
+
+    def _refresh(self):
+        if self._stale:
+            self.rebuild()
+        elif self._moved:
+            for widget in self._moved:
+                entry = self.entries.get(widget)
+                if entry is not None:
+                    self._unplace(entry)
+                    self._place(entry)
+            self._moved.clear()
+
+    def query(self, x, y):
+        """Indexed widgets under (x, y), topmost first."""
+        self._refresh()
+        c = self.CELL
+        bucket = self._cells.get((int(x // c), int(y // c)))
+        if not bucket:
+            return []
+        hits = [e for e in bucket if e.x0 <= x <= e.x1 and e.y0 <= y <= e.y1]
+        hits.sort(key=lambda e: e.z, reverse=True)
+        return [e.widget for e in hits]
+
+HIT_INDEX = HitIndex()
+_HOVERED = [None]
+_TOUCH_TRIED = set()   # widgets offered the current touch (see WidgetLite.on_touch_down)
+
+def dispatch_touch_down(touch):
+    """
+    Send a touch to the widgets under it, topmost first, until consumed.
+
+    Unlike Kivy, where every widget sees the touch, only widgets whose box
+    contains it are called, plus the children a parent walks with
+    ``super().on_touch_down(touch)`` (each widget is offered it once).
+    """
+    focused = Window.focus_widget
+    consumed = False
+    base = WidgetLite.on_touch_down
+    tried = _TOUCH_TRIED
+    try:
+        for widget in HIT_INDEX.query(touch.x, touch.y):
+            # Indexed for hover/wheel only: its children are indexed themselves
+            if type(widget).on_touch_down is base or widget in tried:
+                continue
+            tried.add(widget)
+            if widget.on_touch_down(touch):
+                consumed = True
+                break
+    finally:
+        tried.clear()
+    # Clicking elsewhere blurs the focused TextInput
+    if (focused is not None and Window.focus_widget is focused
+            and not focused.collide_point(touch.x, touch.y)):
+        Window.set_focus(None)
+    return consumed
+
+def _dispatch_grabbed(touch, method):
+    consumed = False
+    for ref in list(touch.grab_list):
+        widget = ref()
+        if widget is None:
+            touch.grab_list.remove(ref)
+            continue
+        touch.grab_current, touch.grab_state = widget, True
+        try:
+            consumed = bool(getattr(widget, method)(touch)) or consumed
+        finally:
+            touch.grab_current, touch.grab_state = None, False
+    return consumed
+
+def dispatch_touch_move(touch):
+    """Send a moved touch to the widgets that grabbed it."""
+    return _dispatch_grabbed(touch, 'on_touch_move')
+
+def dispatch_touch_up(touch):
+    """Send a released touch to the widgets that grabbed it, then drop the grabs."""
+    consumed = _dispatch_grabbed(touch, 'on_touch_up')
+    touch.grab_list.clear()
+    return consumed
+
+def dispatch_hover(touch):
+    """Update hover state (``hovering`` / on_enter / on_leave) from the index."""
+    hits = HIT_INDEX.query(touch.x, touch.y)
+    top = hits[0] if hits else None
+    previous = _HOVERED[0]
+    if top is previous:
+        return
+    _HOVERED[0] = top
+    for widget, state, event in ((previous, False, 'on_leave'), (top, True, 'on_enter')):
+        if widget is None:
+            continue
+        if hasattr(widget, 'hovering'):
+            widget.hovering = state
+        handler = getattr(widget, event, None)
+        if callable(handler):
+            handler()
+
+def dispatch_wheel(touch, dy):
+    """Scroll the innermost widget under the pointer that handles the wheel."""
+    for widget in HIT_INDEX.query(touch.x, touch.y):
+        handler = getattr(widget, 'on_mouse_wheel', None)
+        if handler is not None and handler(touch, dy):
+            return True
+    return False
+
+# --- Primitive drawings ---
+
+COLOR_MAP = {
+    'primary':'#6200EE', 'accent':'#03DAC6', 'error':'#B00020',
+    'white':'#FFFFFF','black':'#000000','gray':'#9E9E9E',
+    'red':'crimson','green':'seagreen','blue':'steelblue'
+}
+
+# --- Simple fallback for a few Material‑Design icons ----------------------
+ICON_MAP = {
+    "close": "\u2715",   # ×
+    "add":   "\u2795",   # ➕
+    "cog":   "\u2699",   # ⚙
+    "star":  "\u2605",   # ★
+}
+md_icons = ICON_MAP   # kivymd.icon_definitions (grows with register_icon_font)
+
+# CSS string of every color value seen since the last theme change
+_CSS_CACHE = {}
+
+def _rgba_css(r, g, b, a=1):
+    return f"rgba({int(r*255)},{int(g*255)},{int(b*255)},{a})"
+
+def resolve_color(color):
+    """CSS string for a COLOR_MAP key, a CSS color, a ``Color`` or an RGBA (0‒1) sequence.
+
+    Results are cached until ``refresh_colors()`` (theme change); anything
+    else (gradients, patterns) is returned as is.
+    """
+    try:
+        return _CSS_CACHE[color]
+    except KeyError:
+        key = color
+    except TypeError:          # list: cache it under its tuple
+        key = tuple(color)
+        css = _CSS_CACHE.get(key)
+        if css is not None:
+            return css
+    if isinstance(color, str):
+        css = COLOR_MAP.get(color, color)
+    elif isinstance(color, Color):
+        return color.to_css()   # mutable: memoized on the instance
+    elif isinstance(key, tuple) and len(key) in (3, 4):
+        css = _rgba_css(*key)
+    else:
+        return color
+    if len(_CSS_CACHE) >= 4096:   # e.g. tweened RGBA tuples
+        _CSS_CACHE.clear()
+    _CSS_CACHE[key] = css
+    return css
+
+def refresh_colors():
+    """Forget resolved colors (COLOR_MAP / theme changed)."""
+    _CSS_CACHE.clear()
+    mark_dirty()
+
+def set_fill(color): ctx.fillStyle = resolve_color(color)
+
+def set_stroke(color): ctx.strokeStyle = resolve_color(color)
+
+# ------------------------------------------------------------
+#  Draw-list : buffer des commandes Canvas2D, envoyé à JS une fois par frame
+# ------------------------------------------------------------
+# Opcode tables shared with drawlist.js (keep both in sync).
+# Arg layout: 'n' = number, 's' = string (index into the frame string table).
+_DRAW_CALLS = {
+    'clearRect': (0, 'nnnn'), 'fillRect': (1, 'nnnn'), 'strokeRect': (2, 'nnnn'),
+    'rect': (3, 'nnnn'), 'fillText': (4, 'snn'), 'strokeText': (5, 'snn'),
+    'save': (6, ''), 'restore': (7, ''), 'beginPath': (8, ''), 'closePath': (9, ''),
+    'fill': (10, ''), 'stroke': (11, ''), 'clip': (12, ''),
+    'moveTo': (13, 'nn'), 'lineTo': (14, 'nn'), 'arc': (15, 'nnnnn'),
+    'ellipse': (16, 'nnnnnnn'), 'roundRect': (17, 'nnnnn'),
+    'translate': (18, 'nn'), 'scale': (19, 'nn'), 'rotate': (20, 'n'),
+    'setTransform': (21, 'nnnnnn'), 'quadraticCurveTo': (22, 'nnnn'),
+    'bezierCurveTo': (23, 'nnnnnn'),
+    # Offscreen layers (LayerCache): id, x, y, w, h / id, x, y / id
+    'begin_layer': (24, 'nnnnn'), 'end_layer': (25, ''),
+    'draw_layer': (26, 'nnn'), 'drop_layer': (27, 'n'),
+    # Decoded bitmaps (ImageCache): id, x, y, w, h / id
+    'draw_image': (28, 'nnnnn'), 'drop_image': (29, 'n'),
+    # Glyph atlas (IconAtlas): glyph, font, color, x, y, w, h, atlas size /
+    # sx, sy, w, h, dx, dy
+    'atlas_put': (30, 'sssnnnnn'), 'atlas_draw': (31, 'nnnnnn'),
+    # Cached Path2D (PathCache), after the state ops: id, length + that many
+    # command numbers (DrawList.define_path) / id
+    'define_path': (46, 'nn'), 'fill_path': (47, 'n'), 'stroke_path': (48, 'n'),
+    'drop_path': (49, 'n'),
+}
+_DRAW_STATE = {
+    'fillStyle': (32, 's'), 'strokeStyle': (33, 's'), 'font': (34, 's'),
+    'globalAlpha': (35, 'n'), 'lineWidth': (36, 'n'), 'shadowColor': (37, 's'),
+    'shadowBlur': (38, 'n'), 'shadowOffsetX': (39, 'n'), 'shadowOffsetY': (40, 'n'),
+    'textAlign': (41, 's'), 'textBaseline': (42, 's'), 'lineCap': (43, 's'),
+    'lineJoin': (44, 's'), 'globalCompositeOperation': (45, 's'),
+}
+
+def _make_draw_call(code, layout):
+    if not layout:
+        def call(self):
+            self._ops.append(code)
+    elif 's' not in layout:
+        def call(self, *args):
+            nums = self._nums
+            mark = len(nums)
+            if len(args) == len(layout):
+                try:
+                    nums.extend(args)
+                    self._ops.append(code)
+                    return None
+                except TypeError:
+                    del nums[mark:]
+            return self._direct(code, args)
+    elif layout.count('s') > 1:
+        def call(self, *args):
+            nums = self._nums
+            mark = len(nums)
+            if len(args) == len(layout):
+                try:
+                    for kind, arg in zip(layout, args):
+                        nums.append(self._intern(arg) if kind == 's' else arg)
+                    self._ops.append(code)
+                    return None
+                except TypeError:
+                    del nums[mark:]
+            return self._direct(code, args)
+    else:
+        def call(self, text, *args):
+            nums = self._nums
+            mark = len(nums)
+            if len(args) == len(layout) - 1:
+                try:
+                    nums.append(self._intern(text))
+                    nums.extend(args)
+                    self._ops.append(code)
+                    return None
+                except TypeError:
+                    del nums[mark:]
+            return self._direct(code, (text,) + args)
+    return call
+
+class CanvasState:
+    """
+    Shadow of the context's style state (the ``_DRAW_STATE`` properties).
+
+    Mirrors ``save()`` / ``restore()`` with a stack so that writing the
+    value the context already holds can be skipped.  A property missing
+    from ``values`` is unknown and always written.  Offscreen layers start
+    unknown; a canvas resize resets everything (``reset()``).
+    """
+    __slots__ = ('values', 'stack', 'elided')
+
+    def __init__(self):
+        self.values = {}
+        self.stack = []
+        self.elided = 0
+
+    def save(self):
+        self.stack.append(self.values.copy())
+
+    def restore(self):
+        if self.stack:   # like the canvas, an unbalanced restore is ignored
+            self.values = self.stack.pop()
+
+    def begin_layer(self):
+        self.stack.append(self.values)
+        self.values = {}
+
+    def reset(self):
+        self.values = {}
+        self.stack.clear()
+
+class DrawList:
+    """
+    Drop-in replacement for the global Canvas2D ``ctx``.
+
+    Draw calls and state assignments are appended as opcodes to a Python
+    buffer (``array('B')`` + ``array('d')`` + string table) and handed to
+    the backend's sink (the interpreter in ``drawlist.js``, or the
+    RecordingBackend) with a single ``flush()`` per frame.
+    Anything not in the opcode tables (``measureText``, gradients, ...)
+    flushes the pending buffer and goes straight to the real context.
+    Style writes that don't change the tracked ``CanvasState`` are dropped.
+    """
+    __slots__ = ('target', '_sink', '_ops', '_nums', '_strs', '_str_index', '_state')
+
+    def __init__(self, target, sink):
+        object.__setattr__(self, 'target', target)
+        object.__setattr__(self, '_sink', sink)
+        object.__setattr__(self, '_state', CanvasState())
+        self._reset()
+
+    def _reset(self):
+        object.__setattr__(self, '_ops', array('B'))
+        object.__setattr__(self, '_nums', array('d'))
+        object.__setattr__(self, '_strs', [])
+        object.__setattr__(self, '_str_index', {})
+
+    def _intern(self, text):
+        text = str(text)
+        idx = self._str_index.get(text)
+        if idx is None:
+            idx = self._str_index[text] = len(self._strs)
+            self._strs.append(text)
+        return idx
+
+    def _direct(self, code, args):
+        # Unusual signature (e.g. roundRect with a radii list): bypass the buffer
+        self.flush()
+        name = next(n for n, (c, _) in _DRAW_CALLS.items() if c == code)
+        return getattr(self.target, name)(*args)
+
+    def __len__(self):
+        return len(self._ops)
+
+    def flush(self):
+        """Send the buffered commands to the sink in one call and clear the buffer."""
+        if not self._ops:
+            return
+        ops, nums, strs = self._ops, self._nums, self._strs
+        self._reset()
+        self._sink(ops, nums, strs)
+
+    def reset_state(self):
+        """The context lost its state (canvas resized): forget the shadow."""
+        self._state.reset()
+
+    def save(self):
+        self._state.save()
+        self._ops.append(6)
+
+    def restore(self):
+        self._state.restore()
+        self._ops.append(7)
+
+    def begin_layer(self, *args):
+        self._state.begin_layer()
+        _begin_layer(self, *args)
+
+    def end_layer(self):
+        self._state.restore()
+        self._ops.append(25)
+
+    def define_path(self, path_id, commands):
+        # Variable length: the command buffer follows its length
+        nums = self._nums
+        nums.append(path_id)
+        nums.append(len(commands))
+        nums.extend(commands)
+        self._ops.append(46)
+
+    def __setattr__(self, name, value):
+        spec = _DRAW_STATE.get(name)
+        if spec is None or (spec[1] == 's' and not isinstance(value, str)):
+            # Unknown property or non-string style (gradient, pattern…)
+            self.flush()
+            self._state.values.pop(name, None)
+            setattr(self.target, name, value)
+            return
+        state = self._state
+        values = state.values
+        if name in values and values[name] == value:
+            state.elided += 1
+            return
+        values[name] = value
+        self._ops.append(spec[0])
+        self._nums.append(self._intern(value) if spec[1] == 's' else value)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in _DRAW_STATE and name in self._state.values:
+            return self._state.values[name]
+        self.flush()
+        return getattr(self.target, name)
+
+for _name, (_code, _layout) in _DRAW_CALLS.items():
+    if _name not in DrawList.__dict__:
+        setattr(DrawList, _name, _make_draw_call(_code, _layout))
+del _name, _code, _layout
+_begin_layer = _make_draw_call(*_DRAW_CALLS['begin_layer'])
+
+class ShadowContext:
+    """
+    Raw-context counterpart of DrawList's state tracking, used when the
+    backend has no draw-list sink: redundant style writes never reach JS.
+    """
+    __slots__ = ('target', '_state')
+
+    def __init__(self, target):
+        object.__setattr__(self, 'target', target)
+        object.__setattr__(self, '_state', CanvasState())
+
+    def reset_state(self):
+        self._state.reset()
+
+    def save(self):
+        self._state.save()
+        self.target.save()
+
+    def restore(self):
+        self._state.restore()
+        self.target.restore()
+
+    def __setattr__(self, name, value):
+        values = self._state.values
+        if name in _DRAW_STATE:
+            if name in values and values[name] == value:
+                self._state.elided += 1
+                return
+            values[name] = value
+        setattr(self.target, name, value)
+
+    def __getattr__(self, name):
+        if name in _DRAW_STATE and name in self._state.values:
+            return self._state.values[name]
+        return getattr(self.target, name)
+
+def _flush_ctx():
+    flush = getattr(ctx, 'flush', None)
+    if flush is not None:
+        flush()
+
+# ------------------------------------------------------------
+#  Entrées : Pointer Events mis en file côté JS, un lot par frame
+# ------------------------------------------------------------
+# Wire format shared with input.js (keep both in sync): one record of
+# INPUT_RECORD float64 per event -> kind, x, y, button, delta, key, pointer.
+#   pointer*: pointer = pointerId, delta = index into _POINTER_TYPES
+#   resize: x, y = new width, height      wheel: delta = deltaY in pixels
+#   keydown: key = code point of a one-character key, or -(index + 1)
+#            into _NAMED_KEYS, 0 for anything else
+_INPUT_KINDS = ('pointerdown', 'pointerup', 'pointermove', 'wheel', 'keydown', 'resize',
+                'pointercancel')
+_POINTER_KINDS = frozenset(('pointerdown', 'pointerup', 'pointermove', 'pointercancel'))
+_POINTER_TYPES = ('mouse', 'pen', 'touch')
+_NAMED_KEYS = ('Backspace', 'Enter', 'Tab', 'Escape', 'Delete', 'ArrowLeft',
+               'ArrowRight', 'ArrowUp', 'ArrowDown', 'Home', 'End',
+               'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'F9', 'F10', 'F11', 'F12')
+INPUT_RECORD = 7
+
+class InputBatch:
+    """
+    Event queue, mirror of ``input.js``.
+
+    ``push()`` appends an event; a ``pointermove`` replaces the pending
+    move of the same pointer, as long as nothing else happened to that
+    pointer in between (one position per pointer and frame is enough).
+    ``pack()`` drains the queue into the wire format, ``extend()`` merges
+    a packed batch back in (coalescing again) and ``unpack()`` turns it
+    into DOM-like events.
+    """
+    _KIND_CODES = {kind: code for code, kind in enumerate(_INPUT_KINDS)}
+    _KEY_CODES = {key: -(i + 1) for i, key in enumerate(_NAMED_KEYS)}
+    _MOVE = _KIND_CODES['pointermove']
+    _ENDS = frozenset(map(_KIND_CODES.get, ('pointerdown', 'pointerup', 'pointercancel')))
+
+    def __init__(self):
+        self._records = array('d')
+        self._moves = {}   # pointer id -> offset of its pending move record
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._records) // INPUT_RECORD
+
+    def push(self, type, clientX=0.0, clientY=0.0, button=0, deltaY=0.0, deltaMode=0,
+             key='', width=0, height=0, pointerId=1, pointerType='mouse'):
+        delta, code, pointer = deltaY, 0, 0
+        if type == 'resize':
+            clientX, clientY = width, height
+        elif type == 'wheel' and deltaMode == 1:
+            delta = deltaY * 16   # lines -> pixels
+        elif type == 'keydown':
+            code = ord(key) if len(key) == 1 else self._KEY_CODES.get(key, 0)
+        elif type in _POINTER_KINDS:
+            pointer = pointerId
+            delta = _POINTER_TYPES.index(pointerType) if pointerType in _POINTER_TYPES else 0
+        self._push(self._KIND_CODES[type], clientX, clientY, button, delta, code, pointer)
+
+    def _push(self, kind, x, y, button, delta, code, pointer):
+        records, moves = self._records, self._moves
+        at = moves.get(pointer) if kind == self._MOVE else None
+        if at is not None:
+            records[at:at + INPUT_RECORD] = array('d', (kind, x, y, button, delta, code, pointer))
+            self.coalesced += 1
+            return
+        if kind == self._MOVE:
+            moves[pointer] = len(records)
+        elif kind in self._ENDS:
+            moves.pop(pointer, None)
+        records.extend((kind, x, y, button, delta, code, pointer))
+
+    def extend(self, data):
+        """Queue the records of a packed batch (bytes)."""
+        records = array('d')
+        records.frombytes(data)
+        for i in range(0, len(records), INPUT_RECORD):
+            self._push(*records[i:i + INPUT_RECORD])
+
+    def pack(self):
+        """Drain the queue; ``b''`` when empty."""
+        data = self._records.tobytes()
+        self._records = array('d')
+        self._moves.clear()
+        return data
+
+    @staticmethod
+    def unpack(data):
+        records = array('d')
+        records.frombytes(data)
+        events = []
+        for i in range(0, len(records), INPUT_RECORD):
+            kind, x, y, button, delta, code, pointer = records[i:i + INPUT_RECORD]
+            type = _INPUT_KINDS[int(kind)]
+            if type in _POINTER_KINDS:
+                events.append(_SyntheticEvent(type, clientX=x, clientY=y, button=int(button),
+                                              pointerId=int(pointer),
+                                              pointerType=_POINTER_TYPES[int(delta)]))
+                continue
+            if code > 0:
+                key = chr(int(code))
+            elif code < 0:
+                key = _NAMED_KEYS[-int(code) - 1]
+            else:
+                key = 'Unidentified'
+            events.append(_SyntheticEvent(type, clientX=x, clientY=y, button=int(button),
+                                          deltaY=delta, key=key))
+        return events
+
+class _BatchedInput:
+    """Event listeners fed from packed input batches, once per frame."""
+    def add_listener(self, event, handler):
+        self.listeners.setdefault(event, []).append(handler)
+    def remove_listener(self, event, handler):
+        handlers = self.listeners.get(event, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def dispatch_batch(self, data):
+        """Dispatch one packed batch (bytes, or a JS ArrayBuffer proxy)."""
+        if hasattr(data, 'to_bytes'):
+            data = data.to_bytes()
+        for evt in InputBatch.unpack(data):
+            if evt.type == 'resize':
+                self.width, self.height = int(evt.clientX), int(evt.clientY)
+            for handler in list(self.listeners.get(evt.type, ())):
+                handler(evt)
+
+# ------------------------------------------------------------
+#  Backends : dessin, métriques fenêtre, événements, frames
+# ------------------------------------------------------------
+class Backend:
+    """
+    What the connector needs from its host.
+
+    A backend provides the raw 2D context (``create_context``), an optional
+    draw-list sink, the window size, DOM-style event listeners, and frame
+    / timer scheduling.  ``run_kivy_app()`` goes through the active backend
+    only, so the same widgets run in Pyodide or headless on CPython.
+    """
+    name = 'abstract'
+
+    def create_context(self):
+        raise NotImplementedError
+    def draw_sink(self):
+        """Callable taking the DrawList buffers ``(ops, nums, strs)``, or None."""
+        return None
+    def window_size(self):
+        raise NotImplementedError
+    def resize_surface(self):
+        pass
+    def add_listener(self, event, handler):
+        raise NotImplementedError
+    def remove_listener(self, event, handler):
+        raise NotImplementedError
+    def on_input(self, callback):
+        """Call ``callback()`` when input gets queued (wakes an idle loop)."""
+        pass
+    def poll_input(self):
+        """Dispatch the input queued since the last frame (start of a frame)."""
+        pass
+    def request_frame(self, callback):
+        raise NotImplementedError
+    def set_timeout(self, callback, ms):
+        raise NotImplementedError
+    def clear_timeout(self, timer_id):
+        raise NotImplementedError
+    def now(self):
+        """Current time in seconds (drives the Clock)."""
+        return time.perf_counter()
+    def report_error(self, *args):
+        print(*args, file=sys.stderr)
+    def first_frame(self):
+        """Called once, after the first rendered frame (startup timing)."""
+        pass
+    def load_image(self, image_id, url, max_width, max_height, done):
+        """Decode ``url`` into bitmap ``image_id`` for the ``draw_image`` op.
+
+        Must not block: ``done(image_id, width, height)`` is called once
+        loaded (downscaled to fit ``max_width`` x ``max_height`` when those
+        are > 0), with width = height = -1 on failure.
+        """
+        done(image_id, -1, -1)
+    def load_font(self, family, url, done):
+        """Make the font file at ``url`` usable as ``family``; then ``done(family, ok)``."""
+        done(family, False)
+    def save_text(self, name, text):
+        """Hand a generated file (profiler trace...) to the user."""
+        with open(name, 'w', encoding='utf-8') as f:
+            f.write(text)
+    def cache_dir(self):
+        """Writable directory kept across runs (compiled KV rules), or None."""
+        return None
+    def sync_cache(self):
+        """Persist what was written to ``cache_dir()``."""
+        pass
+    def storage(self):
+        """Where JsonStore / DictStore persist (JSON files here), or None: memory only."""
+        return _FileStorage()
+    def open_socket(self, url, on_open, on_message, on_close):
+        """Open a binary WebSocket; returns an object with ``send(bytes)`` / ``close()``.
+
+        ``on_message(data)`` gets each message as bytes; ``on_close()`` is
+        called once, also when the connection could not be opened.
+        """
+        raise NotImplementedError
+
+class Canvas2DBackend(_BatchedInput, Backend):
+    """
+    Browser backend (Pyodide): ``<canvas>`` 2D context and ``window``.
+
+    Input comes from the ``webkivyInput`` queue installed by input.js and
+    is polled once per frame; without it, plain DOM listeners are used.
+    """
+    name = 'canvas2d'
+
+    def __init__(self, ctx=None, canvas_id='kivy-canvas'):
+        self.ctx = getattr(ctx, 'target', ctx)
+        self.canvas_id = canvas_id
+        self.scope = window   # global object: timers, rAF, hooks set by JS
+        self.listeners = {}
+        self._proxies = {}    # listener -> persistent JS proxy, until removed
+        self._timers = {}     # timer id -> one-shot proxy, until fired / cleared
+
+    def _proxy(self, fn):
+        proxy = self._proxies.get(fn)
+        if proxy is None:
+            proxy = self._proxies[fn] = create_proxy(fn)
+        return proxy
+
+    def create_context(self):
+        if self.ctx is None:
+            canvas = window.document.getElementById(self.canvas_id)
+            canvas.width, canvas.height = window.innerWidth, window.innerHeight
+            self.ctx = canvas.getContext('2d')
+        return self.ctx
+
+    def draw_sink(self):
+        # Installed by main.js / worker.js (drawlist.js)
+        js_flush = getattr(self.scope, 'webkivyFlush', None)
+        if js_flush is None:
+            return None
+        def sink(ops, nums, strs):
+            js_flush(to_js(memoryview(ops)), to_js(memoryview(nums)), to_js(strs))
+        return sink
+
+    def window_size(self):
+        return (window.innerWidth, window.innerHeight)
+
+    def resize_surface(self):
+        canvas = getattr(self.ctx, 'canvas', None)
+        if canvas is not None:
+            canvas.width, canvas.height = self.window_size()
+
+    def _input_queue(self):
+        return getattr(self.scope, 'webkivyInput', None)
+    def add_listener(self, event, handler):
+        if self._input_queue() is None:
+            window.addEventListener(event, self._proxy(handler))
+        else:
+            super().add_listener(event, handler)
+    def remove_listener(self, event, handler):
+        proxy = self._proxies.pop(handler, None)
+        if proxy is not None:
+            window.removeEventListener(event, proxy)
+            proxy.destroy()
+        else:
+            super().remove_listener(event, handler)
+    def on_input(self, callback):
+        queue = self._input_queue()
+        if queue is not None:
+            queue.onwake = self._proxy(callback)
+    def poll_input(self):
+        queue = self._input_queue()
+        data = queue.take() if queue is not None else None
+        if data is not None:
+            self.dispatch_batch(data)
+    def request_frame(self, callback):
+        self.scope.requestAnimationFrame(self._proxy(callback))
+    def set_timeout(self, callback, ms):
+        # One-shot proxy: a cached one would keep the callback (a store's
+        # flush, a bridge's connect) and its owner alive for good
+        def fire(*args):
+            self._timers.pop(timer_id, None)
+            callback()
+        proxy = create_once_callable(fire)
+        timer_id = self.scope.setTimeout(proxy, ms)
+        self._timers[timer_id] = proxy
+        return timer_id
+    def clear_timeout(self, timer_id):
+        self.scope.clearTimeout(timer_id)
+        proxy = self._timers.pop(timer_id, None)
+        if proxy is not None:
+            proxy.destroy()
+    def report_error(self, *args):
+        js.console.error(*args)
+    def first_frame(self):
+        # Set by main.js / the bundle loader to log the time to first frame
+        hook = getattr(self.scope, 'webkivyFirstFrame', None)
+        if hook is not None:
+            hook()
+    def load_image(self, image_id, url, max_width, max_height, done):
+        # drawlist.js: fetch -> createImageBitmap, kept in its id map
+        load = getattr(self.scope, 'webkivyLoadImage', None)
+        if load is None:
+            return super().load_image(image_id, url, max_width, max_height, done)
+        load(image_id, url, max_width, max_height, create_once_callable(done))
+    def load_font(self, family, url, done):
+        # drawlist.js: FontFace, added to document.fonts (or the worker's)
+        load = getattr(self.scope, 'webkivyLoadFont', None)
+        if load is None:
+            return super().load_font(family, url, done)
+        load(family, url, create_once_callable(done))
+    def save_text(self, name, text):
+        # drawlist.js: browser download (relayed to the page in worker mode)
+        save = getattr(self.scope, 'webkivySave', None)
+        if save is None:
+            return super().save_text(name, text)   # Pyodide FS
+        save(name, text)
+    def cache_dir(self):
+        # store.js mountCache(): IDBFS directory, restored before the app runs
+        return getattr(self.scope, 'webkivyCacheDir', None)
+    def sync_cache(self):
+        sync = getattr(self.scope, 'webkivySyncCache', None)
+        if sync is not None:
+            sync()
+    def storage(self):
+        # IndexedDB (store.js installStore()), else localStorage (not in workers)
+        if all(getattr(self.scope, hook, None) is not None
+               for hook in ('webkivyStoreLoad', 'webkivyStoreWrite')):
+            return _IndexedDBStorage(self.scope)
+        local = getattr(self.scope, 'localStorage', None)
+        return _LocalStorage(local) if local is not None else None
+    def open_socket(self, url, on_open, on_message, on_close):
+        return _JsSocket(self.scope, url, on_open, on_message, on_close)
+
+class _JsSocket:
+    """Browser ``WebSocket`` (page or worker) in binary mode."""
+    def __init__(self, scope, url, on_open, on_message, on_close):
+        uint8 = scope.Uint8Array
+        def _message(evt):
+            on_message(uint8.new(evt.data).to_bytes())
+        def _close(evt):
+            for proxy in self._proxies:   # one socket per connection attempt
+                proxy.destroy()
+            self._proxies = ()
+            on_close()
+        self._proxies = (create_proxy(lambda evt: on_open()), create_proxy(_message),
+                         create_proxy(_close))
+        ws = self.ws = scope.WebSocket.new(url)
+        ws.binaryType = 'arraybuffer'
+        ws.onopen, ws.onmessage, ws.onclose = self._proxies
+    def send(self, data):
+        self.ws.send(to_js(memoryview(data)))
+    def close(self):
+        self.ws.close()
+
+# Canvas defaults, for state reads on the recording context
+_CANVAS_DEFAULTS = {
+    'fillStyle': '#000000', 'strokeStyle': '#000000', 'font': '10px sans-serif',
+    'globalAlpha': 1.0, 'lineWidth': 1.0, 'shadowColor': 'rgba(0, 0, 0, 0)',
+    'shadowBlur': 0.0, 'shadowOffsetX': 0.0, 'shadowOffsetY': 0.0,
+    'textAlign': 'start', 'textBaseline': 'alphabetic', 'lineCap': 'butt',
+    'lineJoin': 'miter', 'globalCompositeOperation': 'source-over',
+}
+# Rough advance widths (in em) for measureText estimates
+_NARROW_CHARS = frozenset(" .,:;'!|iIjlft()[]")
+_WIDE_CHARS = frozenset('mwMW@%')
+
+def estimate_text_width(font, text):
+    """Deterministic stand-in for ``measureText(text).width``."""
+    size = 10.0
+    for token in font.split():
+        if token.endswith('px'):
+            try:
+                size = float(token[:-2])
+            except ValueError:
+                pass
+            break
+    em = 0.0
+    for ch in text:
+        if ch in _NARROW_CHARS:
+            em += 0.3
+        elif ch in _WIDE_CHARS:
+            em += 0.85
+        elif ch.isupper():
+            em += 0.65
+        else:
+            em += 0.55
+    return em * size
+
+class _MeasuredText:
+    __slots__ = ('width',)
+    def __init__(self, width):
+        self.width = width
+
+class RecordingContext:
+    """
+    Canvas2D stand-in for the RecordingBackend: records every call and
+    style assignment, keeps the save/restore state stack and estimates
+    ``measureText`` from the current font.
+    """
+    def __init__(self, backend):
+        object.__setattr__(self, '_backend', backend)
+        object.__setattr__(self, '_state', dict(_CANVAS_DEFAULTS))
+        object.__setattr__(self, '_stack', [])
+
+    def save(self):
+        self._stack.append(dict(self._state))
+        self._backend._record(('save',))
+    def restore(self):
+        if self._stack:
+            object.__setattr__(self, '_state', self._stack.pop())
+        self._backend._record(('restore',))
+    def measureText(self, text):
+        self._backend.op_counts['measureText'] += 1
+        return _MeasuredText(estimate_text_width(self._state['font'], str(text)))
+
+    def __setattr__(self, name, value):
+        self._state[name] = value
+        self._backend._record((name, value))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        state = self._state
+        if name in state:
+            return state[name]
+        record = self._backend._record
+        def call(*args):
+            record((name,) + args)
+        return call
+
+class _SyntheticEvent:
+    """DOM-like event for RecordingBackend.dispatch()."""
+    def __init__(self, type, **fields):
+        self.type = type
+        self.clientX = self.clientY = 0.0
+        self.button = 0
+        self.key = ''
+        self.deltaX = self.deltaY = 0.0
+        self.deltaMode = 0
+        self.pointerId = 1
+        self.pointerType = 'mouse'
+        self.__dict__.update(fields)
+    def preventDefault(self):
+        pass
+
+# opcode -> (name, arg layout), for decoding DrawList buffers
+_DRAW_DECODE = {code: (name, layout)
+                for table in (_DRAW_CALLS, _DRAW_STATE)
+                for name, (code, layout) in table.items()}
+
+class RecordingBackend(Backend):
+    """
+    Headless backend for plain CPython (tests, benchmarks, CI).
+
+    Draw-list buffers are decoded into a per-frame op log of tuples such
+    as ``('fillRect', x, y, w, h)`` or ``('font', '16px sans-serif')``;
+    ``op_counts`` accumulates call counts over the whole run.  Time is
+    virtual: ``step(dt_ms)`` advances it, fires the due timers and runs one
+    animation frame, so runs are fully deterministic.  ``dispatch()`` sends
+    synthetic DOM-style events to the registered listeners.  Images are
+    fetched with urllib (relative sources against ``base_url``, e.g. a
+    local static server, else the current directory) on the next step;
+    only their header is parsed, for the size.  Fonts are fetched the same
+    way but never rasterized.
+    """
+    name = 'recording'
+
+    def __init__(self, width=800, height=600, keep_frames=8, base_url=None):
+        self.width, self.height = width, height
+        self.base_url = base_url
+        self.images = {}   # image id -> (url, width, height) of loaded bitmaps
+        self.fonts = {}    # family -> url of loaded fonts
+        self.listeners = {}
+        self.frames = deque(maxlen=keep_frames)   # op logs of rendered frames
+        self.op_counts = Counter()
+        self.flushes = 0
+        self.errors = []
+        self.time_ms = 0.0
+        self.first_frame_ms = None
+        self._frame = []
+        self._raf = []
+        self._loads = []    # pending load_image() completions
+        self._timers = {}   # id -> (deadline_ms, callback)
+        self._timer_ids = itertools.count(1)
+        self._socket_events = deque()   # filled by socket threads
+
+    # --- drawing ------------------------------------------------------
+    def create_context(self):
+        return RecordingContext(self)
+
+    def draw_sink(self):
+        return self._decode
+
+    def _record(self, op):
+        self._frame.append(op)
+        self.op_counts[op[0]] += 1
+
+    def _decode(self, ops, nums, strs):
+        self.flushes += 1
+        frame, counts, table = self._frame, self.op_counts, _DRAW_DECODE
+        n = 0
+        for code in ops:
+            name, layout = table[code]
+            op = [name]
+            for kind in layout:
+                value = nums[n]
+                n += 1
+                op.append(strs[int(value)] if kind == 's' else value)
+            if code == 46:   # define_path: skip the commands, keep their count
+                n += int(op[2])
+            frame.append(tuple(op))
+            counts[name] += 1
+            if code == 29:   # drop_image: the bitmap is gone
+                self.images.pop(int(op[1]), None)
+
+    @property
+    def last_frame(self):
+        return self.frames[-1] if self.frames else []
+
+    # --- window / events ----------------------------------------------
+    def window_size(self):
+        return (self.width, self.height)
+
+    def add_listener(self, event, handler):
+        self.listeners.setdefault(event, []).append(handler)
+
+    def remove_listener(self, event, handler):
+        handlers = self.listeners.get(event, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def dispatch(self, event, **fields):
+        """Deliver a synthetic event (``clientX``, ``key``, ``deltaY``...)."""
+        evt = _SyntheticEvent(event, **fields)
+        for handler in list(self.listeners.get(event, ())):
+            handler(evt)
+        return evt
+
+    def click(self, x, y, button=0, pointer_id=1, pointer_type='mouse'):
+        fields = dict(clientX=x, clientY=y, button=button,
+                      pointerId=pointer_id, pointerType=pointer_type)
+        self.dispatch('pointerdown', **fields)
+        self.dispatch('pointerup', **fields)
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        self.dispatch('resize')
+
+    # --- scheduling ---------------------------------------------------
+    def now(self):
+        return self.time_ms / 1000.0
+
+    def request_frame(self, callback):
+        self._raf.append(callback)
+
+    def set_timeout(self, callback, ms):
+        timer_id = next(self._timer_ids)
+        self._timers[timer_id] = (self.time_ms + max(ms, 0), callback)
+        return timer_id
+
+    def clear_timeout(self, timer_id):
+        self._timers.pop(timer_id, None)
+
+    def step(self, dt=1000 / 60):
+        """Advance virtual time by ``dt`` ms, finish pending image loads, fire
+        due timers, run one frame.
+
+        Returns True if a frame callback ran.
+        """
+        self.time_ms += dt
+        loads, self._loads = self._loads, []
+        for load in loads:
+            load()
+        events = self._socket_events
+        while events:
+            events.popleft()()
+        while True:
+            due = [(deadline, tid) for tid, (deadline, _) in self._timers.items()
+                   if deadline <= self.time_ms]
+            if not due:
+                break
+            _, tid = min(due)
+            self._timers.pop(tid)[1]()
+        callbacks, self._raf = self._raf, []
+        self._frame = []
+        for callback in callbacks:
+            callback(self.time_ms)
+        if self._frame:
+            self.frames.append(self._frame)
+        self._frame = []
+        return bool(callbacks)
+
+    def run_until_idle(self, max_frames=600, dt=1000 / 60):
+        """Step until no frame (or image load) is pending; returns the number of steps."""
+        steps = 0
+        while (self._raf or self._loads) and steps < max_frames:
+            self.step(dt)
+            steps += 1
+        return steps
+
+    def report_error(self, *args):
+        self.errors.append(' '.join(str(a) for a in args))
+        super().report_error(*args)
+
+    def first_frame(self):
+        self.first_frame_ms = self.time_ms
+
+    def load_image(self, image_id, url, max_width, max_height, done):
+        # Completes at the start of the next step(), like a network response
+        def load():
+            try:
+                size = image_size(self.fetch(url))
+            except Exception as exc:
+                self.errors.append(f'image {url}: {exc}')
+                size = None
+            if size is None:
+                done(image_id, -1, -1)
+                return
+            width, height = fit_within(size[0], size[1], max_width, max_height)
+            self.images[image_id] = (url, width, height)
+            done(image_id, width, height)
+        self._loads.append(load)
+
+    def load_font(self, family, url, done):
+        def load():
+            try:
+                self.fetch(url)
+            except Exception as exc:
+                self.errors.append(f'font {url}: {exc}')
+                done(family, False)
+                return
+            self.fonts[family] = url
+            done(family, True)
+        self._loads.append(load)
+
+    def open_socket(self, url, on_open, on_message, on_close):
+        # Real socket, read on a thread; events are delivered by step()
+        return _ThreadSocket(url, self._socket_events.append, on_open, on_message, on_close)
+
+    def fetch(self, url):
+        """Bytes of ``url`` (http/file URL, or a path)."""
+        from urllib.parse import urljoin, urlsplit
+        from urllib.request import urlopen   # imported on first use only
+        if self.base_url:
+            url = urljoin(self.base_url, url)
+        if not urlsplit(url).scheme:
+            with open(url, 'rb') as f:
+                return f.read()
+        with urlopen(url, timeout=10) as response:
+            return response.read()
+
+    def stats(self):
+        return {'frames': len(self.frames), 'flushes': self.flushes,
+                'ops': sum(self.op_counts.values()), 'counts': dict(self.op_counts),
+                'errors': len(self.errors)}
+
+class _ThreadSocket:
+    """
+    WebSocket client on a plain socket (headless runs, CI).
+
+    Connects and reads on a daemon thread; each event is handed to
+    ``post`` as a callable so the backend runs it on its own thread.
+    """
+    def __init__(self, url, post, on_open, on_message, on_close):
+        import threading
+        self.url, self.post = url, post
+        self.handlers = (on_open, on_message, on_close)
+        self.sock = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True, name='webkivy-socket').start()
+
+    def _connect(self):
+        import socket, ssl
+        from urllib.parse import urlsplit
+        import wire
+        parts = urlsplit(self.url)
+        secure = parts.scheme == 'wss'
+        port = parts.port or (443 if secure else 80)
+        sock = socket.create_connection((parts.hostname, port), timeout=10)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        key = wire.ws_key()
+        request = (f'GET {parts.path or "/"}{"?" + parts.query if parts.query else ""} HTTP/1.1\r\n'
+                   f'Host: {parts.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                   f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n')
+        sock.sendall(request.encode('ascii'))
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError('handshake: connection closed')
+            response += chunk
+        head, _, rest = response.partition(b'\r\n\r\n')
+        if b' 101 ' not in head.split(b'\r\n', 1)[0] or wire.ws_accept(key).encode() not in head:
+            raise ConnectionError('handshake refused: ' + head.split(b'\r\n', 1)[0].decode('latin-1'))
+        sock.settimeout(None)
+        return sock, rest
+
+    def _run(self):
+        import wire
+        on_open, on_message, on_close = self.handlers
+        try:
+            self.sock, rest = self._connect()
+            self.post(on_open)
+            reader = wire.FrameReader()
+            data = rest
+            while True:
+                for opcode, payload in reader.feed(data):
+                    if opcode == wire.OP_BINARY:
+                        self.post(lambda payload=payload: on_message(payload))
+                    elif opcode == wire.OP_PING:
+                        self._send(payload, wire.OP_PONG)
+                    elif opcode == wire.OP_CLOSE:
+                        return
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+        except Exception:
+            pass
+        finally:
+            self.close()
+            self.post(on_close)
+
+    def _send(self, data, opcode):
+        import wire
+        with self._lock:
+            if self.sock is not None:
+                self.sock.sendall(wire.ws_frame(data, opcode, mask=True))
+
+    def send(self, data):
+        import wire
+        try:
+            self._send(data, wire.OP_BINARY)
+        except OSError:
+            self.close()
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(2)   # SHUT_RDWR: unblocks the reader thread
+                sock.close()
+            except OSError:
+                pass
+
+# ------------------------------------------------------------
+#  Mode Web Worker : Pyodide hors du thread principal
+# ------------------------------------------------------------
+class WorkerBackend(Canvas2DBackend):
+    """
+    Pyodide inside a dedicated Web Worker (see ``worker.js``).
+
+    Draws on the ``OffscreenCanvas`` transferred by the page; the page
+    posts its input batches once per frame and worker.js merges them into
+    the worker's own ``webkivyInput`` queue.  Frames and timers use the
+    worker's rAF / setTimeout.
+    """
+    name = 'worker'
+
+    def __init__(self, canvas, width, height):
+        super().__init__()
+        self.scope = js   # the worker's global scope
+        self.canvas = canvas
+        self.width, self.height = int(width), int(height)
+
+    def create_context(self):
+        if self.ctx is None:
+            self.resize_surface()
+            self.ctx = self.canvas.getContext('2d')
+        return self.ctx
+
+    def window_size(self):
+        return (self.width, self.height)
+
+    def resize_surface(self):
+        self.canvas.width, self.canvas.height = self.width, self.height
+
+    def request_frame(self, callback):
+        raf = getattr(self.scope, 'requestAnimationFrame', None)
+        if raf is not None:
+            raf(self._proxy(callback))
+        else:
+            self.scope.setTimeout(self._proxy(callback), 16)
+
+class LoopbackWorker(_BatchedInput, RecordingBackend):
+    """
+    Browser-free stand-in for worker mode.
+
+    ``page_event()`` queues events on the "page" side with the same
+    packing and coalescing as ``input.js``; each ``step()`` sends the
+    batch across as bytes into the "worker" queue, which the frame then
+    polls, like the real message channel.
+    """
+    name = 'loopback'
+
+    def __init__(self, width=800, height=600, keep_frames=8, base_url=None):
+        super().__init__(width, height, keep_frames, base_url)
+        self.page = InputBatch()
+        self.inbox = InputBatch()
+        self.batches = self.bytes_sent = 0
+        self._wake = None
+
+    def page_event(self, type, **fields):
+        self.page.push(type, **fields)
+
+    def on_input(self, callback):
+        self._wake = callback
+
+    def poll_input(self):
+        data = self.inbox.pack()
+        if data:
+            self.dispatch_batch(data)
+
+    def step(self, dt=1000 / 60):
+        data = self.page.pack()
+        if data:
+            self.batches += 1
+            self.bytes_sent += len(data)
+            self.inbox.extend(data)
+            if self._wake is not None:
+                self._wake()
+        return super().step(dt)
+
+BACKEND = None
+
+def set_backend(backend):
+    """Make ``backend`` the active one (also the Clock's time source)."""
+    global BACKEND
+    BACKEND = backend
+    Clock.set_time_source(backend.now)
+    return backend
+
+def get_backend():
+    """Active backend; Canvas2D in Pyodide, recording on plain CPython."""
+    if BACKEND is None:
+        set_backend(Canvas2DBackend(ctx) if window is not None else RecordingBackend())
+    return BACKEND
+
+def report_error(*args):
+    get_backend().report_error(*args)
+
+# ------------------------------------------------------------
+#  Cache bitmap hors-écran pour les sous-arbres statiques (cache=True)
+# ------------------------------------------------------------
+class LayerCache:
+    """
+    Offscreen bitmaps for widgets created with ``cache=True``.
+
+    The subtree is rendered once into an offscreen canvas (``begin_layer``
+    / ``end_layer`` draw-list ops) and then blitted with a single
+    ``draw_layer`` until a property in the subtree changes.  Layers are
+    evicted least-recently-used once ``max_pixels`` is exceeded.  Only
+    available in draw-list mode; otherwise widgets draw normally.
+    """
+    def __init__(self, max_pixels=8_000_000):
+        self.max_pixels = max_pixels
+        self.layers = OrderedDict()   # id -> (pixels, bounds, weakref(widget))
+        self.pixels = 0
+        self._ids = itertools.count(1)
+        self.hits = self.misses = self.evictions = 0
+
+    def enabled(self):
+        return hasattr(ctx, 'begin_layer')
+
+    def draw(self, widget):
+        margin = widget._layer_margin()
+        x0, y0 = widget.x - margin, widget.y - margin
+        lw = int(widget.size[0] + 2 * margin + 0.999)
+        lh = int(widget.size[1] + 2 * margin + 0.999)
+        if lw <= 0 or lh <= 0 or lw * lh > self.max_pixels:
+            _paint(widget)
+            return
+        bounds = (x0, y0, lw, lh)
+        lid = widget._layer
+        entry = self.layers.get(lid) if lid is not None else None
+        if entry is not None and widget._layer_valid and entry[1] == bounds:
+            self.hits += 1
+            self.layers.move_to_end(lid)
+            ctx.draw_layer(lid, x0, y0)
+            return
+        self.misses += 1
+        if entry is not None:
+            self.pixels -= entry[0]
+            del self.layers[lid]
+        if lid is None:
+            lid = widget._layer = next(self._ids)
+        # Valid from now on: changes made while drawing still invalidate it
+        widget._layer_valid = True
+        ctx.begin_layer(lid, x0, y0, lw, lh)
+        try:
+            _paint(widget)
+        finally:
+            ctx.end_layer()
+        ctx.draw_layer(lid, x0, y0)
+        self.layers[lid] = (lw * lh, bounds, weakref.ref(widget))
+        self.pixels += lw * lh
+        self._evict(keep=lid)
+
+    def _drop(self, lid, entry):
+        self.pixels -= entry[0]
+        ctx.drop_layer(lid)
+        widget = entry[2]()
+        if widget is not None:
+            widget._layer = None
+            widget._layer_valid = False
+
+    def _evict(self, keep=None):
+        while self.pixels > self.max_pixels and self.layers:
+            lid, entry = next(iter(self.layers.items()))
+            if lid == keep:
+                break
+            del self.layers[lid]
+            self._drop(lid, entry)
+            self.evictions += 1
+
+    def set_budget(self, max_pixels):
+        self.max_pixels = max_pixels
+        self._evict()
+
+    def clear(self):
+        """Drop every layer (theme change, context reset…)."""
+        if not self.layers:
+            return
+        layers, self.layers = self.layers, OrderedDict()
+        for lid, entry in layers.items():
+            self._drop(lid, entry)
+        self.pixels = 0
+        mark_dirty()
+
+    def stats(self):
+        return {'layers': len(self.layers), 'pixels': self.pixels,
+                'max_pixels': self.max_pixels, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+LAYER_CACHE = LayerCache()
+
+# ------------------------------------------------------------
+#  Images : décodage asynchrone, bitmaps partagés, éviction LRU
+# ------------------------------------------------------------
+def image_size(data):
+    """``(width, height)`` read from a PNG/GIF/JPEG/WebP/BMP header, or None."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+        return struct.unpack('>II', data[16:24])
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', data[6:10])
+    if data[:2] == b'BM' and len(data) >= 26:
+        w, h = struct.unpack('<ii', data[18:26])
+        return w, abs(h)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        chunk = data[12:16]
+        if chunk == b'VP8 ' and len(data) >= 30:
+            w, h = struct.unpack('<HH', data[26:30])
+            return w & 0x3fff, h & 0x3fff
+        if chunk == b'VP8L' and len(data) >= 25:
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X' and len(data) >= 30:
+            return (int.from_bytes(data[24:27], 'little') + 1,
+                    int.from_bytes(data[27:30], 'little') + 1)
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xFF:
+                return None
+            marker = data[i + 1]
+            if marker == 0xFF:        # fill byte
+                i += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                i += 2                # no length field
+                continue
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack('>HH', data[i + 5:i + 9])
+                return w, h
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+def fit_within(width, height, max_width, max_height):
+    """Size of a ``width`` x ``height`` image downscaled (never up) to fit."""
+    if max_width <= 0 or max_height <= 0 or (width <= max_width and height <= max_height):
+        return width, height
+    scale = min(max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+class _ImageEntry:
+    __slots__ = ('id', 'key', 'state', 'width', 'height', 'nbytes', 'waiters', 'frame')
+
+class ImageCache:
+    """
+    Decoded bitmaps shared by every ``Image`` widget.
+
+    Entries are keyed by ``(url, max_width, max_height)``: the same icon in
+    500 list rows is fetched and decoded once.  The backend loads them
+    asynchronously (``fetch`` → ``createImageBitmap`` in the browser) into
+    a JS-side id map; widgets draw a placeholder until the bitmap is ready,
+    then blit it with one ``draw_image`` op.  Ready bitmaps are evicted
+    least-recently-used once ``max_bytes`` (4 bytes per pixel) is exceeded;
+    bitmaps drawn in the last frame are kept even over budget, so a
+    visible set larger than the budget doesn't reload every frame.
+    Only available in draw-list mode, like LayerCache.
+    """
+    LOADING, READY, FAILED = 'loading', 'ready', 'failed'
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # key -> _ImageEntry, LRU first
+        self._by_id = {}
+        self._ids = itertools.count(1)
+        self.nbytes = 0
+        self.hits = self.loads = self.failures = self.evictions = 0
+
+    def enabled(self):
+        return hasattr(ctx, 'draw_image')
+
+    def request(self, widget, key):
+        """Entry for ``key``; starts loading it (and remembers ``widget``) if needed."""
+        entry = self.entries.get(key)
+        frame = FRAME_STATS['rendered'] + 1   # the frame being drawn
+        if entry is None:
+            entry = _ImageEntry()
+            entry.id, entry.key, entry.state = next(self._ids), key, self.LOADING
+            entry.width = entry.height = entry.nbytes = 0
+            entry.waiters = weakref.WeakSet()
+            entry.frame = frame
+            self.entries[key] = entry
+            self._by_id[entry.id] = entry
+            self.loads += 1
+            entry.waiters.add(widget)
+            url, max_w, max_h = key
+            get_backend().load_image(entry.id, url, max_w, max_h, self._loaded)
+        elif entry.state == self.LOADING:
+            entry.waiters.add(widget)
+        else:
+            self.hits += 1
+            entry.frame = frame
+            self.entries.move_to_end(key)
+        return entry
+
+    def _loaded(self, image_id, width, height):
+        entry = self._by_id.get(image_id)
+        if entry is None:
+            # Evicted or cleared while loading: free the bitmap right away
+            if width >= 0 and self.enabled():
+                ctx.drop_image(image_id)
+            return
+        if width < 0:
+            entry.state = self.FAILED
+            self.failures += 1
+        else:
+            entry.state = self.READY
+            entry.width, entry.height = int(width), int(height)
+            entry.nbytes = entry.width * entry.height * 4
+            self.nbytes += entry.nbytes
+        waiters, entry.waiters = list(entry.waiters), None
+        for widget in waiters:
+            widget._image_ready(entry)
+        self._evict(keep=entry.key)
+        mark_dirty()
+
+    def _drop(self, entry):
+        del self._by_id[entry.id]
+        if entry.state == self.READY:
+            self.nbytes -= entry.nbytes
+            if self.enabled():
+                ctx.drop_image(entry.id)
+
+    def _evict(self, keep=None):
+        current = FRAME_STATS['rendered']
+        for key in list(self.entries):
+            if self.nbytes <= self.max_bytes:
+                break
+            entry = self.entries[key]
+            if key == keep or entry.state != self.READY or entry.frame >= current:
+                continue
+            del self.entries[key]
+            self._drop(entry)
+            self.evictions += 1
+
+    def set_budget(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        """Forget every bitmap (loads in flight are dropped when they land)."""
+        entries, self.entries = self.entries, OrderedDict()
+        for entry in entries.values():
+            self._drop(entry)
+        mark_dirty()
+
+    def stats(self):
+        return {'images': len(self.entries), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes, 'hits': self.hits, 'loads': self.loads,
+                'failures': self.failures, 'evictions': self.evictions}
+
+IMAGE_CACHE = ImageCache()
+
+# ------------------------------------------------------------
+#  Atlas d'icônes : glyphes rastérisés une fois, blittés ensuite
+# ------------------------------------------------------------
+class _Shelf:
+    __slots__ = ('y', 'height', 'x', 'keys', 'used')
+
+    def __init__(self, y, height):
+        self.y, self.height, self.x = y, height, 0
+        self.keys = []
+        self.used = 0
+
+class IconAtlas:
+    """
+    Shared atlas canvas for icon glyphs (``MDIconButton``).
+
+    Each ``(glyph, font, color)`` is rasterized once into a cell of the
+    atlas (``atlas_put`` op); afterwards an icon is one ``atlas_draw``
+    sub-rect blit instead of font fitting, clipping and ``fillText``.
+    Cells are packed in shelves (rows) of similar height.  When the atlas
+    is full, the least recently used shelf is emptied and reused; if no
+    shelf is tall enough, the whole atlas starts over.  Only available in
+    draw-list mode, like LayerCache.
+    """
+    PAD = 1
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.glyphs = {}    # (glyph, font, color) -> (x, y, w, h, shelf)
+        self.shelves = []
+        self.bottom = 0
+        self._tick = 0
+        self.hits = self.puts = self.evictions = self.resets = 0
+
+    def enabled(self):
+        return hasattr(ctx, 'atlas_draw')
+
+    def draw(self, glyph, font, color, font_size, cx, cy):
+        """Blit ``glyph`` centred on (cx, cy); False if it can't go in the atlas."""
+        key = (glyph, font, color)
+        self._tick += 1
+        slot = self.glyphs.get(key)
+        if slot is None:
+            slot = self._put(key, font_size)
+            if slot is None:
+                return False
+        else:
+            self.hits += 1
+        x, y, w, h, shelf = slot
+        shelf.used = self._tick
+        ctx.atlas_draw(x, y, w, h, round(cx - w / 2), round(cy - h / 2))
+        return True
+
+    def _put(self, key, font_size):
+        glyph, font, color = key
+        w = int(TEXT_METRICS.width(font, glyph) + 0.999) + 2 * self.PAD
+        h = int(font_size * 1.25 + 0.999) + 2 * self.PAD
+        if w > self.size or h > self.size:
+            return None
+        shelf = self._shelf_for(w, h)
+        x, y = shelf.x, shelf.y
+        shelf.x += w
+        shelf.keys.append(key)
+        slot = self.glyphs[key] = (x, y, w, h, shelf)
+        # Earlier blits of this frame are already queued: overwriting an
+        # evicted cell after them is safe
+        ctx.atlas_put(glyph, font, color, x, y, w, h, self.size)
+        self.puts += 1
+        return slot
+
+    def _shelf_for(self, w, h):
+        best = None
+        for shelf in self.shelves:
+            if (h <= shelf.height <= h * 1.5 + 2 and shelf.x + w <= self.size
+                    and (best is None or shelf.height < best.height)):
+                best = shelf
+        if best is not None:
+            return best
+        if self.bottom + h > self.size:
+            victims = [shelf for shelf in self.shelves if shelf.height >= h]
+            if victims:
+                shelf = min(victims, key=attrgetter('used'))
+                for key in shelf.keys:
+                    del self.glyphs[key]
+                shelf.keys, shelf.x = [], 0
+                self.evictions += 1
+                return shelf
+            self.reset()
+        shelf = _Shelf(self.bottom, h)
+        self.bottom += h
+        self.shelves.append(shelf)
+        return shelf
+
+    def reset(self):
+        """Forget every cell (the atlas canvas is simply overwritten)."""
+        self.glyphs.clear()
+        self.shelves.clear()
+        self.bottom = 0
+        self.resets += 1
+
+    def stats(self):
+        return {'glyphs': len(self.glyphs), 'shelves': len(self.shelves),
+                'used_height': self.bottom, 'size': self.size, 'hits': self.hits,
+                'puts': self.puts, 'evictions': self.evictions, 'resets': self.resets}
+
+ICON_ATLAS = IconAtlas()
+
+# Icon names served by a font registered with register_icon_font()
+_ICON_FONTS = {}      # icon name -> font family
+_FONT_STATE = {}      # font family -> 'loading' / 'ready' / 'failed'
+
+def parse_codepoints(text):
+    """``{name: glyph}`` from a ``codepoints`` file (``name hex`` per line)."""
+    icons = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            icons[parts[0]] = chr(int(parts[1], 16))
+    return icons
+
+def register_icon_font(family, url, icons):
+    """
+    Serve the ``icons`` names (``{name: glyph or code point}``, e.g. the
+    Material Design Icons map) with the font file at ``url``, loaded
+    under ``family``.  The names become valid ``MDIconButton(icon=...)``
+    values and ``md_icons`` keys; until the font is loaded those icons
+    draw only their background.
+    """
+    for name, glyph in icons.items():
+        ICON_MAP[name] = chr(glyph) if isinstance(glyph, int) else glyph
+        _ICON_FONTS[name] = family
+    if family in _FONT_STATE:
+        return
+    _FONT_STATE[family] = 'loading'
+    get_backend().load_font(family, url, _font_loaded)
+
+def _font_loaded(family, ok):
+    _FONT_STATE[family] = 'ready' if ok else 'failed'
+    if not ok:
+        report_error(f'webkivy: icon font {family!r} failed to load')
+    # Widths measured with the fallback font are stale
+    TEXT_METRICS.clear()
+    LAYER_CACHE.clear()
+    mark_dirty()
+
+def _paint(widget):
+    canvas = getattr(widget, '_canvas', None)
+    if canvas is None:
+        widget.draw()
+        return
+    if canvas._before is not None:
+        canvas._before.draw()
+    widget.draw()
+    if canvas._after is not None:
+        canvas._after.draw()
+
+def _draw_widget(widget):
+    if getattr(widget, 'cache', False) and LAYER_CACHE.enabled():
+        LAYER_CACHE.draw(widget)
+    else:
+        _paint(widget)
+
+def draw_widget(widget):
+    """Draw ``widget``, through its cached layer when ``cache=True``."""
+    if PROFILER.active:
+        PROFILER.draw_widget(widget)
+    else:
+        _draw_widget(widget)
+
+# ------------------------------------------------------------
+#  Profiler : phases de frame, temps de dessin par classe, trace Chrome
+# ------------------------------------------------------------
+class _FFICounter:
+    """Counts the JS calls / property accesses made on a context or sink."""
+    __slots__ = ('_target', '_profiler')
+
+    def __init__(self, target, profiler):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_profiler', profiler)
+
+    def __call__(self, *args):
+        # Draw-list sink: one crossing per flushed buffer
+        profiler = self._profiler
+        profiler._ffi += 1
+        profiler._ops += len(args[0])
+        return self._target(*args)
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        profiler = self._profiler
+        if not callable(value):
+            profiler._ffi += 1
+            return value
+        def call(*args):
+            profiler._ffi += 1
+            return value(*args)
+        return call
+
+    def __setattr__(self, name, value):
+        self._profiler._ffi += 1
+        setattr(self._target, name, value)
+
+class _FrameRecord:
+    __slots__ = ('start', 'end', 'rendered', 'phases', 'classes', 'spans', 'ffi', 'ops')
+
+class FrameProfiler:
+    """
+    Opt-in frame profiler (``run_kivy_app(..., profile=True)`` or F2).
+
+    For each frame it records the phase timings (events, bindings = Clock
+    callbacks, tweens and bind() observers, layout, draw, flush), the draw time of every
+    widget class (self time, children excluded) with call counts, and the
+    number of JS calls made on the canvas (a draw-list flush counts as
+    one).  The last ``max_frames`` frames are kept; ``export_trace()``
+    writes them as Chrome Trace Event JSON (chrome://tracing, Perfetto)
+    and ``overlay`` draws FPS and a frame-time histogram on the canvas.
+    F3 saves the trace while profiling.
+    """
+    PHASES = ('events', 'bindings', 'layout', 'draw', 'overlay', 'flush')
+    toggle_key = 'F2'
+    save_key = 'F3'
+
+    def __init__(self, max_frames=300, max_spans=5000):
+        self.max_frames = max_frames
+        self.max_spans = max_spans   # widget draw spans kept per frame
+        self.active = False
+        self.overlay = False
+        self.frames = deque(maxlen=max_frames)
+        self.classes = {}   # class name -> [calls, self seconds], whole session
+        self._time = time.perf_counter
+        self._origin = self._time()
+        self._frame = None
+        self._mark = 0.0
+        self._stack = []
+        self._ffi = self._ops = 0
+
+    # --- on / off -------------------------------------------------------
+    def start(self, overlay=True):
+        global ctx
+        if not self.active:
+            self.active = True
+            # Count what crosses into JS: the real context and the draw-list sink
+            if isinstance(ctx, (DrawList, ShadowContext)):
+                object.__setattr__(ctx, 'target', _FFICounter(ctx.target, self))
+                if isinstance(ctx, DrawList) and ctx._sink is not None:
+                    object.__setattr__(ctx, '_sink', _FFICounter(ctx._sink, self))
+            elif ctx is not None and not isinstance(ctx, _FFICounter):
+                ctx = _FFICounter(ctx, self)
+        self.overlay = overlay
+        mark_dirty()
+
+    def stop(self):
+        global ctx
+        if not self.active:
+            return
+        self.active = self.overlay = False
+        self._frame = None
+        self._stack.clear()
+        if isinstance(ctx, (DrawList, ShadowContext)):
+            for slot in ('target', '_sink'):
+                wrapped = getattr(ctx, slot, None)
+                if isinstance(wrapped, _FFICounter):
+                    object.__setattr__(ctx, slot, wrapped._target)
+        elif isinstance(ctx, _FFICounter):
+            ctx = ctx._target
+        mark_dirty()
+
+    def toggle(self):
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    def reset(self):
+        self.frames.clear()
+        self.classes.clear()
+
+    # --- recording (called by the frame loop) ---------------------------
+    def begin_frame(self):
+        rec = self._frame = _FrameRecord()
+        rec.start = self._mark = self._time()
+        rec.end, rec.rendered = rec.start, False
+        rec.phases, rec.classes, rec.spans = [], {}, []
+        self._ffi = self._ops = 0
+
+    def phase(self, name):
+        """Close the phase that started at the previous mark."""
+        rec = self._frame
+        if rec is None:
+            return
+        now = self._time()
+        rec.phases.append((name, self._mark, now - self._mark))
+        self._mark = now
+
+    def end_frame(self, rendered):
+        rec, self._frame = self._frame, None
+        if rec is None:
+            return
+        rec.end = self._time()
+        rec.rendered = rendered
+        rec.ffi, rec.ops = self._ffi, self._ops
+        self.frames.append(rec)
+
+    def draw_widget(self, widget):
+        rec = self._frame
+        if rec is None:
+            return _draw_widget(widget)
+        stack = self._stack
+        t0 = self._time()
+        stack.append(0.0)
+        try:
+            _draw_widget(widget)
+        finally:
+            dt = self._time() - t0
+            own = dt - stack.pop()
+            if stack:
+                stack[-1] += dt
+            name = type(widget).__name__
+            for table in (rec.classes, self.classes):
+                entry = table.get(name)
+                if entry is None:
+                    table[name] = [1, own]
+                else:
+                    entry[0] += 1
+                    entry[1] += own
+            if len(rec.spans) < self.max_spans:
+                rec.spans.append((name, t0, dt))
+
+    # --- reporting ------------------------------------------------------
+    def _rendered(self):
+        return [rec for rec in self.frames if rec.rendered]
+
+    def fps(self):
+        frames = self._rendered()
+        if len(frames) < 2 or frames[-1].start <= frames[0].start:
+            return 0.0
+        return (len(frames) - 1) / (frames[-1].start - frames[0].start)
+
+    def stats(self, top=10):
+        """Summary of the recorded frames (times in ms)."""
+        frames = self._rendered()
+        times = sorted((rec.end - rec.start) * 1000 for rec in frames)
+        phases = Counter()
+        for rec in frames:
+            for name, _, dur in rec.phases:
+                phases[name] += dur * 1000
+        n = len(frames) or 1
+        classes = sorted(self.classes.items(), key=lambda item: -item[1][1])[:top]
+        return {
+            'frames': len(frames), 'fps': round(self.fps(), 1),
+            'frame_ms': {
+                'avg': sum(times) / n if times else 0.0,
+                'p50': times[len(times) // 2] if times else 0.0,
+                'p95': times[int(len(times) * 0.95)] if times else 0.0,
+                'max': times[-1] if times else 0.0,
+            },
+            'phases_ms': {name: phases[name] / n for name in self.PHASES if name in phases},
+            'ffi_per_frame': sum(rec.ffi for rec in frames) / n,
+            'classes': [(name, calls, own * 1000) for name, (calls, own) in classes],
+        }
+
+    def trace(self):
+        """The recorded frames as a Chrome Trace Event dict."""
+        us = lambda t: round((t - self._origin) * 1e6, 1)
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1,
+                   'args': {'name': get_backend().name}}]
+        for rec in self.frames:
+            base = {'pid': 1, 'tid': 1}
+            events.append(dict(base, name='frame' if rec.rendered else 'idle', cat='frame',
+                               ph='X', ts=us(rec.start), dur=us(rec.end) - us(rec.start),
+                               args={'ffi': rec.ffi, 'ops': rec.ops}))
+            for name, start, dur in rec.phases:
+                events.append(dict(base, name=name, cat='phase', ph='X',
+                                   ts=us(start), dur=round(dur * 1e6, 1)))
+            for name, start, dur in rec.spans:
+                events.append(dict(base, name=name, cat='draw', ph='X',
+                                   ts=us(start), dur=round(dur * 1e6, 1)))
+            events.append(dict(base, name='js calls', ph='C', ts=us(rec.start),
+                               args={'ffi': rec.ffi, 'ops': rec.ops}))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_trace(self, path=None):
+        """Trace JSON text; also written to ``path`` (or saved by the backend) if given."""
+        text = json.dumps(self.trace())
+        if path is not None:
+            get_backend().save_text(path, text)
+        return text
+
+    def draw_overlay(self, width, height):
+        """FPS and the last frame times (bars, 16.7 ms line) in the top-right corner."""
+        frames = self._rendered()[-60:]
+        w, h = 184, 64
+        x0, y0 = width - w - 8, 8
+        ctx.save()
+        ctx.globalAlpha = 1
+        ctx.fillStyle = 'rgba(0, 0, 0, 0.7)'
+        ctx.fillRect(x0, y0, w, h)
+        ctx.font = '11px monospace'
+        ctx.fillStyle = '#FFFFFF'
+        last = (frames[-1].end - frames[-1].start) * 1000 if frames else 0.0
+        ctx.fillText(f'{self.fps():5.1f} fps  {last:5.1f} ms', x0 + 6, y0 + 14)
+        scale = (h - 24) / 33.4   # full height = two frames at 60 Hz
+        base = y0 + h - 4
+        for i, rec in enumerate(frames):
+            ms = (rec.end - rec.start) * 1000
+            ctx.fillStyle = '#4CAF50' if ms <= 16.7 else '#FF9800' if ms <= 33.4 else '#F44336'
+            bar = min(ms, 33.4) * scale
+            ctx.fillRect(x0 + 4 + i * 3, base - bar, 2, bar)
+        ctx.fillStyle = 'rgba(255, 255, 255, 0.5)'
+        ctx.fillRect(x0 + 4, base - 16.7 * scale, w - 8, 1)
+        ctx.restore()
+        self.phase('overlay')
+
+PROFILER = FrameProfiler()
+
+# ------------------------------------------------------------
+#  Clock : schedule_once / schedule_interval, piloté par la boucle de frame
+# ------------------------------------------------------------
+class ClockEvent:
+    """Handle returned by the Clock (mirrors `kivy.clock.ClockEvent`)."""
+    __slots__ = ('clock', 'callback', 'timeout', 'interval', 'scheduled_at', '_seq')
+
+    def __init__(self, clock, callback, timeout, interval):
+        self.clock = clock
+        self.callback = callback
+        self.timeout = timeout
+        self.interval = interval
+        self.scheduled_at = 0.0
+        self._seq = None   # heap entry currently valid for this event (None = idle)
+
+    @property
+    def is_triggered(self):
+        return self._seq is not None
+
+    def __call__(self, *largs):
+        """Schedule the event if it is not already pending (trigger semantics)."""
+        if self._seq is None:
+            self.clock._push(self)
+        return self
+
+    def cancel(self):
+        self._seq = None   # stale heap entries are dropped lazily
+
+class _Clock:
+    """
+    Minimal `kivy.clock.Clock` driven by the frame loop.
+
+    Pending events sit in a heap ordered by deadline, so ``tick()`` only
+    looks at the events that are due.  ``frame_budget`` (seconds) caps the
+    time spent in callbacks per frame; what is left runs on the next frame.
+    """
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._ticking = False
+        self._tick_now = 0.0
+        self.frame_budget = 0.008
+        self.frames = 0
+        self.deferred = 0   # ticks cut short by the budget (rest runs next frame)
+        self._time = time.perf_counter
+        self._start = self._time()
+
+    def set_time_source(self, now):
+        """Use ``now()`` (seconds) as the clock, e.g. a backend's virtual time."""
+        self._time = now
+        self._start = now()
+
+    def get_time(self):
+        return self._time()
+
+    def get_boottime(self):
+        return self._time() - self._start
+
+    def _push(self, event, deadline=None):
+        now = self.get_time()
+        if deadline is None:
+            deadline = now + max(event.timeout, 0)
+        if self._ticking:
+            # Never run something scheduled by a callback during the same tick
+            deadline = max(deadline, self._tick_now + 1e-6)
+        event.scheduled_at = now
+        event._seq = next(self._counter)
+        heapq.heappush(self._heap, (deadline, event._seq, event))
+        request_frame()
+
+    def schedule_once(self, callback, timeout=0):
+        event = ClockEvent(self, callback, timeout, False)
+        self._push(event)
+        return event
+
+    def schedule_interval(self, callback, timeout):
+        event = ClockEvent(self, callback, timeout, True)
+        self._push(event)
+        return event
+
+    def create_trigger(self, callback, timeout=0, interval=False):
+        """Return an unscheduled event; call it to schedule (once while pending)."""
+        return ClockEvent(self, callback, timeout, interval)
+
+    def clear(self):
+        """Cancel every pending event (app teardown)."""
+        for _, _, event in self._heap:
+            event._seq = None
+        self._heap.clear()
+
+    def unschedule(self, callback):
+        if isinstance(callback, ClockEvent):
+            callback.cancel()
+            return
+        for _, seq, event in self._heap:
+            if event._seq == seq and event.callback == callback:
+                event.cancel()
+
+    def next_deadline(self):
+        """Deadline of the earliest pending event, or None."""
+        heap = self._heap
+        while heap and heap[0][2]._seq != heap[0][1]:
+            heapq.heappop(heap)   # drop cancelled / re-armed entries
+        return heap[0][0] if heap else None
+
+    def tick(self):
+        """Run due callbacks within the frame budget; True if some remain due."""
+        now = self._tick_now = self.get_time()
+        heap = self._heap
+        budget = self.frame_budget
+        self.frames += 1
+        self._ticking = True
+        try:
+            while heap and heap[0][0] <= now:
+                deadline, seq, event = heapq.heappop(heap)
+                if event._seq != seq:
+                    continue
+                event._seq = None
+                try:
+                    ret = event.callback(now - event.scheduled_at)
+                except Exception:
+                    report_error("Clock callback error:", traceback.format_exc())
+                    ret = False
+                if event.interval and ret is not False and event._seq is None:
+                    self._push(event, max(deadline + event.timeout, now + 1e-6))
+                if budget is not None and self.get_time() - now > budget:
+                    self.deferred += 1
+                    break
+        finally:
+            self._ticking = False
+        deadline = self.next_deadline()
+        return deadline is not None and deadline <= now
+
+Clock = _Clock()
+
+# ------------------------------------------------------------
+#  Animation : tweens en tableaux compacts, avancés une fois par frame
+# ------------------------------------------------------------
+class AnimationTransition:
+    """Easing functions, ``progress`` in [0, 1] (same names as Kivy)."""
+    @staticmethod
+    def linear(p): return p
+    @staticmethod
+    def in_quad(p): return p * p
+    @staticmethod
+    def out_quad(p): return -p * (p - 2.0)
+    @staticmethod
+    def in_out_quad(p):
+        p *= 2.0
+        if p < 1.0:
+            return 0.5 * p * p
+        p -= 1.0
+        return -0.5 * (p * (p - 2.0) - 1.0)
+    @staticmethod
+    def in_cubic(p): return p * p * p
+    @staticmethod
+    def out_cubic(p):
+        p -= 1.0
+        return p * p * p + 1.0
+    @staticmethod
+    def in_out_cubic(p):
+        p *= 2.0
+        if p < 1.0:
+            return 0.5 * p * p * p
+        p -= 2.0
+        return 0.5 * (p * p * p + 2.0)
+    @staticmethod
+    def in_quart(p): return p * p * p * p
+    @staticmethod
+    def out_quart(p):
+        p -= 1.0
+        return -(p * p * p * p - 1.0)
+    @staticmethod
+    def in_out_quart(p):
+        p *= 2.0
+        if p < 1.0:
+            return 0.5 * p * p * p * p
+        p -= 2.0
+        return -0.5 * (p * p * p * p - 2.0)
+    @staticmethod
+    def in_sine(p): return -math.cos(p * (math.pi / 2)) + 1.0
+    @staticmethod
+    def out_sine(p): return math.sin(p * (math.pi / 2))
+    @staticmethod
+    def in_out_sine(p): return -0.5 * (math.cos(math.pi * p) - 1.0)
+    @staticmethod
+    def in_expo(p): return 0.0 if p == 0 else 2.0 ** (10.0 * (p - 1.0))
+    @staticmethod
+    def out_expo(p): return 1.0 if p == 1.0 else -2.0 ** (-10.0 * p) + 1.0
+    @staticmethod
+    def in_circ(p): return -(math.sqrt(1.0 - p * p) - 1.0)
+    @staticmethod
+    def out_circ(p):
+        p -= 1.0
+        return math.sqrt(1.0 - p * p)
+    @staticmethod
+    def in_back(p): return p * p * ((1.70158 + 1.0) * p - 1.70158)
+    @staticmethod
+    def out_back(p):
+        p -= 1.0
+        return p * p * ((1.70158 + 1.0) * p + 1.70158) + 1.0
+    @staticmethod
+    def in_elastic(p):
+        if p in (0.0, 1.0):
+            return p
+        p -= 1.0
+        return -(2.0 ** (10.0 * p) * math.sin((p - 0.075) * (2.0 * math.pi) / 0.3))
+    @staticmethod
+    def out_elastic(p):
+        if p in (0.0, 1.0):
+            return p
+        return 2.0 ** (-10.0 * p) * math.sin((p - 0.075) * (2.0 * math.pi) / 0.3) + 1.0
+    @staticmethod
+    def out_bounce(p):
+        if p < 1 / 2.75:
+            return 7.5625 * p * p
+        if p < 2 / 2.75:
+            p -= 1.5 / 2.75
+            return 7.5625 * p * p + 0.75
+        if p < 2.5 / 2.75:
+            p -= 2.25 / 2.75
+            return 7.5625 * p * p + 0.9375
+        p -= 2.625 / 2.75
+        return 7.5625 * p * p + 0.984375
+    @staticmethod
+    def in_bounce(p): return 1.0 - AnimationTransition.out_bounce(1.0 - p)
+    @staticmethod
+    def in_out_bounce(p):
+        if p < 0.5:
+            return AnimationTransition.in_bounce(p * 2.0) * 0.5
+        return AnimationTransition.out_bounce(p * 2.0 - 1.0) * 0.5 + 0.5
+
+class _AnimRun:
+    """One animation running on one widget."""
+    __slots__ = ('animation', 'widget', 'start', 'duration', 'props', 'pending', 'alive')
+
+class _TweenGroup:
+    """Packed tweens sharing one easing function: one array per field."""
+    __slots__ = ('ease', 'start', 'inv', 'a', 'b', 'runs', 'names', 'comps')
+    def __init__(self, ease):
+        self.ease = ease
+        self.start, self.inv = array('d'), array('d')   # start time, 1 / duration
+        self.a, self.b = array('d'), array('d')         # from, to
+        self.runs, self.names, self.comps = [], [], []  # comp -1 = scalar property
+
+class AnimationEngine:
+    """
+    Steps every active tween once per frame (``run_kivy_app``'s loop).
+
+    Tweens are grouped by easing function into packed arrays, so a frame
+    is one batched pass per easing: progress, eased values and targets
+    are computed over whole arrays.  The results are then written back
+    once per (widget, property): several components of ``pos`` or
+    ``color`` animated together make a single ``setattr``.
+    """
+    def __init__(self):
+        self.groups = {}   # easing function -> _TweenGroup
+        self.tweens = 0
+        self.frames = 0
+        self._stale = False   # runs/properties were cancelled: compact
+
+    @property
+    def active(self):
+        return self.tweens > 0
+
+    def add(self, run, ease, targets):
+        """Queue ``targets`` = [(name, comp, from, to), ...] for ``run``."""
+        group = self.groups.get(ease)
+        if group is None:
+            group = self.groups[ease] = _TweenGroup(ease)
+        inv = 1.0 / run.duration if run.duration > 0 else 1e12
+        for name, comp, a, b in targets:
+            group.start.append(run.start)
+            group.inv.append(inv)
+            group.a.append(a)
+            group.b.append(b)
+            group.runs.append(run)
+            group.names.append(name)
+            group.comps.append(comp)
+        run.pending = len(targets)
+        self.tweens += len(targets)
+        request_frame()
+
+    def discard(self):
+        """Some run or property stopped: drop its tweens on the next step."""
+        self._stale = True
+        request_frame()
+
+    def step(self, now):
+        """Advance all tweens to ``now``; returns True while some remain."""
+        if not self.tweens:
+            return False
+        self.frames += 1
+        stale, self._stale = self._stale, False
+        writes = {}      # (widget, name) -> value, or list for components
+        progressed = {}  # runs whose animation listens to on_progress
+        finished = []
+        for ease, group in list(self.groups.items()):
+            progress = [(now - s) * k for s, k in zip(group.start, group.inv)]
+            progress = [0.0 if p < 0.0 else 1.0 if p > 1.0 else p for p in progress]
+            eased = progress if ease is AnimationTransition.linear else map(ease, progress)
+            values = [x + (y - x) * e for x, y, e in zip(group.a, group.b, eased)]
+            keep = None
+            runs, names, comps = group.runs, group.names, group.comps
+            for i, value in enumerate(values):
+                run = runs[i]
+                if stale and (not run.alive or names[i] not in run.props):
+                    keep = keep if keep is not None else list(range(i))
+                    if run.alive:   # stopped property: the run may be done now
+                        run.pending -= 1
+                        if not run.pending:
+                            finished.append(run)
+                    continue
+                widget, name, comp = run.widget, names[i], comps[i]
+                if run.animation._has_progress:
+                    progressed[id(run)] = run
+                if comp < 0:
+                    writes[widget, name] = value
+                else:
+                    vector = writes.get((widget, name))
+                    if vector is None:
+                        vector = writes[widget, name] = list(getattr(widget, name))
+                    vector[comp] = value
+                if progress[i] >= 1.0:
+                    keep = keep if keep is not None else list(range(i))
+                    run.pending -= 1
+                    if not run.pending:
+                        finished.append(run)
+                elif keep is not None:
+                    keep.append(i)
+            if keep is not None:
+                self._compact(group, keep)
+        for (widget, name), value in writes.items():
+            setattr(widget, name, value)
+        # Progress / completion callbacks see the values of this frame
+        for run in progressed.values():
+            if run.alive:
+                run.animation._progress(run, now)
+        for run in finished:
+            if run.alive:
+                run.animation._done(run)
+        return self.tweens > 0
+
+    def clear(self):
+        """Drop every tween without completion callbacks (app teardown)."""
+        for group in self.groups.values():
+            for run in group.runs:
+                run.alive = False
+        self.groups.clear()
+        self.tweens = 0
+        self._stale = False
+        Animation._instances.clear()
+
+    def _compact(self, group, keep):
+        self.tweens -= len(group.runs) - len(keep)
+        if not keep:
+            del self.groups[group.ease]
+            return
+        for field in ('start', 'inv', 'a', 'b'):
+            column = getattr(group, field)
+            setattr(group, field, array('d', [column[i] for i in keep]))
+        for field in ('runs', 'names', 'comps'):
+            column = getattr(group, field)
+            setattr(group, field, [column[i] for i in keep])
+
+    def stats(self):
+        return {'tweens': self.tweens, 'groups': len(self.groups), 'frames': self.frames}
+
+ANIMATIONS = AnimationEngine()
+
+class Animation:
+    """
+    ``kivy.animation.Animation``: ``Animation(x=100, opacity=0, d=.5,
+    t='out_quad').start(widget)``.
+
+    Numeric properties and lists / tuples of numbers (``pos``, ``size``,
+    colors) are animated.  ``a + b`` runs in sequence, ``a & b`` in
+    parallel.  Events: ``on_start``, ``on_progress``, ``on_complete``
+    (``anim.bind(on_complete=lambda anim, widget: ...)``).
+    """
+    _instances = set()   # animations running on at least one widget
+
+    def __init__(self, **kwargs):
+        self._duration = kwargs.pop('d', kwargs.pop('duration', 1.0))
+        self._transition = kwargs.pop('t', kwargs.pop('transition', 'linear'))
+        kwargs.pop('s', kwargs.pop('step', None))   # always stepped per frame
+        if isinstance(self._transition, str):
+            self._transition = getattr(AnimationTransition, self._transition)
+        self._animated_properties = kwargs
+        self._widgets = {}   # widget -> _AnimRun
+        self._callbacks = {}
+        self._has_progress = type(self).on_progress is not Animation.on_progress
+
+    @property
+    def duration(self):
+        return self._duration
+    @property
+    def transition(self):
+        return self._transition
+    @property
+    def animated_properties(self):
+        return self._animated_properties
+
+    # --- events ---------------------------------------------------------
+    def bind(self, **kwargs):
+        for event, callback in kwargs.items():
+            self._callbacks.setdefault(event, []).append(callback)
+            if event == 'on_progress':
+                self._has_progress = True
+
+    def unbind(self, **kwargs):
+        for event, callback in kwargs.items():
+            callbacks = self._callbacks.get(event, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def dispatch(self, event, *args):
+        """Default handler, then the bound callbacks with ``(self, *args)``."""
+        calls = [(getattr(self, event), args)]
+        calls += [(callback, (self,) + args) for callback in self._callbacks.get(event, ())]
+        for callback, call_args in calls:
+            try:
+                callback(*call_args)
+            except Exception:
+                report_error("Animation callback error:", traceback.format_exc())
+
+    def on_start(self, widget):
+        pass
+    def on_progress(self, widget, progress):
+        pass
+    def on_complete(self, widget):
+        pass
+
+    # --- control --------------------------------------------------------
+    def start(self, widget):
+        """Animate ``widget`` from its current values (restarts if running)."""
+        self.stop(widget)
+        run = _AnimRun()
+        run.animation, run.widget, run.alive = self, widget, True
+        run.start, run.duration = Clock.get_time(), self._duration
+        run.props = set(self._animated_properties)
+        targets = []
+        for name, target in self._animated_properties.items():
+            current = getattr(widget, name)
+            if isinstance(target, (list, tuple)):
+                targets.extend((name, i, float(a), float(b))
+                               for i, (a, b) in enumerate(zip(current, target)))
+            else:
+                targets.append((name, -1, float(current), float(target)))
+        self._widgets[widget] = run
+        Animation._instances.add(self)
+        self.dispatch('on_start', widget)
+        if targets:
+            ANIMATIONS.add(run, self._transition, targets)
+        else:
+            self._done(run)
+
+    def _progress(self, run, now):
+        progress = min(max((now - run.start) / run.duration, 0.0), 1.0) if run.duration > 0 else 1.0
+        self.dispatch('on_progress', run.widget, progress)
+
+    def _done(self, run):
+        if self._widgets.get(run.widget) is run:
+            self._forget(run.widget)
+            self.dispatch('on_complete', run.widget)
+
+    def _forget(self, widget):
+        run = self._widgets.pop(widget, None)
+        if run is not None:
+            run.alive = False
+            ANIMATIONS.discard()
+        if not self._widgets:
+            Animation._instances.discard(self)
+        return run
+
+    def stop(self, widget):
+        """Stop where it is and dispatch ``on_complete``."""
+        if self._forget(widget) is not None:
+            self.dispatch('on_complete', widget)
+
+    def cancel(self, widget):
+        """Stop where it is, without ``on_complete``."""
+        self._forget(widget)
+
+    def stop_property(self, widget, prop):
+        run = self._widgets.get(widget)
+        if run is not None and prop in run.props:
+            run.props.discard(prop)
+            ANIMATIONS.discard()
+            if not run.props:
+                self.stop(widget)
+
+    def cancel_property(self, widget, prop):
+        run = self._widgets.get(widget)
+        if run is not None and prop in run.props:
+            run.props.discard(prop)
+            ANIMATIONS.discard()
+            if not run.props:
+                self.cancel(widget)
+
+    def have_properties_to_animate(self, widget):
+        run = self._widgets.get(widget)
+        return bool(run and run.props)
+
+    @staticmethod
+    def stop_all(widget, *largs):
+        """Stop every animation of ``widget`` (or only the given properties)."""
+        for animation in list(Animation._instances):
+            if largs:
+                for prop in largs:
+                    animation.stop_property(widget, prop)
+            else:
+                animation.stop(widget)
+
+    @staticmethod
+    def cancel_all(widget, *largs):
+        """Cancel every animation of ``widget`` (or only the given properties)."""
+        for animation in list(Animation._instances):
+            if largs:
+                for prop in largs:
+                    animation.cancel_property(widget, prop)
+            else:
+                animation.cancel(widget)
+
+    def __add__(self, other):
+        return Sequence(self, other)
+    def __and__(self, other):
+        return Parallel(self, other)
+
+class _CompoundAnimation(Animation):
+    def __init__(self, anim1, anim2):
+        super().__init__()
+        self.anim1, self.anim2 = anim1, anim2
+        self._animated_properties = {**anim1.animated_properties, **anim2.animated_properties}
+
+    def bind(self, **kwargs):
+        if 'on_progress' in kwargs and not self._has_progress:
+            for anim in (self.anim1, self.anim2):
+                anim.bind(on_progress=lambda sub, widget, p: self._forward_progress(sub, widget, p))
+        super().bind(**kwargs)
+
+    def _forward_progress(self, anim, widget, progress):
+        if widget in self._widgets:
+            progress = self._sub_progress(anim, progress)
+            if progress is not None:
+                self.dispatch('on_progress', widget, progress)
+
+    def _forget(self, widget):
+        run = self._widgets.pop(widget, None)
+        if not self._widgets:
+            Animation._instances.discard(self)
+        return run
+
+    def stop(self, widget):
+        found = self._forget(widget)
+        self.anim1.stop(widget)
+        self.anim2.stop(widget)
+        if found is not None:
+            self.dispatch('on_complete', widget)
+
+    def cancel(self, widget):
+        self._forget(widget)
+        self.anim1.cancel(widget)
+        self.anim2.cancel(widget)
+
+    def stop_property(self, widget, prop):
+        self.anim1.stop_property(widget, prop)
+        self.anim2.stop_property(widget, prop)
+        if widget in self._widgets and not self.have_properties_to_animate(widget):
+            self.stop(widget)
+
+    def cancel_property(self, widget, prop):
+        self.anim1.cancel_property(widget, prop)
+        self.anim2.cancel_property(widget, prop)
+        if widget in self._widgets and not self.have_properties_to_animate(widget):
+            self.cancel(widget)
+
+    def have_properties_to_animate(self, widget):
+        return (self.anim1.have_properties_to_animate(widget)
+                or self.anim2.have_properties_to_animate(widget))
+
+class Sequence(_CompoundAnimation):
+    """``anim1 + anim2``: anim2 starts when anim1 completes (``repeat`` loops)."""
+    def __init__(self, anim1, anim2):
+        super().__init__(anim1, anim2)
+        self.repeat = False
+        anim1.bind(on_complete=self._on_anim1_complete)
+        anim2.bind(on_complete=self._on_anim2_complete)
+
+    @property
+    def duration(self):
+        return self.anim1.duration + self.anim2.duration
+
+    def start(self, widget):
+        self.stop(widget)
+        self._widgets[widget] = True
+        Animation._instances.add(self)
+        self.dispatch('on_start', widget)
+        self.anim1.start(widget)
+
+    def _sub_progress(self, anim, progress):
+        d1, d2 = self.anim1.duration, self.anim2.duration
+        if anim is self.anim1:
+            return progress * d1 / ((d1 + d2) or 1.0)
+        return (d1 + progress * d2) / ((d1 + d2) or 1.0)
+
+    def _on_anim1_complete(self, anim, widget):
+        if widget in self._widgets:
+            self.anim2.start(widget)
+
+    def _on_anim2_complete(self, anim, widget):
+        if widget not in self._widgets:
+            return
+        if self.repeat:
+            self.anim1.start(widget)
+        else:
+            self._forget(widget)
+            self.dispatch('on_complete', widget)
+
+class Parallel(_CompoundAnimation):
+    """``anim1 & anim2``: both at once, complete when both are."""
+    def __init__(self, anim1, anim2):
+        super().__init__(anim1, anim2)
+        anim1.bind(on_complete=self._on_anim_complete)
+        anim2.bind(on_complete=self._on_anim_complete)
+
+    @property
+    def duration(self):
+        return max(self.anim1.duration, self.anim2.duration)
+
+    def start(self, widget):
+        self.stop(widget)
+        self._widgets[widget] = [0]
+        Animation._instances.add(self)
+        self.dispatch('on_start', widget)
+        self.anim1.start(widget)
+        self.anim2.start(widget)
+
+    def _sub_progress(self, anim, progress):
+        # the longest one drives the progress of the whole
+        if anim.duration < self.duration:
+            return None
+        return progress
+
+    def _on_anim_complete(self, anim, widget):
+        done = self._widgets.get(widget)
+        if done is None:
+            return
+        done[0] += 1
+        if done[0] == 2:
+            self._forget(widget)
+            self.dispatch('on_complete', widget)
+
+# ------------------------------------------------------------
+#  Mesure de texte : cache LRU partagé (font, text) → largeur
+# ------------------------------------------------------------
+class TextMetrics:
+    """
+    Shared text-measurement service.
 
-    def bind(self, **kwargs):
-        """Register callbacks for attribute changes (simplified)."""
-        for attr, callback in kwargs.items():
-            if not callable(callback):
-                continue
-            self._bindings.setdefault(attr, []).append(callback)
-        # Return a noop object to mimic Kivy's Binding reference
-        return lambda *a, **k: None
+    ``width(font, text)`` hits an LRU cache before calling ``measureText``;
+    ``fit_font()`` memoizes the binary search used by Button to pick the
+    largest font that fits.  ``stats()`` reports hits/misses for sizing.
+    """
+    def __init__(self, maxsize=2048, fit_maxsize=1024):
+        self.maxsize = maxsize
+        self.fit_maxsize = fit_maxsize
+        self._widths = OrderedDict()
+        self._fits = OrderedDict()
+        self.hits = self.misses = 0
 
-    def setter(self, attr_name):
-        """Return a simple setter function (Kivy compatibility)."""
-        def _set(instance, value):
-            setattr(self, attr_name, value)
-            if attr_name == 'size' and isinstance(value, (tuple, list)) and len(value) == 2:
-                self._update_scalar_sizes()
-            elif attr_name == 'width':
-                self.size = (value, self.size[1]);
-            elif attr_name == 'height':
-                self.size = (self.size[0], value);
-            # Notify bound callbacks if any
-            for cb in self._bindings.get(attr_name, []):
-                try:
-                    cb(instance, value)
-                except Exception:
-                    pass
-        return _set
-    # keep scalar attributes synced
-    def _update_scalar_sizes(self):
-        self.width, self.height = self.size
-    def on_touch_down(self, touch):
-        # Parcourt les enfants en sens inverse pour gérer le z‑order implicite
-        for child in reversed(self.children):
-            if hasattr(child, 'on_touch_down') and child.on_touch_down(touch):
-                return True  # événement consommé
-        return False
-    def draw(self):
-        """Dessine récursivement en ignorant les objets sans .draw(),
-        et loggue les erreurs plutôt que de casser la boucle JS."""
-        for child in self.children:
-            if not isinstance(child, WidgetLite):
-                continue
-            draw_fn = getattr(child, "draw", None)
-            if callable(draw_fn):
-                try:
-                    draw_fn()
-                except Exception as exc:
-                    from js import console
-                    console.error(f"Draw error in child {child!r}: {exc}")
+    def _measure(self, font, text):
+        # Measure on the real context without touching its drawing state
+        raw = getattr(ctx, 'target', ctx)
+        raw.save()
+        raw.font = font
+        w = raw.measureText(text).width
+        raw.restore()
+        return float(w)
 
-# Alias pour compatibilité Kivy
-class Widget(WidgetLite):
-    """Alias minimal pour `kivy.uix.widget.Widget`."""
-    pass
+    def width(self, font, text):
+        key = (font, text)
+        cache = self._widths
+        w = cache.get(key)
+        if w is not None:
+            self.hits += 1
+            cache.move_to_end(key)
+            return w
+        self.misses += 1
+        w = cache[key] = self._measure(font, text)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return w
 
-# --- Primitive drawings ---
+    def fit_font(self, text, width, max_size=16, min_size=8, padding=10,
+                 family='sans-serif'):
+        """Largest font size (px) whose text fits ``width`` minus padding.
 
-COLOR_MAP = {
-    'primary':'#6200EE', 'accent':'#03DAC6', 'error':'#B00020',
-    'white':'#FFFFFF','black':'#000000','gray':'#9E9E9E',
-    'red':'crimson','green':'seagreen','blue':'steelblue'
-}
+        Returns ``(font_size, text_width)``.  The result is memoized per
+        ``(text, width, ...)``.
+        """
+        key = (text, width, max_size, min_size, padding, family)
+        fits = self._fits
+        hit = fits.get(key)
+        if hit is not None:
+            fits.move_to_end(key)
+            return hit
+        lo, hi, best = min_size, max_size, min_size
+        avail = width - padding * 2
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            if self.width(f"{mid}px {family}", text) <= avail:
+                best, lo = mid, mid + 1
+            else:
+                hi = mid - 1
+        result = fits[key] = (best, self.width(f"{best}px {family}", text))
+        if len(fits) > self.fit_maxsize:
+            fits.popitem(last=False)
+        return result
 
-# --- Simple fallback for a few Material‑Design icons ----------------------
-ICON_MAP = {
-    "close": "\u2715",   # ×
-    "add":   "\u2795",   # ➕
-    "cog":   "\u2699",   # ⚙
-    "star":  "\u2605",   # ★
-}
+    def ellipsize(self, font, text, max_width, ellipsis='\u2026'):
+        """Longest prefix of ``text`` (plus ellipsis) that fits ``max_width``."""
+        if self.width(font, text) <= max_width:
+            return text
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.width(font, text[:mid] + ellipsis) <= max_width:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo] + ellipsis
+
+    def clear(self):
+        self._widths.clear()
+        self._fits.clear()
 
-def set_fill(color): ctx.fillStyle = COLOR_MAP.get(color, color)
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._widths), 'maxsize': self.maxsize,
+            'fits': len(self._fits),
+        }
 
-def set_stroke(color): ctx.strokeStyle = COLOR_MAP.get(color, color)
+TEXT_METRICS = TextMetrics()
 
 # ------------------------------------------------------------
 #  Kivy helper: dp() — density-independent pixels (simplifié)
@@ -142,41 +3416,26 @@ def dp(value):
     """Convertit une valeur « dp » en pixels (calcul grossier)."""
     return int(_ceil_dp(float(value)))
 
-# Ensure top‑level "kivy" package exists so `import kivy` succeeds
-import types
-import sys
-kivy = types.ModuleType('kivy')
-sys.modules['kivy'] = kivy
-
-# Register kivy.metrics module with dp helper
-kivy_metrics = types.ModuleType('kivy.metrics')
-kivy_metrics.dp = dp
-sys.modules['kivy.metrics'] = kivy_metrics
-# Expose as attribute of top‑level kivy
-setattr(kivy, 'metrics', kivy_metrics)
-    
-class StringProperty:
-    def __init__(self, default=""):
-        self.value = default
-    def __get__(self, instance, owner):
-        return self.value
-    def __set__(self, instance, value):
-        self.value = str(value)
-        
 class Popup(WidgetLite):
     """Popup minimaliste."""
+    __slots__ = ()
+    title = StringProperty('')
+    content = ObjectProperty(None)
+    opened = BooleanProperty(False)
     def __init__(self, title="", content=None, **kwargs):
         super().__init__(**kwargs)
         self.title = title
         self.content = content or WidgetLite()
         self.opened = False
-    def open(self):    self.opened = True
-    def dismiss(self): self.opened = False
+    def open(self):    self.opened = True; HIT_INDEX.invalidate()
+    def dismiss(self): self.opened = False; HIT_INDEX.invalidate()
+    def hit_children(self):
+        return ([self.content] if self.opened else []) + self.children
     def draw(self):
         if self.opened:
             w, h = 300, 200
-            x = (window.innerWidth - w) / 2
-            y = (window.innerHeight - h) / 2
+            x = (Window.width - w) / 2
+            y = (Window.height - h) / 2
             set_fill('white'); ctx.fillRect(x, y, w, h)
             ctx.font = '18px sans-serif'; set_fill('black')
             ctx.fillText(self.title, x + 10, y + 30)
@@ -188,13 +3447,17 @@ class Popup(WidgetLite):
         
         
 class MDDropdownMenu(WidgetLite):
+    __slots__ = ()
+    caller = ObjectProperty(None)
+    items = ListProperty()
+    opened = BooleanProperty(False)
     def __init__(self, caller=None, items=None, width_mult=4, **kwargs):
         super().__init__(**kwargs)
         self.caller = caller
         self.items = items or []
         self.opened = False
-    def open(self):    self.opened = True
-    def dismiss(self): self.opened = False
+    def open(self):    self.opened = True; HIT_INDEX.invalidate()
+    def dismiss(self): self.opened = False; HIT_INDEX.invalidate()
     def draw(self):
         if self.opened:
             for i, item in enumerate(self.items):
@@ -205,11 +3468,23 @@ class MDDropdownMenu(WidgetLite):
 
 # --- Labels ---
 class Label(WidgetLite):
+    __slots__ = ()
+    text = StringProperty('')
+    font = StringProperty('16px sans-serif')
+    color = ObjectProperty('black')
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.text = kwargs.get('text','')
         self.font = kwargs.get('font','16px sans-serif')
         self.color = kwargs.get('color','black')
+    @property
+    def texture_size(self):
+        """Rendered text size (width from the shared metrics cache)."""
+        try:
+            font_px = float(self.font.split('px')[0].split()[-1])
+        except ValueError:
+            font_px = 16.0
+        return (TEXT_METRICS.width(self.font, self.text), font_px)
     def draw(self):
         ctx.font = self.font
         set_fill(self.color)
@@ -218,6 +3493,11 @@ class Label(WidgetLite):
 
 # --- Buttons ---
 class Button(WidgetLite):
+    __slots__ = ('on_press', 'on_release', '_fit_key', '_fit')
+    text = StringProperty('Button')
+    bg_color = ObjectProperty('gray')
+    text_color = ObjectProperty('white')
+    radius = NumericProperty(5)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.text = kwargs.get('text', 'Button')
@@ -227,11 +3507,12 @@ class Button(WidgetLite):
         self.bg_color = kwargs.get('bg_color','gray')
         self.text_color = kwargs.get('text_color','white')
         self.radius = kwargs.get('radius',5)
+        self._fit_key = None  # (text, w) of the memoized font fit
+        self._fit = (16, 0)
     def draw(self):
+        # One save/restore covers opacity and the text clip
         ctx.save()
-        # Apply widget‑level opacity if different from 1
-        if hasattr(self, "opacity"):
-            ctx.globalAlpha = max(0, min(1, self.opacity))
+        ctx.globalAlpha = max(0, min(1, self.opacity))
         # background
         set_fill(self.bg_color)
         ctx.beginPath()
@@ -239,18 +3520,17 @@ class Button(WidgetLite):
         ctx.fill()
         ctx.closePath()
 
-        # choose a font size that fits horizontally
-        font_size = 16
-        ctx.font = f"{font_size}px sans-serif"
-        tw = ctx.measureText(self.text).width
+        # choose a font size that fits horizontally (recomputed only when
+        # text or size change)
         padding = 10
-        while tw + padding * 2 > self.size[0] and font_size > 8:
-            font_size -= 1
-            ctx.font = f"{font_size}px sans-serif"
-            tw = ctx.measureText(self.text).width
+        fit_key = (self.text, self.size[0])
+        if fit_key != self._fit_key:
+            self._fit = TEXT_METRICS.fit_font(self.text, self.size[0], padding=padding)
+            self._fit_key = fit_key
+        font_size, tw = self._fit
+        ctx.font = f"{font_size}px sans-serif"
 
         # clip text so it never spills vertically
-        ctx.save()
         ctx.beginPath()
         ctx.roundRect(self.x + padding, self.y + 2, self.size[0] - padding * 2, self.size[1] - 4, self.radius)
         ctx.clip()
@@ -260,7 +3540,6 @@ class Button(WidgetLite):
         ty = self.y + (self.size[1] + font_size / 2) / 2
         ctx.fillText(self.text, tx, ty)
         ctx.restore()
-        ctx.restore()
         super().draw()
     def on_touch_down(self, touch):
         x, y = touch.clientX, touch.clientY
@@ -270,21 +3549,20 @@ class Button(WidgetLite):
             if callable(self.on_release) and self.on_release is not self.on_press:
                 self.on_release()
             # Trigger callbacks registered via .bind()
-            for cb in self._bindings.get('on_press', []):
-                try:
-                    cb(self)
-                except Exception:
-                    pass
-            for cb in self._bindings.get('on_release', []):
-                try:
-                    cb(self)
-                except Exception:
-                    pass
+            self.dispatch('on_press')
+            self.dispatch('on_release')
             return True
         return super().on_touch_down(touch)
 
 # --- TextInput ---
 class TextInput(WidgetLite):
+    __slots__ = ()
+    text = StringProperty('')
+    font = StringProperty('16px sans-serif')
+    color = ObjectProperty('black')
+    bg_color = ObjectProperty('white')
+    cursor_color = ObjectProperty('black')
+    focused = BooleanProperty(False)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.text = kwargs.get('text', '')
@@ -303,24 +3581,32 @@ class TextInput(WidgetLite):
         ctx.fillText(self.text, self.x + 5, self.y + self.size[1] - 8)
         # curseur
         if self.focused:
-            tw = ctx.measureText(self.text).width
+            tw = TEXT_METRICS.width(self.font, self.text)
             cursor_x = self.x + 5 + tw + 1
             set_fill(self.cursor_color)
             ctx.fillRect(cursor_x, self.y + 4, 1, self.size[1] - 8)
         super().draw()
     def on_touch_down(self, touch):
-        global ACTIVE_TEXTINPUT
-        x, y = touch.clientX, touch.clientY
-        inside = self.x <= x <= self.x + self.size[0] and self.y <= y <= self.y + self.size[1]
-        self.focused = inside
-        # mettre à jour le pointeur global
-        if inside:
-            ACTIVE_TEXTINPUT = self
+        if self.collide_point(touch.x, touch.y):
+            # le clavier suit le dernier TextInput touché
+            Window.set_focus(self)
             return True
         return super().on_touch_down(touch)
+    def on_key_down(self, key):
+        if key == 'Backspace':
+            self.text = self.text[:-1]
+        elif len(key) == 1:
+            self.text += key
+        else:
+            return False
+        return True
 
 # --- Slider ---
 class Slider(WidgetLite):
+    __slots__ = ('on_value',)
+    min = NumericProperty(0)
+    max = NumericProperty(100)
+    value = NumericProperty(50)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.min = kwargs.get('min',0)
@@ -328,7 +3614,9 @@ class Slider(WidgetLite):
         self.value = kwargs.get('value',(self.min+self.max)/2)
         self.on_value = kwargs.get('on_value', lambda v: None)
     def _set_value_from_x(self, x):
-        self.value = self.min + (x - self.x) / self.size[0] * (self.max - self.min)
+        # the grabbed touch may leave the track: clamp to [min, max]
+        ratio = min(max((x - self.x) / self.size[0], 0.0), 1.0) if self.size[0] else 0.0
+        self.value = self.min + ratio * (self.max - self.min)
         self.on_value(self.value)
     def draw(self):
         # track
@@ -338,18 +3626,27 @@ class Slider(WidgetLite):
         set_fill('primary'); ctx.beginPath(); ctx.arc(pos,self.y+self.size[1]/2,self.size[1]/2,0,2*3.14); ctx.fill(); ctx.closePath()
         super().draw()
     def on_touch_down(self, touch):
-        global ACTIVE_SLIDER
-        x, y = touch.clientX, touch.clientY
-        inside = (self.x <= x <= self.x + self.size[0] and
-                  self.y <= y <= self.y + self.size[1])
-        if inside:
-            ACTIVE_SLIDER = self
-            self._set_value_from_x(x)
+        if self.collide_point(touch.x, touch.y):
+            # drag : chaque doigt / pointeur déplace son propre slider
+            touch.grab(self)
+            self._set_value_from_x(touch.x)
             return True
         return super().on_touch_down(touch)
+    def on_touch_move(self, touch):
+        if touch.grab_current is self:
+            self._set_value_from_x(touch.x)
+            return True
+        return False
+    def on_touch_up(self, touch):
+        if touch.grab_current is self:
+            touch.ungrab(self)
+            return True
+        return False
 
 # --- Switch ---
 class Switch(WidgetLite):
+    __slots__ = ('on_active',)
+    active = BooleanProperty(False)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.active = kwargs.get('active',False)
@@ -365,10 +3662,14 @@ class Switch(WidgetLite):
         x,y=touch.clientX,touch.clientY
         if self.x<=x<=self.x+self.size[0] and self.y<=y<=self.y+self.size[1]:
             self.active = not self.active; self.on_active(self.active)
-        super().on_touch_down(touch)
+            return True
+        return super().on_touch_down(touch)
 
 # --- ProgressBar ---
 class ProgressBar(WidgetLite):
+    __slots__ = ()
+    value = NumericProperty(0)
+    max = NumericProperty(100)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.value = kwargs.get('value',0)
@@ -379,101 +3680,235 @@ class ProgressBar(WidgetLite):
         super().draw()
 
 # --- Layouts ---
-class BoxLayout(WidgetLite):
+_LAYOUT_QUEUE = set()
+
+def _layout_depth(widget):
+    depth = 0
+    while widget is not None:
+        widget = widget.parent
+        depth += 1
+    return depth
+
+def run_layouts(max_passes=8):
+    """Lay out every invalidated layout, parents before children.
+
+    Called once per frame by the frame loop, before drawing.  A parent
+    resizing its children re-queues the nested layouts, which are then
+    handled in the same call (bounded by ``max_passes``).
+    """
+    passes = 0
+    while _LAYOUT_QUEUE and passes < max_passes:
+        batch = sorted(_LAYOUT_QUEUE, key=_layout_depth)
+        _LAYOUT_QUEUE.clear()
+        for layout in batch:
+            if layout._layout_pending:
+                layout.do_layout()
+        passes += 1
+
+def _parse_padding(padding):
+    """Kivy padding: p, [horizontal, vertical] or [left, top, right, bottom]."""
+    if isinstance(padding, (int, float)):
+        return (padding,) * 4
+    if len(padding) == 2:
+        return (padding[0], padding[1], padding[0], padding[1])
+    return tuple(padding)
+
+def _resize(widget, w, h):
+    widget.size = (w, h)
+    widget._update_scalar_sizes()
+
+class Layout(WidgetLite):
+    """
+    Base class for layouts (mirrors `kivy.uix.layout.Layout`).
+
+    Children are arranged by ``do_layout()``, which only runs when the
+    layout is invalidated (child added/removed, size, hint, spacing,
+    padding or orientation change).  Positions are kept between frames;
+    ``draw()`` just paints.
+    """
+    __slots__ = ('_layout_pending', '_in_layout')
+    padding = ObjectProperty(0)
+    minimum_width = NumericProperty(0)
+    minimum_height = NumericProperty(0)
+
+    def __new__(cls, *args, **kwargs):
+        self = super().__new__(cls, *args, **kwargs)
+        self._layout_pending = False
+        self._in_layout = False
+        return self
+
+    def __init__(self, **kwargs):
+        self.padding = kwargs.pop('padding', 0)
+        self.minimum_width = 0
+        self.minimum_height = 0
+        super().__init__(**kwargs)
+        self._trigger_layout()
+
+    def _trigger_layout(self, *args):
+        if not self._layout_pending:
+            self._layout_pending = True
+            _LAYOUT_QUEUE.add(self)
+            mark_dirty()
+
+    def _geometry_changed(self, name):
+        super()._geometry_changed(name)
+        if name in _SELF_LAYOUT_PROPS:
+            self._trigger_layout()
+
+    def add_widget(self, widget):
+        super().add_widget(widget)
+        self._trigger_layout()
+    def remove_widget(self, widget):
+        super().remove_widget(widget)
+        self._trigger_layout()
+    def clear_widgets(self):
+        super().clear_widgets()
+        self._trigger_layout()
+
+    def do_layout(self, *args):
+        self._layout_pending = False
+        self._in_layout = True
+        try:
+            self._arrange([c for c in self.children if isinstance(c, WidgetLite)])
+        finally:
+            self._in_layout = False
+
+    def _arrange(self, children):
+        pass
+
+    def draw(self):
+        # Layouts drawn outside the frame loop (e.g. Popup content)
+        if self._layout_pending:
+            self.do_layout()
+        super().draw()
+
+class BoxLayout(Layout):
+    __slots__ = ()
+    orientation = OptionProperty('horizontal', options=('horizontal', 'vertical'))
     def __init__(self, orientation='horizontal', spacing=5, **kwargs):
         super().__init__(**kwargs)
         self.orientation, self.spacing = orientation, spacing
-    def draw(self):
+    def _arrange(self, children):
         """
-        Improved draw that honours size_hint_x / size_hint_y like real Kivy.
+        Honour size_hint_x / size_hint_y like real Kivy.
 
-        * In an **horizontal** layout we share the parent width between children
-          following each child's ``size_hint_x`` (``None`` → keep current width).
-        * In a **vertical** layout we do the same with ``size_hint_y`` and the
-          parent height.
+        * Along the main axis, children with a hint share the space left by
+          fixed-size children, padding and spacing, in proportion to their
+          hints; ``None`` keeps the child's explicit size.
+        * Across, children stretch to the inner size (``hint * inner`` when
+          a hint is set) unless the cross hint was explicitly set to None.
 
-        Widgets without size hints keep their explicit ``size``.  After sizing,
-        children are positioned sequentially with the configured ``spacing``.
+        Children are stacked from the top-left, separated by ``spacing``.
+        ``minimum_width`` / ``minimum_height`` report the size the fixed
+        children need, for ``bind(minimum_height=self.setter('height'))``.
         """
-        parent_w, parent_h = self.size
+        pl, pt, pr, pb = _parse_padding(self.padding)
+        inner_w = self.size[0] - pl - pr
+        inner_h = self.size[1] - pt - pb
+        horizontal = self.orientation == 'horizontal'
+        main = 0 if horizontal else 1
+        inner_main, inner_cross = (inner_w, inner_h) if horizontal else (inner_h, inner_w)
+        spacing = self.spacing * max(len(children) - 1, 0)
+
+        total_hint = fixed = 0
+        min_cross = 0
+        for c in children:
+            hint = c.size_hint_x if horizontal else c.size_hint_y
+            if hint is None:
+                fixed += c.size[main]
+            else:
+                total_hint += hint
+            cross_hint = c.size_hint_y if horizontal else c.size_hint_x
+            if cross_hint is None and c._hint_set[1 - main]:
+                min_cross = max(min_cross, c.size[1 - main])
+        stretch = max(inner_main - fixed - spacing, 0)
 
-        if self.orientation == 'horizontal':
-            total_hint = sum((c.size_hint_x or 0) for c in self.children)
+        offset = pl if horizontal else pt
+        for c in children:
+            hint = c.size_hint_x if horizontal else c.size_hint_y
+            length = c.size[main] if hint is None else stretch * hint / total_hint
+            cross_hint = c.size_hint_y if horizontal else c.size_hint_x
+            if cross_hint is not None:
+                cross = inner_cross * cross_hint
+            elif c._hint_set[1 - main]:
+                cross = c.size[1 - main]   # size_hint=(None, None): keep
+            else:
+                cross = inner_cross        # legacy default: fill the cross axis
+            if horizontal:
+                _resize(c, length, cross)
+                c.x, c.y = self.x + offset, self.y + pt
+            else:
+                _resize(c, cross, length)
+                c.x, c.y = self.x + pl, self.y + offset
+            offset += length + self.spacing
+
+        if horizontal:
+            self.minimum_width = fixed + spacing + pl + pr
+            self.minimum_height = min_cross + pt + pb
         else:
-            total_hint = sum((c.size_hint_y or 0) for c in self.children)
-
-        # Avoid division by zero
-        total_hint = total_hint if total_hint else 1
-
-        offset = 0
-        for c in self.children:
-            if not isinstance(c, WidgetLite):
-                continue  # ignore stray objects
-
-            if self.orientation == 'horizontal':
-                # Width allocation
-                if c.size_hint_x is not None:
-                    share = (c.size_hint_x or 0) / total_hint
-                    c.size = (parent_w * share, c.size[1])
-                    # Always take full cross-axis (height)
-                    c.size = (c.size[0], parent_h)
-                    c._update_scalar_sizes()
-                else:
-                    # Even if no hint, still take full cross-axis
-                    c.size = (c.size[0], parent_h)
-                    c._update_scalar_sizes()
-                c.x, c.y = self.x + offset, self.y
-                offset += c.size[0] + self.spacing
-            else:  # vertical
-                if c.size_hint_y is not None:
-                    share = (c.size_hint_y or 0) / total_hint
-                    c.size = (c.size[0], parent_h * share)
-                    # Always take full cross-axis (width)
-                    c.size = (parent_w, c.size[1])
-                    c._update_scalar_sizes()
-                else:
-                    # Even if no hint, still take full cross-axis
-                    c.size = (parent_w, c.size[1])
-                    c._update_scalar_sizes()
-                c.x, c.y = self.x, self.y + offset
-                offset += c.size[1] + self.spacing
-
-            # Safe draw
-            draw_child = getattr(c, 'draw', None)
-            if callable(draw_child):
-                try:
-                    draw_child()
-                except Exception as exc:
-                    from js import console
-                    console.error('Draw error (BoxLayout child):', exc)
+            self.minimum_height = fixed + spacing + pt + pb
+            self.minimum_width = min_cross + pl + pr
 
 class GridLayout(BoxLayout):
-    def __init__(self, cols=2, **kwargs): super().__init__(**kwargs); self.cols=cols
-    def draw(self):
-        w, h = self.size
-        rows = (len(self.children) + self.cols - 1) // self.cols or 1
-        cw = w / self.cols
-        ch = h / rows
-        # Auto‑grow vertically if height is zero so children become visible
+    __slots__ = ()
+    cols = NumericProperty(2)
+    row_default_height = NumericProperty(100)
+    def __init__(self, cols=2, spacing=0, **kwargs):
+        self.row_default_height = kwargs.pop('row_default_height', 100)
+        super().__init__(spacing=spacing, **kwargs); self.cols=cols
+    def _arrange(self, children):
+        """
+        Uniform columns; a row is as tall as its tallest fixed-height child
+        (``size_hint_y=None``), remaining rows share the leftover height.
+        A zero height auto-grows to ``minimum_height``.  ``spacing``
+        defaults to 0, as in Kivy.
+        """
+        pl, pt, pr, pb = _parse_padding(self.padding)
+        cols = max(self.cols, 1)
+        rows = (len(children) + cols - 1) // cols or 1
+        cw = (self.size[0] - pl - pr - self.spacing * (cols - 1)) / cols
+
+        fixed_rows = {}
+        for i, c in enumerate(children):
+            if c.size_hint_y is None and c._hint_set[1]:
+                row = i // cols
+                fixed_rows[row] = max(fixed_rows.get(row, 0), c.size[1])
+        fixed_total = sum(fixed_rows.values())
+        flex_rows = rows - len(fixed_rows)
+        spacing_h = self.spacing * (rows - 1)
+        self.minimum_height = (fixed_total + flex_rows * self.row_default_height
+                               + spacing_h + pt + pb)
+        self.minimum_width = self.size[0]
+        # Auto‑grow vertically if height is zero so children become visible;
+        # pending while resizing, so this layout is not queued again
         if self.size[1] == 0:
-            self.size = (self.size[0] or cw * self.cols, rows * ch)
-        for i in range(len(self.children)):
-            c = self.children[i]
-            if not isinstance(c, WidgetLite):
-                continue
-            row, col = divmod(i, self.cols)
-            c.x = self.x + col * cw
-            c.y = self.y + row * ch
-            c.size = (cw, ch)
-            if hasattr(c, 'draw') and callable(c.draw):
-                try:
-                    c.draw()
-                except Exception as exc:
-                    from js import console
-                    console.error('Draw error (GridLayout child):', exc)
+            self._layout_pending = True
+            try:
+                _resize(self, self.size[0], self.minimum_height)
+            finally:
+                self._layout_pending = False
+        inner_h = self.size[1] - pt - pb
+        flex_h = (max(inner_h - fixed_total - spacing_h, 0) / flex_rows) if flex_rows else 0
+
+        y = self.y + pt
+        for row in range(rows):
+            rh = fixed_rows.get(row, flex_h)
+            for col in range(cols):
+                i = row * cols + col
+                if i >= len(children):
+                    break
+                c = children[i]
+                fixed_w = c.size_hint_x is None and c._hint_set[0]
+                fixed_h = c.size_hint_y is None and c._hint_set[1]
+                _resize(c, c.size[0] if fixed_w else cw, c.size[1] if fixed_h else rh)
+                c.x = self.x + pl + col * (cw + self.spacing)
+                c.y = y
+            y += rh + self.spacing
 
 # --- Screen & Manager ---
 class Screen(WidgetLite):
+    __slots__ = ()
+    name = StringProperty('')
     def __init__(self, name, **kwargs): super().__init__(**kwargs); self.name=name
 
 # Replacement ScreenManager implementation
@@ -489,18 +3924,567 @@ class ScreenManager:
         if self.current is None:
             self.current = s
     def switch_to(self, name):
-        self.current = self.screens.get(name, self.current)
+        screen = self.screens.get(name, self.current)
+        if screen is not self.current:
+            self.current = screen
+            HIT_INDEX.invalidate()
+            mark_dirty()
     def draw(self):
         if self.current:
-            self.current.draw()
+            draw_widget(self.current)
+    def hit_children(self):
+        return [self.current] if self.current else []
     def on_touch_down(self, t):
         if self.current:
             return self.current.on_touch_down(t)
         return False
 
-# Ensure the stub with updated signature is exposed in the faux module
-if 'kivy.uix.screenmanager' in sys.modules:
-    sys.modules['kivy.uix.screenmanager'].ScreenManager = ScreenManager
+# ------------------------------------------------------------
+#  Instructions graphiques : canvas.before / canvas / canvas.after
+# ------------------------------------------------------------
+# Path commands of the define_path op (drawlist.js definePath, keep in sync).
+# _PATH_POLY is followed by a point count and the points.
+_PATH_MOVE, _PATH_LINE, _PATH_CLOSE, _PATH_POLY, _PATH_ELLIPSE, _PATH_RECT, \
+    _PATH_ROUND_RECT = range(7)
+_PATH_CALLS = {_PATH_MOVE: ('moveTo', 2), _PATH_LINE: ('lineTo', 2), _PATH_CLOSE: ('closePath', 0),
+               _PATH_ELLIPSE: ('ellipse', 7), _PATH_RECT: ('rect', 4)}
+
+def _replay_path(target, commands):
+    """Run a path command buffer straight on the context (no draw list)."""
+    target.beginPath()
+    i, n = 0, len(commands)
+    while i < n:
+        cmd = int(commands[i])
+        if cmd == _PATH_POLY:
+            end = i + 2 + 2 * int(commands[i + 1])
+            target.moveTo(commands[i + 2], commands[i + 3])
+            for j in range(i + 4, end, 2):
+                target.lineTo(commands[j], commands[j + 1])
+            i = end
+        elif cmd == _PATH_ROUND_RECT:
+            target.roundRect(*commands[i + 1:i + 5], list(commands[i + 5:i + 9]))
+            i += 9
+        else:
+            name, arity = _PATH_CALLS[cmd]
+            getattr(target, name)(*commands[i + 1:i + 1 + arity])
+            i += 1 + arity
+
+class PathCache:
+    """
+    Path2D geometry of the canvas instructions, kept in drawlist.js.
+
+    An instruction compiles its geometry once into a command buffer
+    (``array('d')``), sent with one ``define_path`` op.  Every frame then
+    draws it with a single ``fill_path`` / ``stroke_path``, however many
+    points it has; the path is sent again only after its geometry
+    changed.  Freed instructions drop their path on the next draw.
+    Without a draw list the commands are replayed on the context.
+    """
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._released = []   # ids of freed instructions, dropped on the next draw
+        self.paths = 0
+        self.defines = self.hits = self.replays = 0
+
+    def enabled(self):
+        return hasattr(ctx, 'define_path')
+
+    def _release(self, path_id):
+        self._released.append(path_id)
+        self.paths -= 1
+
+    def draw(self, instruction, stroke):
+        commands = instruction._geometry()
+        if not self.enabled():
+            self.replays += 1
+            _replay_path(ctx, commands)
+            if stroke:
+                ctx.stroke()
+            else:
+                ctx.fill()
+            return
+        if self._released:
+            released, self._released = self._released, []
+            for path_id in released:
+                ctx.drop_path(path_id)
+        path_id = instruction._path_id
+        if path_id is None:
+            path_id = instruction._path_id = next(self._ids)
+            weakref.finalize(instruction, self._release, path_id)
+            self.paths += 1
+        if instruction._path_sent:
+            self.hits += 1
+        else:
+            ctx.define_path(path_id, commands)
+            instruction._path_sent = True
+            self.defines += 1
+        if stroke:
+            ctx.stroke_path(path_id)
+        else:
+            ctx.fill_path(path_id)
+
+    def stats(self):
+        return {'paths': self.paths, 'defines': self.defines, 'hits': self.hits,
+                'replays': self.replays}
+
+PATHS = PathCache()
+
+_CANVAS_STACK = []   # groups opened with ``with widget.canvas:``
+_WHITE = _rgba_css(1, 1, 1, 1)
+_UNSET = object()
+
+def _graphic_attr(slot, convert=None, geometry=True):
+    """Instruction attribute: a change redraws, and recompiles the path if ``geometry``."""
+    def setter(self, value):
+        if convert is not None:
+            value = convert(value)
+        if getattr(self, slot, _UNSET) == value:
+            return
+        setattr(self, slot, value)
+        if geometry:
+            self._geometry_changed()
+        else:
+            self._changed()
+    return property(attrgetter(slot), setter)
+
+def _flat_points(points):
+    """``[x1, y1, x2, y2, ...]`` from flat numbers or ``(x, y)`` pairs."""
+    points = list(points or ())
+    if points and isinstance(points[0], (tuple, list)):
+        points = [v for point in points for v in point]
+    return points
+
+def _corner_radii(radius):
+    """Four corner radii (top-left, top-right, bottom-right, bottom-left)."""
+    if isinstance(radius, (int, float)):
+        radius = [radius]
+    radii = [r[0] if isinstance(r, (tuple, list)) else r for r in radius] or [0]
+    if len(radii) < 4:
+        radii = (radii * 4)[:4]
+    return tuple(max(0.0, float(r)) for r in radii[:4])
+
+class Instruction:
+    """Base of the ``kivy.graphics`` instructions."""
+    __slots__ = ('_parent', 'group', '__dict__', '__weakref__')
+
+    def __init__(self, group=None, **kwargs):
+        self._parent = None
+        self.group = group
+        # Created inside ``with widget.canvas:``: added to it, like Kivy
+        if _CANVAS_STACK and not isinstance(self, CanvasBase):
+            _CANVAS_STACK[-1].add(self)
+
+    def _changed(self):
+        if not _NEEDS_REDRAW:
+            mark_dirty()
+        if LAYER_CACHE.layers:   # the cached layer of the widget holding it is stale
+            node = self
+            while node._parent is not None:
+                node = node._parent
+            owner = getattr(node, '_owner', None)
+            widget = owner() if owner is not None else None
+            if widget is not None:
+                widget._invalidate_layers()
+
+    def draw(self, state):
+        """Render with ``state[0]``, the CSS color set by the last ``Color``."""
+
+class InstructionGroup(Instruction):
+    """Ordered instructions; a nested group shares its parent's current color."""
+    __slots__ = ('children',)
+
+    def __init__(self, **kwargs):
+        self.children = []
+        super().__init__(**kwargs)
+
+    def add(self, instruction):
+        self.insert(len(self.children), instruction)
+
+    def insert(self, index, instruction):
+        if instruction._parent is not None:
+            instruction._parent.remove(instruction)
+        self.children.insert(index, instruction)
+        instruction._parent = self
+        self._changed()
+
+    def remove(self, instruction):
+        self.children.remove(instruction)
+        instruction._parent = None
+        self._changed()
+
+    def clear(self):
+        for instruction in self.children:
+            instruction._parent = None
+        self.children.clear()
+        self._changed()
+
+    def get_group(self, groupname):
+        return [i for i in self.children if i.group == groupname]
+
+    def remove_group(self, groupname):
+        for instruction in self.get_group(groupname):
+            self.remove(instruction)
+
+    def __len__(self):
+        return len(self.children)
+
+    def draw(self, state=None):
+        if state is None:
+            state = [_WHITE]   # each canvas part starts white, as a fresh Kivy canvas
+        for instruction in self.children:
+            instruction.draw(state)
+
+class CanvasBase(InstructionGroup):
+    """Group usable as ``with group:``; instructions created inside are added."""
+    __slots__ = ()
+
+    def __enter__(self):
+        _CANVAS_STACK.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _CANVAS_STACK.pop()
+
+    def ask_update(self):
+        self._changed()
+
+class Canvas(CanvasBase):
+    """
+    A widget's ``canvas``.  ``canvas.before`` is drawn before the widget,
+    ``canvas`` between the widget's own drawing and its children,
+    ``canvas.after`` after the children.
+    """
+    __slots__ = ('_owner', '_before', '_after')
+
+    def __init__(self, owner=None, **kwargs):
+        self._owner = weakref.ref(owner) if owner is not None else None
+        self._before = self._after = None
+        super().__init__(**kwargs)
+
+    @property
+    def before(self):
+        if self._before is None:
+            self._before = CanvasBase()
+            self._before._parent = self
+        return self._before
+
+    @property
+    def after(self):
+        if self._after is None:
+            self._after = CanvasBase()
+            self._after._parent = self
+        return self._after
+
+    @property
+    def has_before(self):
+        return self._before is not None
+
+    @property
+    def has_after(self):
+        return self._after is not None
+
+class Color(Instruction):
+    """
+    ``kivy.graphics.Color``: RGBA floats 0‒1 used by the instructions
+    that follow.  ``Color(r, g, b[, a])``, ``Color(rgba=...)``,
+    ``Color(h, s, v, mode='hsv')``.
+    """
+    __slots__ = ('_rgba', '_css')
+
+    def __init__(self, *args, mode='rgb', **kwargs):
+        if mode == 'hsv' and args:
+            import colorsys
+            args = colorsys.hsv_to_rgb(*args[:3]) + tuple(args[3:4])
+        rgba = list(args[:4]) + [1.0] * (4 - len(args[:4]))
+        if 'rgba' in kwargs:
+            rgba = list(kwargs.pop('rgba'))
+        if 'rgb' in kwargs:
+            rgba[:3] = kwargs.pop('rgb')
+        for i, name in enumerate('rgba'):
+            if name in kwargs:
+                rgba[i] = kwargs.pop(name)
+        self._rgba = tuple(rgba)
+        self._css = None
+        super().__init__(**kwargs)
+
+    @property
+    def rgba(self):
+        return self._rgba
+    @rgba.setter
+    def rgba(self, value):
+        value = tuple(value)
+        if len(value) == 3:
+            value += (self._rgba[3],)
+        if value != self._rgba:
+            self._rgba, self._css = value, None
+            self._changed()
+
+    @property
+    def rgb(self):
+        return self._rgba[:3]
+    @rgb.setter
+    def rgb(self, value):
+        self.rgba = tuple(value) + (self._rgba[3],)
+
+    r = property(lambda self: self._rgba[0],
+                 lambda self, v: setattr(self, 'rgba', (v,) + self._rgba[1:]))
+    g = property(lambda self: self._rgba[1],
+                 lambda self, v: setattr(self, 'rgba', self._rgba[:1] + (v,) + self._rgba[2:]))
+    b = property(lambda self: self._rgba[2],
+                 lambda self, v: setattr(self, 'rgba', self._rgba[:2] + (v,) + self._rgba[3:]))
+    a = property(lambda self: self._rgba[3],
+                 lambda self, v: setattr(self, 'rgba', self._rgba[:3] + (v,)))
+
+    def to_css(self):
+        if self._css is None:
+            self._css = _rgba_css(*self._rgba)
+        return self._css
+
+    def draw(self, state):
+        state[0] = self.to_css()
+
+class VertexInstruction(Instruction):
+    """
+    Shape instruction.  Its geometry is compiled on first draw into a path
+    command buffer, kept in JS as a ``Path2D`` (``PATHS``) until a
+    geometry attribute changes.  ``color`` (a COLOR_MAP name, CSS or RGBA)
+    overrides the current ``Color``, as the old widget-style shapes did.
+    """
+    __slots__ = ('_path', '_path_id', '_path_sent', 'color')
+
+    def __init__(self, color=None, **kwargs):
+        self._path = self._path_id = None
+        self._path_sent = False
+        self.color = color
+        super().__init__(**kwargs)
+
+    def _geometry_changed(self):
+        self._path = None
+        self._path_sent = False
+        self._changed()
+
+    def _geometry(self):
+        path = self._path
+        if path is None:
+            path = self._path = array('d')
+            self._build(path)
+        return path
+
+    def _build(self, path):
+        pass
+
+    def _style(self, state):
+        return state[0] if self.color is None else resolve_color(self.color)
+
+class Rectangle(VertexInstruction):
+    """``Rectangle(pos=, size=)``: a single ``fillRect``, no path needed."""
+    __slots__ = ('_pos', '_size')
+    pos = _graphic_attr('_pos', tuple)
+    size = _graphic_attr('_size', tuple)
+
+    def __init__(self, pos=(0, 0), size=(100, 100), **kwargs):
+        if 'x' in kwargs or 'y' in kwargs:   # the old Rectangle widget's arguments
+            pos = (kwargs.pop('x', 0), kwargs.pop('y', 0))
+        super().__init__(**kwargs)
+        self.pos, self.size = pos, size
+
+    def draw(self, state):
+        ctx.fillStyle = self._style(state)
+        x, y = self._pos
+        w, h = self._size
+        ctx.fillRect(x, y, w, h)
+
+class RoundedRectangle(Rectangle):
+    """``RoundedRectangle(pos=, size=, radius=[r] or [tl, tr, br, bl])``."""
+    __slots__ = ('_radius',)
+    radius = _graphic_attr('_radius', _corner_radii)
+
+    def __init__(self, radius=(10,), segments=None, **kwargs):
+        super().__init__(**kwargs)
+        self.radius = radius
+
+    def _build(self, path):
+        x, y = self._pos
+        w, h = self._size
+        path.extend((_PATH_ROUND_RECT, x, y, w, h) + self._radius)
+
+    def draw(self, state):
+        ctx.fillStyle = self._style(state)
+        PATHS.draw(self, False)
+
+class Ellipse(Rectangle):
+    """
+    ``Ellipse(pos=, size=)``; ``angle_start`` / ``angle_end`` (degrees,
+    clockwise from 12 o'clock, as in Kivy) draw a pie slice.
+    """
+    __slots__ = ('_angle_start', '_angle_end')
+    angle_start = _graphic_attr('_angle_start', float)
+    angle_end = _graphic_attr('_angle_end', float)
+
+    def __init__(self, angle_start=0, angle_end=360, segments=None, **kwargs):
+        super().__init__(**kwargs)
+        self.angle_start, self.angle_end = angle_start, angle_end
+
+    def _build(self, path):
+        x, y = self._pos
+        w, h = self._size
+        cx, cy, rx, ry = x + w / 2, y + h / 2, abs(w) / 2, abs(h) / 2
+        start, end = sorted((self._angle_start, self._angle_end))
+        if end - start >= 360:
+            path.extend((_PATH_ELLIPSE, cx, cy, rx, ry, 0, 0, 2 * math.pi))
+        else:
+            path.extend((_PATH_MOVE, cx, cy, _PATH_ELLIPSE, cx, cy, rx, ry, 0,
+                         math.radians(start - 90), math.radians(end - 90), _PATH_CLOSE))
+
+    def draw(self, state):
+        ctx.fillStyle = self._style(state)
+        PATHS.draw(self, False)
+
+_LINE_CAPS = {'none': 'butt', 'round': 'round', 'square': 'square'}
+_LINE_JOINTS = {'none': 'miter', 'miter': 'miter', 'round': 'round', 'bevel': 'bevel'}
+_LINE_SHAPES = ('points', 'circle', 'ellipse', 'rectangle', 'rounded_rectangle')
+
+class Line(VertexInstruction):
+    """
+    ``Line(points=[x1, y1, x2, y2, ...], width=1, close=False)``, or one of
+    ``circle=(cx, cy, r[, start, end])``, ``ellipse=(x, y, w, h[, start,
+    end])``, ``rectangle=(x, y, w, h)``, ``rounded_rectangle=(x, y, w, h,
+    r...)``.  Stroked with one call per frame however many points it has.
+    """
+    __slots__ = ('_shape', '_width', '_close', '_cap', '_joint')
+    width = _graphic_attr('_width', float, geometry=False)
+    close = _graphic_attr('_close', bool)
+    cap = _graphic_attr('_cap', geometry=False)
+    joint = _graphic_attr('_joint', geometry=False)
+
+    def __init__(self, points=(), width=1.0, close=False, cap='round', joint='round',
+                 **kwargs):
+        shapes = {name: kwargs.pop(name) for name in _LINE_SHAPES[1:] if name in kwargs}
+        super().__init__(**kwargs)
+        self._shape = ('points', [])
+        self.points = points
+        for name, value in shapes.items():
+            setattr(self, name, value)
+        self.width, self.close, self.cap, self.joint = width, close, cap, joint
+
+    def _get_shape(self, kind):
+        return self._shape[1] if self._shape[0] == kind else None
+
+    def _set_shape(self, kind, values):
+        values = _flat_points(values) if kind == 'points' else tuple(values or ())
+        if self._shape != (kind, values):
+            self._shape = (kind, values)
+            self._geometry_changed()
+
+    points = property(lambda self: self._get_shape('points'),
+                      lambda self, v: self._set_shape('points', v))
+    circle = property(lambda self: self._get_shape('circle'),
+                      lambda self, v: self._set_shape('circle', v))
+    ellipse = property(lambda self: self._get_shape('ellipse'),
+                       lambda self, v: self._set_shape('ellipse', v))
+    rectangle = property(lambda self: self._get_shape('rectangle'),
+                         lambda self, v: self._set_shape('rectangle', v))
+    rounded_rectangle = property(lambda self: self._get_shape('rounded_rectangle'),
+                                 lambda self, v: self._set_shape('rounded_rectangle', v))
+
+    def _build(self, path):
+        kind, values = self._shape
+        if kind == 'points':
+            if len(values) >= 4:
+                path.extend((_PATH_POLY, len(values) // 2))
+                path.extend(values[:len(values) // 2 * 2])
+        elif kind in ('circle', 'ellipse'):
+            if kind == 'circle':
+                cx, cy, r = values[:3]
+                rx = ry = r
+                angles = values[3:5]
+            else:
+                x, y, w, h = values[:4]
+                cx, cy, rx, ry = x + w / 2, y + h / 2, abs(w) / 2, abs(h) / 2
+                angles = values[4:6]
+            start, end = sorted(angles) if len(angles) == 2 else (0, 360)
+            if end - start >= 360:
+                path.extend((_PATH_ELLIPSE, cx, cy, rx, ry, 0, 0, 2 * math.pi, _PATH_CLOSE))
+            else:
+                path.extend((_PATH_ELLIPSE, cx, cy, rx, ry, 0,
+                             math.radians(start - 90), math.radians(end - 90)))
+        elif kind == 'rectangle':
+            path.extend((_PATH_RECT,) + tuple(values[:4]))
+        elif kind == 'rounded_rectangle':
+            path.extend((_PATH_ROUND_RECT,) + tuple(values[:4])
+                        + _corner_radii(values[4:8] or (0,)))
+        if self._close and kind == 'points' and path:
+            path.append(_PATH_CLOSE)
+
+    def draw(self, state):
+        ctx.strokeStyle = self._style(state)
+        ctx.lineWidth = self._width
+        ctx.lineCap = _LINE_CAPS.get(self._cap, 'round')
+        ctx.lineJoin = _LINE_JOINTS.get(self._joint, 'round')
+        PATHS.draw(self, True)
+
+_MESH_LINES = frozenset(('lines', 'line_strip', 'line_loop'))
+
+class Mesh(VertexInstruction):
+    """
+    ``Mesh(vertices=[x, y, u, v, ...], indices=[...], mode=...)``.
+    Triangle modes are filled, line modes stroked, ``points`` drawn as
+    1px squares; texture coordinates are ignored.  Triangles are turned
+    the same way so that overlapping ones fill as a union.
+    """
+    __slots__ = ('_vertices', '_indices', '_mode', '_stride')
+    vertices = _graphic_attr('_vertices', list)
+    indices = _graphic_attr('_indices', list)
+    mode = _graphic_attr('_mode')
+
+    def __init__(self, vertices=(), indices=(), mode='points', fmt=None, **kwargs):
+        super().__init__(**kwargs)
+        # fmt: [(name, size, type), ...] as in Kivy; x, y come first
+        self._stride = sum(f[1] for f in fmt) if fmt else 4
+        self.vertices, self.indices, self.mode = vertices, indices, mode
+
+    def _build(self, path):
+        verts, stride = self._vertices, self._stride
+        xy = [(verts[i], verts[i + 1]) for i in range(0, len(verts) - 1, stride)]
+        idx = [i for i in self._indices if 0 <= i < len(xy)]
+        mode = self._mode
+        if mode == 'triangles':
+            tris = [idx[i:i + 3] for i in range(0, len(idx) - 2, 3)]
+        elif mode == 'triangle_fan':
+            tris = [(idx[0], idx[i], idx[i + 1]) for i in range(1, len(idx) - 1)]
+        elif mode == 'triangle_strip':
+            tris = [idx[i:i + 3] for i in range(len(idx) - 2)]
+        else:
+            tris = None
+        if tris is not None:
+            for a, b, c in tris:
+                (x0, y0), (x1, y1), (x2, y2) = xy[a], xy[b], xy[c]
+                if (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0) < 0:
+                    x1, y1, x2, y2 = x2, y2, x1, y1
+                path.extend((_PATH_POLY, 3, x0, y0, x1, y1, x2, y2, _PATH_CLOSE))
+        elif mode == 'lines':
+            for i in range(0, len(idx) - 1, 2):
+                path.extend((_PATH_POLY, 2) + xy[idx[i]] + xy[idx[i + 1]])
+        elif mode in _MESH_LINES:
+            if len(idx) >= 2:
+                path.extend((_PATH_POLY, len(idx)))
+                for i in idx:
+                    path.extend(xy[i])
+                if mode == 'line_loop':
+                    path.append(_PATH_CLOSE)
+        else:   # points
+            for i in idx:
+                x, y = xy[i]
+                path.extend((_PATH_RECT, x - 0.5, y - 0.5, 1, 1))
+
+    def draw(self, state):
+        if self._mode in _MESH_LINES:
+            ctx.strokeStyle = self._style(state)
+            ctx.lineWidth = 1
+            PATHS.draw(self, True)
+        else:
+            ctx.fillStyle = self._style(state)
+            PATHS.draw(self, False)
 
 #
 # ------------------------------------------------------------
@@ -519,6 +4503,9 @@ class _ThemeStub:
         # Map web colors; default to COLOR_MAP lookup or literal css string
         COLOR_MAP['primary'] = COLOR_MAP.get(self._primary_palette.lower(), self._primary_palette.lower())
         COLOR_MAP['accent']  = COLOR_MAP.get(self._accent_palette.lower(),  self._accent_palette.lower())
+        # Resolved colors and cached bitmaps use the old palette
+        refresh_colors()
+        LAYER_CACHE.clear()
     # --- properties ---
     @property
     def primary_palette(self):
@@ -544,6 +4531,11 @@ class _ThemeStub:
 
 # --- KivyMD stubs ---
 class MDCard(WidgetLite):
+    __slots__ = ()
+    elevation = NumericProperty(8)
+    def _layer_margin(self):
+        # Leave room for the blurred drop shadow
+        return max(self.cache_margin, self.elevation * 2)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.elevation = kwargs.get('elevation', 8)
@@ -560,68 +4552,28 @@ class MDCard(WidgetLite):
         super().draw()
 
 class MDToolbar(WidgetLite):
+    __slots__ = ()
+    title = StringProperty('')
     def __init__(self, **kwargs): super().__init__(**kwargs); self.title=kwargs.get('title','')
     def draw(self):
         set_fill('primary'); ctx.fillRect(self.x,self.y,self.size[0],50)
-        ctx.font='20px sans-serif'; set_fill('white'); ctx.fillText(self.title,self.x+10,self.y+30)
-        super().draw()
-        
-class Rectangle(WidgetLite):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.color = COLOR_MAP.get(kwargs.get('color'), 'gray')
-
-    def draw(self):
-        ctx.fillStyle = self.color
-        ctx.fillRect(self.x, self.y, self.size[0], self.size[1])
-        super().draw()
-
-# --- Graphics primitive stubs (Color, Line, Ellipse) ---
-class Color:
-    """Simplified stand‑in for `kivy.graphics.Color`. Accepts RGBA floats 0‑1."""
-    def __init__(self, r=1, g=1, b=1, a=1):
-        self.r, self.g, self.b, self.a = r, g, b, a
-    def to_css(self):
-        return f"rgba({int(self.r*255)},{int(self.g*255)},{int(self.b*255)},{self.a})"
-
-class Line(WidgetLite):
-    def __init__(self, points, width=1, color='black', **kwargs):
-        super().__init__(**kwargs)
-        self.points = points  # [x1,y1,x2,y2,...]
-        self.width = width
-        self.color = color if isinstance(color, str) else COLOR_MAP.get(color, 'black')
-    def draw(self):
-        set_stroke(self.color)
-        ctx.lineWidth = self.width
-        ctx.beginPath()
-        ctx.moveTo(self.points[0], self.points[1])
-        for i in range(2, len(self.points), 2):
-            ctx.lineTo(self.points[i], self.points[i+1])
-        ctx.stroke()
-        super().draw()
-
-class Ellipse(WidgetLite):
-    def __init__(self, pos, size, color='black', **kwargs):
-        super().__init__(**kwargs)
-        self.pos = pos  # (x,y)
-        self.size = size  # (w,h)
-        self.color = color if isinstance(color, str) else COLOR_MAP.get(color, 'black')
-    def draw(self):
-        x, y = self.pos
-        w, h = self.size
-        set_fill(self.color)
-        ctx.beginPath()
-        ctx.ellipse(x + w/2, y + h/2, w/2, h/2, 0, 0, 2*3.14)
-        ctx.fill()
+        font = '20px sans-serif'
+        title = TEXT_METRICS.ellipsize(font, self.title, self.size[0] - 20)
+        ctx.font=font; set_fill('white'); ctx.fillText(title,self.x+10,self.y+30)
         super().draw()
-
+        
 class MDIconButton(Button):
     """
     Lightweight replacement for KivyMD's MDIconButton.
 
     • Accepts ``icon="close"`` (or any key in ICON_MAP) or plain text.
     • Defaults to a 36×36‑dp square button.
+    • Icons are blitted from the shared ICON_ATLAS in draw-list mode
+      (``icon_size`` in px, 0 = 60 % of the button).
     """
+    __slots__ = ()
+    icon = StringProperty('')
+    icon_size = NumericProperty(0)
     def __init__(self, **kwargs):
         icon_name = kwargs.pop("icon", kwargs.get("text", ""))
         glyph = ICON_MAP.get(icon_name, icon_name[:1] if icon_name else "?")
@@ -630,109 +4582,384 @@ class MDIconButton(Button):
         kwargs.setdefault("bg_color", "white")
         kwargs.setdefault("text_color", "black")
         super().__init__(**kwargs)
-class MDRaisedButton(Button): pass
-class MDCheckbox(Switch): pass
-class MDSlider(Slider): pass
-class MDProgressBar(ProgressBar): pass
-
-
-# ----- sous-packages vides pour satisfaire l'import -----
-kivy_uix = types.ModuleType('kivy.uix')
-sys.modules['kivy.uix'] = kivy_uix
-setattr(kivy, 'uix', kivy_uix)
-# Mark as package so sub‑modules can be imported
-kivy_uix.__path__ = []
-
-kivy_core = types.ModuleType('kivy.core')
-sys.modules['kivy.core'] = kivy_core
-setattr(kivy, 'core', kivy_core)
-
-kivy_uix_widget = types.ModuleType('kivy.uix.widget')
-kivy_uix_widget = types.ModuleType('kivy.uix.widget')
-kivy_uix_widget.Widget = Widget
-sys.modules['kivy.uix.widget'] = kivy_uix_widget
-
-kivy_graphics = types.ModuleType('kivy.graphics')
-kivy_graphics.Color = Color
-kivy_graphics.Line = Line
-kivy_graphics.Ellipse = Ellipse
-sys.modules['kivy.graphics'] = kivy_graphics
-
-
+        self.icon = icon_name
+        self.icon_size = kwargs.get("icon_size", 0)
+    def _property_changed(self, name, value):
+        super()._property_changed(name, value)
+        if name == 'icon':
+            self.text = ICON_MAP.get(value, value[:1] if value else "?")
+    def draw(self):
+        family = _ICON_FONTS.get(self.icon)
+        state = _FONT_STATE.get(family, 'ready')
+        color = resolve_color(self.text_color)
+        if not ICON_ATLAS.enabled() or not isinstance(color, str) or state == 'failed':
+            return super().draw()
+        w, h = self.size
+        alpha = max(0, min(1, self.opacity))
+        if alpha != 1:
+            ctx.save()
+            ctx.globalAlpha = alpha
+        set_fill(self.bg_color)
+        ctx.beginPath()
+        ctx.roundRect(self.x, self.y, w, h, self.radius)
+        ctx.fill()
+        if state == 'ready':
+            size = int(self.icon_size or min(w, h) * 0.6)
+            font = f'{size}px "{family}"' if family else f'{size}px sans-serif'
+            if not ICON_ATLAS.draw(self.text, font, color, size,
+                                   self.x + w / 2, self.y + h / 2):
+                ctx.font = font
+                ctx.textAlign, ctx.textBaseline = 'center', 'middle'
+                set_fill(color)
+                ctx.fillText(self.text, self.x + w / 2, self.y + h / 2)
+                ctx.textAlign, ctx.textBaseline = 'start', 'alphabetic'
+        if alpha != 1:
+            ctx.restore()
+        WidgetLite.draw(self)
+class MDRaisedButton(Button): __slots__ = ()
+class MDCheckbox(Switch): __slots__ = ()
+class MDSlider(Slider): __slots__ = ()
+class MDProgressBar(ProgressBar): __slots__ = ()
 
 
 # ============================================================
 #  Additional stubs for extended Kivy / KivyMD compatibility
 # ============================================================
 
-# Simplified properties implementation
-class ObjectProperty:
-    def __init__(self, default=None):
-        self.value = default
-    def __get__(self, instance, owner):
-        return self.value
-    def __set__(self, instance, value):
-        self.value = value
-
 # Core Window stub
 class _Window:
-    width  = window.innerWidth
-    height = window.innerHeight
-    size   = (width, height)
+    """Window metrics, read from the active backend, and keyboard focus."""
+    mouse_pos = (0, 0)
+    focus_widget = None   # receives on_key_down (a focused TextInput)
+    def set_focus(self, widget):
+        previous = self.focus_widget
+        if previous is widget:
+            return
+        if previous is not None:
+            previous.focused = False
+        self.focus_widget = widget
+        if widget is not None:
+            widget.focused = True
+    @property
+    def size(self):
+        return get_backend().window_size()
+    @property
+    def width(self):
+        return self.size[0]
+    @property
+    def height(self):
+        return self.size[1]
     def bind(self, **kwargs):
         pass
 Window = _Window()
 
 # Layout & widget stubs
 after_scroll_y = 0  # track scroll for ScrollView stub
-class ScrollView(WidgetLite):
+class ScrollView(Layout):
+    """
+    Clipping viewport over a single tall child (vertical scrolling only).
+
+    ``scroll_y`` goes from 1 (top) to 0 (bottom), as in Kivy.  The child is
+    positioned by the layout pass, so scrolling only re-runs this layout;
+    the mouse wheel scrolls the innermost ScrollView under the pointer.
+    """
+    __slots__ = ()
+    scroll_y = NumericProperty(1)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.scroll_y = 1
-    def draw(self):
+        self.scroll_y = kwargs.get('scroll_y', 1)
+    def hit_clip(self):
+        return (self.x, self.y, self.x + self.size[0], self.y + self.size[1])
+
+    def _content_height(self):
+        return max((c.size[1] for c in self.children if isinstance(c, WidgetLite)), default=0)
+    def _scroll_offset(self, content_height):
+        """Pixels of content hidden above the viewport."""
+        return (1 - self.scroll_y) * max(content_height - self.size[1], 0)
+
+    def on_mouse_wheel(self, touch, dy):
+        overflow = self._content_height() - self.size[1]
+        if overflow <= 0:
+            return False
+        self.scroll_y = min(max(self.scroll_y - dy / overflow, 0), 1)
+        return True
+
+    def _arrange(self, children):
         global after_scroll_y
+        offset = self._scroll_offset(self._content_height())
+        for c in children:
+            if c.size_hint_x is not None:
+                _resize(c, self.size[0] * c.size_hint_x, c.size[1])
+            c.x, c.y = self.x, self.y - offset
+        after_scroll_y = self.scroll_y
+
+    def draw(self):
+        if self._layout_pending:
+            self.do_layout()
         ctx.save()
         ctx.beginPath()
         ctx.rect(self.x, self.y, self.size[0], self.size[1])
         ctx.clip()
-        for c in self.children:
-            if not isinstance(c, WidgetLite):
-                continue  # ignore stray JS proxies or primitives
-            c.y = self.y - (1 - self.scroll_y) * (c.height or c.size[1])
-            if hasattr(c, 'draw') and callable(c.draw):
-                try:
-                    c.draw()
-                except Exception as exc:
-                    from js import console
-                    console.error('Draw error (ScrollView child):', exc)
+        WidgetLite.draw(self)
         ctx.restore()
+
+class RecycleBoxLayout(BoxLayout):
+    """
+    Row geometry for a RecycleView (mirrors `kivy.uix.recycleboxlayout`).
+
+    Only ``default_size``/``default_size_hint`` and ``spacing`` are read:
+    the RecycleView places the rows itself, this widget is never drawn.
+    """
+    __slots__ = ()
+    default_size = ObjectProperty((None, 48))
+    default_size_hint = ObjectProperty((1, None))
+    def __init__(self, **kwargs):
+        self.default_size = kwargs.pop('default_size', (None, dp(48)))
+        self.default_size_hint = kwargs.pop('default_size_hint', (1, None))
+        kwargs.setdefault('orientation', 'vertical')
+        kwargs.setdefault('spacing', 0)
+        super().__init__(**kwargs)
+
+class RecycleView(ScrollView):
+    """
+    Virtualized list (mirrors `kivy.uix.recycleview.RecycleView`).
+
+    ``data`` is a list of dicts and ``viewclass`` the row widget class (or
+    its name).  Only the rows intersecting the viewport, plus ``overscan``
+    rows on each side, exist as widgets; rows leaving the viewport go back
+    to a pool and are reused with the next item's attributes, so memory and
+    per-frame work do not depend on ``len(data)``.
+
+    Rows all have the same height (``layout_manager.default_size``).
+    ``data`` is observed by assignment: after mutating it in place, call
+    ``refresh_from_data()``.
+    """
+    __slots__ = ('layout_manager', '_views', '_pool', '_view_cls')
+    data = ListProperty()
+    viewclass = ObjectProperty(None)
+    overscan = NumericProperty(2)
+
+    def __init__(self, **kwargs):
+        self.layout_manager = RecycleBoxLayout()
+        self._views = {}   # data index -> live row widget
+        self._pool = []    # detached row widgets ready for reuse
+        self._view_cls = None
+        self.viewclass = kwargs.pop('viewclass', None)
+        self.data = kwargs.pop('data', ())
+        self.overscan = kwargs.pop('overscan', 2)
+        super().__init__(**kwargs)
+
+    def add_widget(self, widget):
+        # kv style: RecycleView: RecycleBoxLayout: default_size: ...
+        if isinstance(widget, RecycleBoxLayout):
+            self.layout_manager = widget
+            self._trigger_layout()
+            return
+        super().add_widget(widget)
+
+    def _property_changed(self, name, value):
+        super()._property_changed(name, value)
+        if name == 'data':
+            self._release_all()
+            self._trigger_layout()
+        elif name == 'viewclass':
+            self._view_cls = None
+            self._release_all(drop=True)
+            self._trigger_layout()
+        elif name == 'overscan':
+            self._trigger_layout()
+
+    def refresh_from_data(self, *args):
+        """Re-apply ``data`` to the visible rows (after in-place edits)."""
+        self._release_all()
+        self._trigger_layout()
+
+    # --- geometry -----------------------------------------------------
+    def _row_stride(self):
+        lm = self.layout_manager
+        return (lm.default_size[1] or dp(48)), lm.spacing
+    def _content_height(self):
+        n = len(self.data)
+        row, spacing = self._row_stride()
+        return n * row + max(n - 1, 0) * spacing
+    def visible_range(self):
+        """(first, last + 1) data indices that currently have a row widget."""
+        n = len(self.data)
+        if not n:
+            return (0, 0)
+        row, spacing = self._row_stride()
+        stride = row + spacing
+        offset = self._scroll_offset(n * stride - spacing)
+        first = int(offset // stride) - int(self.overscan)
+        last = int((offset + self.size[1]) // stride) + int(self.overscan)
+        return (max(first, 0), min(last + 1, n))
+
+    # --- row pool -----------------------------------------------------
+    def _resolve_viewclass(self):
+        cls = self._view_cls
+        if cls is None:
+            cls = self.viewclass
+            if isinstance(cls, str):
+                # App classes and KV dynamic classes are registered with the Factory
+                try:
+                    cls = Factory.get(cls)
+                except FactoryException:
+                    raise FactoryException(
+                        f'RecycleView.viewclass: unknown class {cls!r}') from None
+            if cls is None:
+                raise ValueError('RecycleView.viewclass is not set')
+            self._view_cls = cls
+        return cls
+
+    def _release_all(self, drop=False):
+        if self._views:
+            if not drop:
+                self._pool.extend(self._views.values())
+            self._views.clear()
+        if drop:
+            self._pool.clear()
+
+    def _acquire(self):
+        if self._pool:
+            return self._pool.pop()
+        return self._resolve_viewclass()()
+
+    def _refresh_view(self, view, index, item):
+        refresh = getattr(view, 'refresh_view_attrs', None)
+        if refresh is not None:
+            refresh(self, index, item)
+            return
+        for key, value in item.items():
+            setattr(view, key, value)
+
+    def _arrange(self, _children):
+        global after_scroll_y
+        data = self.data
+        first, stop = self.visible_range()
+        views = self._views
+        for index in [i for i in views if not first <= i < stop]:
+            self._pool.append(views.pop(index))
+        for index in range(first, stop):
+            if index not in views:
+                view = self._acquire()
+                self._refresh_view(view, index, data[index])
+                views[index] = view
+
+        row, spacing = self._row_stride()
+        hint_x = self.layout_manager.default_size_hint[0]
+        width = self.size[0] * hint_x if hint_x is not None else (
+            self.layout_manager.default_size[0] or self.size[0])
+        top = self.y - self._scroll_offset(self._content_height())
+        rows = []
+        for index in range(first, stop):
+            view = views[index]
+            _resize(view, width, row)
+            view.x, view.y = self.x, top + index * (row + spacing)
+            rows.append(view)
+
+        if rows != self.children:
+            for view in self._pool:
+                view.parent = None
+            for view in rows:
+                view.parent = self
+            self.children = rows
+            self._invalidate_layers()
+            HIT_INDEX.invalidate()
         after_scroll_y = self.scroll_y
 
 class Spinner(Button):
     """Very simple dropdown replacement (always shows selected text)."""
-    pass
+    __slots__ = ()
 
 class Image(WidgetLite):
+    """
+    ``source`` is fetched and decoded asynchronously through the shared
+    IMAGE_CACHE; a gray placeholder is drawn until it is ready (or if it
+    fails).  ``allow_stretch`` / ``keep_ratio`` behave as in Kivy, and
+    ``downscale=True`` decodes at most at the widget's size (rounded up to
+    16 px) so large pictures shown small don't hold full-size bitmaps.
+    """
+    __slots__ = ('_image_key',)
+    source = StringProperty('')
+    allow_stretch = BooleanProperty(False)
+    keep_ratio = BooleanProperty(True)
+    downscale = BooleanProperty(False)
+    texture_size = ListProperty([0, 0])
     def __init__(self, source='', **kwargs):
         super().__init__(**kwargs)
+        self._image_key = None
         self.source = source
+        self.allow_stretch = kwargs.get('allow_stretch', False)
+        self.keep_ratio = kwargs.get('keep_ratio', True)
+        self.downscale = kwargs.get('downscale', False)
+    @property
+    def image_ratio(self):
+        tw, th = self.texture_size
+        return tw / th if th else 1.0
+    @property
+    def norm_image_size(self):
+        """Drawn size of the image inside the widget (Kivy's rules)."""
+        w, h = self.size
+        tw, th = self.texture_size
+        if not tw or not th:
+            return w, h
+        ratio = tw / th
+        if self.allow_stretch:
+            if not self.keep_ratio:
+                return w, h
+            iw = w
+        else:
+            iw = min(w, tw)
+        ih = iw / ratio
+        if ih > h:
+            ih = h if self.allow_stretch else min(h, th)
+            iw = ih * ratio
+        return iw, ih
+    def _cache_key(self):
+        if not self.downscale:
+            return (self.source, 0, 0)
+        return (self.source, -(-int(self.size[0]) // 16) * 16, -(-int(self.size[1]) // 16) * 16)
+    def _image_ready(self, entry):
+        # Called by IMAGE_CACHE for the widgets that waited on this bitmap
+        if entry.key == self._image_key and entry.state == ImageCache.READY:
+            self.texture_size = [entry.width, entry.height]
+        self._invalidate_layers()
     def draw(self):
-        # For simplicity draw a gray rect placeholder
-        set_fill('gray')
-        ctx.fillRect(self.x, self.y, self.size[0], self.size[1])
+        entry = None
+        if self.source and IMAGE_CACHE.enabled():
+            self._image_key = self._cache_key()
+            entry = IMAGE_CACHE.request(self, self._image_key)
+        if entry is not None and entry.state == ImageCache.READY:
+            if self.texture_size != [entry.width, entry.height]:
+                self.texture_size = [entry.width, entry.height]
+            iw, ih = self.norm_image_size
+            ctx.draw_image(entry.id, self.x + (self.size[0] - iw) / 2,
+                           self.y + (self.size[1] - ih) / 2, iw, ih)
+        else:
+            set_fill('gray')
+            ctx.fillRect(self.x, self.y, self.size[0], self.size[1])
         super().draw()
 
+class AsyncImage(Image):
+    """Alias: every ``Image`` already loads asynchronously."""
+    __slots__ = ()
+
 # KivyMD stubs
 class MDFlatButton(Button):
+    __slots__ = ()
     def __init__(self, **kwargs):
         kwargs.setdefault('bg_color', 'white')
         kwargs.setdefault('text_color', 'primary')
         super().__init__(**kwargs)
 class MDLabel(Label):
-    pass
+    __slots__ = ()
 class MDTextField(TextInput):
-    pass
+    __slots__ = ()
 class MDDialog(WidgetLite):
+    __slots__ = ()
+    title = StringProperty('')
+    text = StringProperty('')
+    opened = BooleanProperty(False)
     def __init__(self, title='', text='', **kwargs):
         super().__init__(**kwargs)
         self.title = title
@@ -740,8 +4967,10 @@ class MDDialog(WidgetLite):
         self.opened = False
     def open(self):
         self.opened = True
+        HIT_INDEX.invalidate()
     def dismiss(self):
         self.opened = False
+        HIT_INDEX.invalidate()
     def draw(self):
         if self.opened:
             set_fill('white')
@@ -752,18 +4981,25 @@ class MDDialog(WidgetLite):
             ctx.fillText(self.text,  self.x + 10, self.y + 40)
         super().draw()
 
+_RUNNING_APP = None   # set by run_kivy_app ('app' in KV rules)
+
 class MDApp:
     """Stub KivyMD App with basic theme_cls support."""
     def __init__(self, **kwargs):
         self.theme_cls = _ThemeStub()
     def run(self):
         pass  # no‑op in browser
+    @staticmethod
+    def get_running_app():
+        return _RUNNING_APP
 
 # Lists
 class OneLineListItem(Button):
+    __slots__ = ()
     def __init__(self, text='', **kwargs):
         super().__init__(text=text, **kwargs)
 class MDList(BoxLayout):
+    __slots__ = ()
     def __init__(self, **kwargs):
         super().__init__(orientation='vertical', spacing=2, **kwargs)
 
@@ -775,165 +5011,1501 @@ class FadeTransition:
 MDTopAppBar = MDToolbar
 
 # ------------------------------------------------------------
-# Register additional faux modules so `import` works
+#  Stockage persistant : JsonStore / DictStore (écriture différée)
+# ------------------------------------------------------------
+class _FileStorage:
+    """One JSON file per store, in Kivy's JsonStore format (CPython)."""
+    name = 'file'
+
+    def load(self, name, done):
+        try:
+            with open(name, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except (OSError, ValueError) as exc:
+            report_error(f'Store {name}:', exc)
+            data = {}
+        done(data)
+
+    def write(self, store, puts, deletes, clear):
+        # The file is rewritten whole, atomically
+        data = {key: json.loads(value) if isinstance(value, str) else value
+                for key, value in store._data.items()}
+        tmp = store.filename + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=getattr(store, 'indent', None),
+                      sort_keys=getattr(store, 'sort_keys', False))
+        os.replace(tmp, store.filename)
+
+class _IndexedDBStorage:
+    """IndexedDB through store.js: asynchronous, one transaction per flush."""
+    name = 'indexeddb'
+
+    def __init__(self, scope):
+        self.scope = scope
+
+    def load(self, name, done):
+        def loaded(text):
+            done(dict(json.loads(text)) if text else {})
+        self.scope.webkivyStoreLoad(name, create_once_callable(loaded))
+
+    def write(self, store, puts, deletes, clear):
+        self.scope.webkivyStoreWrite(store.filename, json.dumps(puts), json.dumps(deletes), clear)
+
+class _LocalStorage:
+    """Fallback without IndexedDB: one localStorage item per key (synchronous)."""
+    name = 'localstorage'
+
+    def __init__(self, local):
+        self.local = local
+
+    def _keys(self, prefix):
+        local = self.local
+        return [key for key in (local.key(i) for i in range(local.length))
+                if key is not None and key.startswith(prefix)]
+
+    def load(self, name, done):
+        prefix = f'webkivy:{name}:'
+        done({key[len(prefix):]: self.local.getItem(key) for key in self._keys(prefix)})
+
+    def write(self, store, puts, deletes, clear):
+        prefix = f'webkivy:{store.filename}:'
+        if clear:
+            for key in self._keys(prefix):
+                self.local.removeItem(key)
+        for key, text in puts.items():
+            self.local.setItem(prefix + key, text)
+        for key in deletes:
+            self.local.removeItem(prefix + key)
+
+_STORES = weakref.WeakSet()   # open stores, flushed by flush_stores()
+
+def flush_stores():
+    """Write every store's pending changes now (app teardown, page hidden)."""
+    for store in list(_STORES):
+        store.flush()
+
+class AbstractStore:
+    """
+    Key/value store with the ``kivy.storage`` API, kept in memory.
+
+    Entries are read from the backend's storage on first access, not at
+    construction.  Values stay JSON text until they are read, so a large
+    store costs one parse at startup.  Writes update the in-memory copy
+    and mark the key dirty.  Dirty keys are written in one batch
+    ``debounce`` seconds after the first change (write-behind), or by
+    ``flush()``.  With IndexedDB the load is asynchronous: ``loaded`` is
+    False until then, and ``load(callback)`` / the ``async_*`` methods
+    wait for it.
+    """
+    def __init__(self, filename=None, debounce=0.25, storage=None, **kwargs):
+        self.filename = filename
+        self.debounce = debounce
+        if storage is None and filename is not None:
+            storage = get_backend().storage()
+        self.storage = storage
+        self.loaded = storage is None
+        self.stats = Counter()
+        self._loading = False
+        self._waiting = []         # load() callbacks
+        self._data = {}            # key -> entry dict, or its JSON text until read
+        self._dirty = set()        # keys to write
+        self._deleted = set()      # keys to delete
+        self._clear = False        # storage to clear at the next flush
+        self._cleared = False      # entries loaded afterwards are stale
+        self._timer = None
+        _STORES.add(self)
+
+    # --- chargement paresseux ---------------------------------------------
+    def load(self, callback=None):
+        """Start loading if needed; ``callback(store)`` once loaded."""
+        if self.loaded:
+            if callback is not None:
+                callback(self)
+            return
+        if callback is not None:
+            self._waiting.append(callback)
+        if not self._loading:
+            self._loading = True
+            self.storage.load(self.filename, self._loaded)
+
+    def _loaded(self, entries):
+        data = self._data
+        if not self._cleared:
+            for key, value in entries.items():
+                # Changes made while loading win over the stored values
+                if key not in data and key not in self._deleted:
+                    data[key] = value
+        self.loaded, self._loading = True, False
+        self.stats['loaded'] = len(entries)
+        waiting, self._waiting = self._waiting, []
+        for callback in waiting:
+            try:
+                callback(self)
+            except Exception:
+                report_error('Store load callback error:', traceback.format_exc())
+
+    def _entry(self, key):
+        value = self._data[key]
+        if isinstance(value, str):   # decoded on first read
+            value = self._data[key] = json.loads(value)
+        return value
+
+    # --- écriture différée ----------------------------------------------------
+    def _changed(self):
+        if self.storage is not None and self._timer is None:
+            self._timer = get_backend().set_timeout(self.flush, self.debounce * 1000)
+
+    def flush(self):
+        """Write the pending changes now, as one batch."""
+        if self._timer is not None:
+            get_backend().clear_timeout(self._timer)
+            self._timer = None
+        if self.storage is None or not (self._dirty or self._deleted or self._clear):
+            return
+        puts = {}
+        for key in self._dirty:
+            try:
+                puts[key] = json.dumps(self._data[key])
+            except (TypeError, ValueError) as exc:
+                report_error(f'Store {self.filename}: cannot save {key!r}:', exc)
+        deletes = list(self._deleted)
+        clear = self._clear
+        self._dirty, self._deleted, self._clear = set(), set(), False
+        self.stats['flushes'] += 1
+        self.stats['writes'] += len(puts) + len(deletes)
+        try:
+            self.storage.write(self, puts, deletes, clear)
+        except Exception as exc:
+            report_error(f'Store {self.filename}: write failed:', exc)
+
+    # --- API kivy.storage ---------------------------------------------------------
+    def exists(self, key):
+        self.load()
+        return key in self._data
+
+    def get(self, key):
+        self.load()
+        return self._entry(key)
+
+    def put(self, key, **values):
+        self.load()
+        self._data[key] = values
+        self._deleted.discard(key)
+        self._dirty.add(key)
+        self._changed()
+        return True
+
+    def delete(self, key):
+        self.load()
+        if key not in self._data and self.loaded:
+            raise KeyError(key)
+        self._data.pop(key, None)   # not loaded yet: may only exist in storage
+        self._dirty.discard(key)
+        self._deleted.add(key)
+        self._changed()
+        return True
+
+    def find(self, **filters):
+        self.load()
+        for key in list(self._data):
+            entry = self._entry(key)
+            if all(k in entry and entry[k] == v for k, v in filters.items()):
+                yield key, entry
+
+    def keys(self):
+        self.load()
+        return list(self._data)
+
+    def count(self):
+        self.load()
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+        self._dirty.clear()
+        self._deleted.clear()
+        self._clear = self._cleared = True
+        self._changed()
+
+    def __contains__(self, key):
+        return self.exists(key)
+    def __getitem__(self, key):
+        return self.get(key)
+    def __setitem__(self, key, values):
+        self.put(key, **values)
+    def __delitem__(self, key):
+        self.delete(key)
+    def __iter__(self):
+        return iter(self.keys())
+    def __len__(self):
+        return self.count()
+
+    # Asynchronous variants: callback(store, key, result) once loaded
+    def _async(self, callback, key, method, *args, **kwargs):
+        def run(store):
+            try:
+                result = method(*args, **kwargs)
+            except KeyError:
+                result = None
+            callback(store, key, result)
+        self.load(run)
+
+    def async_get(self, callback, key):
+        self._async(callback, key, self.get, key)
+    def async_put(self, callback, key, **values):
+        self._async(callback, key, self.put, key, **values)
+    def async_exists(self, callback, key):
+        self._async(callback, key, self.exists, key)
+    def async_delete(self, callback, key):
+        self._async(callback, key, self.delete, key)
+    def async_keys(self, callback):
+        self._async(callback, None, self.keys)
+    def async_count(self, callback):
+        self._async(callback, None, self.count)
+    def async_find(self, callback, **filters):
+        self._async(callback, None, lambda: list(self.find(**filters)))
+    def async_clear(self, callback):
+        self._async(callback, None, self.clear)
+
+class JsonStore(AbstractStore):
+    """``JsonStore('settings.json')``: the file on CPython, IndexedDB in the browser."""
+    def __init__(self, filename, indent=None, sort_keys=False, **kwargs):
+        self.indent, self.sort_keys = indent, sort_keys
+        super().__init__(filename, **kwargs)
+
+class DictStore(AbstractStore):
+    """Like JsonStore; ``DictStore()`` without a filename stays in memory."""
+    def __init__(self, filename=None, data=None, **kwargs):
+        super().__init__(filename, **kwargs)
+        if data:
+            self._data.update(data)
+
+# ------------------------------------------------------------
+#  Pont WebSocket : RPC, pub/sub et état partagé (deltas)
+# ------------------------------------------------------------
+class BridgeError(Exception):
+    """A remote call failed (server error or lost connection)."""
+
+class SharedState:
+    """
+    Local copy of a server-side state topic (``bridge.state(topic)``).
+
+    The server sends one snapshot, then deltas (``wire.diff``); each is
+    applied in place and only the observers of the top-level keys that
+    changed are called, so a widget linked to one key is touched only
+    when that key changes.  ``set()`` / ``update()`` change the state
+    locally and send the delta to the server, which rebroadcasts it.
+    """
+    def __init__(self, bridge, topic):
+        self.bridge, self.topic = bridge, topic
+        self.data = {}
+        self.version = -1           # -1 until the first snapshot
+        self._observers = {}        # key (None: any key) -> [callback(state, key, value)]
+
+    def __getitem__(self, key):
+        return self.data[key]
+    def __contains__(self, key):
+        return key in self.data
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def bind(self, key=None, callback=None):
+        """``callback(state, key, value)`` when ``key`` (any key if None) changes."""
+        self._observers.setdefault(key, []).append(callback)
+    def unbind(self, key=None, callback=None):
+        callbacks = self._observers.get(key, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def link(self, key, widget, prop, convert=None):
+        """Keep ``widget.<prop>`` equal to ``state[key]`` (optionally converted)."""
+        def _set(state, key, value):
+            setattr(widget, prop, convert(value) if convert is not None else value)
+        self.bind(key, _set)
+        if key in self.data:
+            _set(self, key, self.data[key])
+
+    def set(self, key, value):
+        self.update({key: value})
+    def update(self, changes=None, **kwargs):
+        wire = self.bridge.wire
+        new = dict(self.data)
+        new.update(changes or (), **kwargs)
+        ops = wire.diff(self.data, new)
+        if ops:
+            # Sent at the next flush: keep the queued ops apart from the state
+            self._notify(wire.patch(self.data, copy.deepcopy(ops)))
+            self.bridge._send([wire.SET, self.topic, ops])
+
+    def _snapshot(self, version, data):
+        # Resync (first subscribe, reconnect, missed delta): notify the diff only
+        ops = self.bridge.wire.diff(self.data, data)
+        self.version = version
+        self._notify(self.bridge.wire.patch(self.data, ops))
+
+    def _delta(self, version, ops):
+        if self.version < 0 or version != self.version + 1:
+            self.bridge._send([self.bridge.wire.SUB, self.topic])   # gap: ask for a snapshot
+            return
+        self.version = version
+        self._notify(self.bridge.wire.patch(self.data, ops))
+
+    def _notify(self, keys):
+        if not keys:
+            return
+        observers = self._observers
+        for key in keys:
+            value = self.data.get(key)
+            for callback in observers.get(key, []) + observers.get(None, []):
+                try:
+                    callback(self, key, value)
+                except Exception as exc:
+                    report_error(f'SharedState {self.topic!r} observer:', exc)
+
+class Bridge:
+    """
+    WebSocket connection to a Python backend (``connect(url)``).
+
+    * ``call(method, *args, callback=, errback=)``: RPC, answered
+      asynchronously;
+    * ``subscribe(topic, callback)`` / ``publish(topic, value)``: pub/sub;
+    * ``state(topic)``: a ``SharedState`` kept in sync with deltas.
+
+    Messages sent during a frame are queued and go out as one binary
+    WebSocket message (``wire`` encoding) from a zero-delay timer.  After
+    a disconnection, reconnects are retried with exponential backoff and
+    jitter; subscriptions are renewed and queued messages sent once the
+    connection is back.  Incoming messages are handled on arrival (their
+    widget changes reach the screen on the next frame).
+    """
+    def __init__(self, url, backoff=0.5, max_backoff=30.0, autoconnect=True):
+        import wire   # shipped next to connector.py (main.js FILES, bundles)
+        self.wire = wire
+        self.url = url
+        self.backoff, self.max_backoff = backoff, max_backoff
+        self.connected = False
+        self.closed = False
+        self.on_open = self.on_close = None   # optional callbacks (no arguments)
+        self.stats = Counter()
+        self._socket = None
+        self._attempts = 0
+        self._retry = None          # backoff timer id
+        self._flush_timer = None
+        self._outbox = []           # messages waiting for the next flush
+        self._calls = {}            # id -> (callback, errback) while in flight
+        self._call_ids = itertools.count(1)
+        self._topics = {}           # topic -> [callback(topic, value)]
+        self._states = {}           # topic -> SharedState
+        _BRIDGES.add(self)
+        if autoconnect:
+            self.connect()
+
+    # --- connexion --------------------------------------------------
+    def connect(self):
+        self.closed = False
+        self._retry = None
+        if self._socket is None:
+            self._socket = get_backend().open_socket(self.url, self._opened, self._received,
+                                                     self._lost)
+
+    def close(self):
+        """Close for good (no reconnect); pending calls fail."""
+        self.closed = True
+        backend = get_backend()
+        for timer in (self._retry, self._flush_timer):
+            if timer is not None:
+                backend.clear_timeout(timer)
+        self._retry = self._flush_timer = None
+        if self._socket is not None:
+            self._socket.close()
+
+    def _opened(self):
+        self.connected = True
+        self._attempts = 0
+        # Renew the subscriptions ahead of whatever was queued meanwhile
+        renew = [[self.wire.SUB, topic] for topic in list(self._topics) + list(self._states)]
+        self._outbox[:0] = renew
+        self.flush()
+        if self.on_open is not None:
+            self.on_open()
+
+    def _lost(self):
+        was_connected, self.connected = self.connected, False
+        self._socket = None
+        calls, self._calls = self._calls, {}
+        for _, errback in calls.values():   # their answer will never come
+            if errback is not None:
+                errback(BridgeError('connection lost'))
+        self._outbox = [m for m in self._outbox if m[0] != self.wire.SUB]
+        if was_connected and self.on_close is not None:
+            self.on_close()
+        if self.closed:
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** self._attempts)
+        delay *= 0.5 + random.random() / 2    # jitter: clients don't retry in lockstep
+        self._attempts += 1
+        self.stats['reconnects'] += 1
+        self._retry = get_backend().set_timeout(self.connect, delay * 1000)
+
+    # --- envoi groupé -----------------------------------------------
+    def _send(self, message):
+        self._outbox.append(message)
+        if self._flush_timer is None and self.connected:
+            self._flush_timer = get_backend().set_timeout(self.flush, 0)
+
+    def flush(self):
+        """Send the queued messages now, as one batch."""
+        self._flush_timer = None
+        if not self._outbox or not self.connected:
+            return
+        batch, self._outbox = self._outbox, []
+        data = self.wire.pack_batch(batch)
+        self.stats['batches_out'] += 1
+        self.stats['messages_out'] += len(batch)
+        self.stats['bytes_out'] += len(data)
+        self._socket.send(data)
+
+    # --- API ----------------------------------------------------------
+    def call(self, method, *args, callback=None, errback=None):
+        """Remote ``method(*args)``; ``callback(result)`` or ``errback(BridgeError)``."""
+        call_id = next(self._call_ids)
+        if callback is not None or errback is not None:
+            self._calls[call_id] = (callback, errback)
+        self._send([self.wire.CALL, call_id, method, list(args)])
+        return call_id
+
+    def publish(self, topic, value):
+        self._send([self.wire.PUB, topic, value])
+
+    def subscribe(self, topic, callback):
+        """``callback(topic, value)`` for each value published on ``topic``."""
+        callbacks = self._topics.get(topic)
+        if callbacks is None:
+            callbacks = self._topics[topic] = []
+            self._send([self.wire.SUB, topic])
+        callbacks.append(callback)
+
+    def unsubscribe(self, topic, callback=None):
+        callbacks = self._topics.get(topic, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if callback is None or not callbacks:
+            self._topics.pop(topic, None)
+            if topic not in self._states:
+                self._send([self.wire.UNSUB, topic])
+
+    def state(self, topic):
+        """The ``SharedState`` of ``topic`` (subscribed on first use)."""
+        state = self._states.get(topic)
+        if state is None:
+            state = self._states[topic] = SharedState(self, topic)
+            if topic not in self._topics:
+                self._send([self.wire.SUB, topic])
+        return state
+
+    # --- réception ------------------------------------------------------
+    def _received(self, data):
+        if self.closed:   # in flight when close() was called
+            return
+        wire = self.wire
+        self.stats['batches_in'] += 1
+        self.stats['bytes_in'] += len(data)
+        try:
+            batch = wire.unpack_batch(data)
+        except ValueError as exc:
+            report_error('Bridge: bad message:', exc)
+            return
+        for message in batch:
+            kind = message[0]
+            try:
+                if kind == wire.RESULT or kind == wire.ERROR:
+                    callback, errback = self._calls.pop(message[1], (None, None))
+                    if kind == wire.RESULT and callback is not None:
+                        callback(message[2])
+                    elif kind == wire.ERROR:
+                        if errback is not None:
+                            errback(BridgeError(message[2]))
+                        else:
+                            report_error(f'Bridge: call {message[1]} failed:', message[2])
+                elif kind == wire.PUB:
+                    for callback in list(self._topics.get(message[1], ())):
+                        callback(message[1], message[2])
+                elif kind == wire.STATE or kind == wire.DELTA:
+                    state = self._states.get(message[1])
+                    if state is not None:
+                        if kind == wire.STATE:
+                            state._snapshot(message[2], message[3])
+                        else:
+                            state._delta(message[2], message[3])
+            except Exception as exc:
+                report_error('Bridge callback error:', exc, '\n', traceback.format_exc())
+        self.stats['messages_in'] += len(batch)
+
+_BRIDGES = weakref.WeakSet()   # open bridges, closed by close_bridges()
+
+def close_bridges():
+    """Close every bridge without calling back into the app (app teardown)."""
+    for bridge in list(_BRIDGES):
+        bridge.on_open = bridge.on_close = None
+        bridge._calls.clear()
+        bridge.close()
+
+def connect(url, **kwargs):
+    """Open a ``Bridge`` to the WebSocket server at ``url``."""
+    return Bridge(url, **kwargs)
+
+# ------------------------------------------------------------
+#  Langage KV : Builder / Factory, règles compilées en Python
 # ------------------------------------------------------------
+class FactoryException(Exception):
+    pass
+
+class _Factory:
+    """
+    Name -> class registry used by KV rules (``kivy.factory.Factory``).
+
+    Widget classes register themselves when they are defined; other
+    classes are found among the connector's names.  ``register()`` adds a
+    class, one imported lazily from ``module``, or a dynamic class
+    (``<Name@Base>`` rule) built on first use.
+    """
+    def __init__(self):
+        self.classes = _FACTORY_CLASSES   # name -> class, or (module, bases, properties)
+
+    def register(self, classname, cls=None, module=None, baseclasses=None, properties=()):
+        self.classes[classname] = (cls if cls is not None
+                                   else (module, baseclasses, tuple(properties)))
+
+    def unregister(self, *classnames):
+        for name in classnames:
+            self.classes.pop(name, None)
+
+    def get(self, classname):
+        cls = self.classes.get(classname)
+        if isinstance(cls, tuple):
+            module, bases, properties = cls
+            if module is not None:
+                cls = getattr(importlib.import_module(module), classname)
+            else:
+                cls = self._dynamic(classname, bases, properties)
+            self.classes[classname] = cls
+        elif cls is None:
+            cls = globals().get(classname)
+            if not isinstance(cls, type):
+                raise FactoryException(f'Unknown class <{classname}>')
+        return cls
+
+    def _dynamic(self, classname, bases, properties):
+        bases = tuple(self.get(name.strip()) for name in bases.split('+'))
+        # New names assigned by the rule become properties (bindable)
+        namespace = {'__module__': __name__}
+        for name in properties:
+            if not any(hasattr(base, name) for base in bases):
+                namespace[name] = ObjectProperty(None)
+        if len(bases) == 1:
+            namespace['__slots__'] = ()
+        return type(bases[0])(classname, bases, namespace)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except FactoryException:
+            raise AttributeError(name) from None
+
+Factory = _Factory()
+
+class ParserException(Exception):
+    """KV error, with the file name and line number."""
+    def __init__(self, filename, lineno, message):
+        super().__init__(f'{filename}:{lineno}: {message}')
+        self.filename, self.lineno = filename, lineno
+
+class BuilderException(ParserException):
+    pass
+
+class _KvNode:
+    __slots__ = ('name', 'lineno', 'id', 'props', 'handlers', 'children', 'canvas')
+
+    def __init__(self, name, lineno):
+        self.name, self.lineno, self.id = name, lineno, None
+        self.props, self.handlers, self.children, self.canvas = [], [], [], []
+
+def _kv_lines(source, filename):
+    """Directives and ``(indent, text, lineno)`` for the significant lines."""
+    directives, lines = [], []
+    for lineno, raw in enumerate(source.splitlines(), 1):
+        text = raw.expandtabs(4).rstrip()
+        stripped = text.lstrip()
+        if stripped.startswith('#:'):
+            if stripped != text:
+                raise ParserException(filename, lineno, 'directives must not be indented')
+            directives.append((stripped[2:].split(None, 1), lineno))
+        elif stripped and not stripped.startswith('#'):
+            lines.append((len(text) - len(stripped), stripped, lineno))
+    return directives, lines
+
+def _kv_parse_block(lines, node, filename):
+    """Fill ``node`` with the properties, handlers and children in ``lines``."""
+    indent = lines[0][0]
+    i, n = 0, len(lines)
+    while i < n:
+        ind, text, lineno = lines[i]
+        if ind != indent:
+            raise ParserException(filename, lineno, 'invalid indentation')
+        key, sep, value = text.partition(':')
+        key, value = key.strip(), value.strip()
+        if not sep or not key:
+            raise ParserException(filename, lineno, 'expected "name: value"')
+        j = i + 1
+        while j < n and lines[j][0] > indent:
+            j += 1
+        block = lines[i + 1:j]
+        i = j
+        if key[0].isupper() and not value:
+            child = _KvNode(key, lineno)
+            if block:
+                _kv_parse_block(block, child, filename)
+            node.children.append(child)
+            continue
+        if key in ('canvas', 'canvas.before', 'canvas.after'):
+            node.canvas.append((key, block, lineno))
+            continue
+        if block:
+            # Deeper lines continue the value (multi-line handlers...)
+            base = block[0][0]
+            extra = '\n'.join(' ' * (ind2 - base) + line for ind2, line, _ in block)
+            value = f'{value}\n{extra}' if value else extra
+        if not value:
+            raise ParserException(filename, lineno, f'no value for {key!r}')
+        if key == 'id':
+            if not value.isidentifier():
+                raise ParserException(filename, lineno, f'invalid id {value!r}')
+            node.id = value
+        elif key.startswith('on_'):
+            node.handlers.append((key, value, lineno))
+        else:
+            node.props.append((key, value, lineno))
+
+def _kv_parse(source, filename):
+    """``(directives, rules, root)``; rules are ``(selectors, dynamic, node)``."""
+    directives, lines = _kv_lines(source, filename)
+    rules, root = [], None
+    i, n = 0, len(lines)
+    while i < n:
+        ind, text, lineno = lines[i]
+        if ind:
+            raise ParserException(filename, lineno, 'invalid indentation')
+        if not text.endswith(':'):
+            raise ParserException(filename, lineno, 'expected a rule ("<Class>:" or "Class:")')
+        head = text[:-1].strip()
+        j = i + 1
+        while j < n and lines[j][0] > 0:
+            j += 1
+        block = lines[i + 1:j]
+        i = j
+        if head.startswith('<') and head.endswith('>'):
+            node = _KvNode(head, lineno)
+            selectors, dynamic = [], None
+            for sel in head[1:-1].split(','):
+                name, _, bases = sel.strip().lstrip('-').partition('@')
+                if not name.isidentifier():
+                    raise ParserException(filename, lineno, f'invalid rule {head!r}')
+                selectors.append(name)
+                if bases:
+                    dynamic = (name, bases)
+            rules.append((tuple(selectors), dynamic, node))
+        else:
+            if root is not None:
+                raise ParserException(filename, lineno, 'only one root widget is allowed')
+            if not head.isidentifier():
+                raise ParserException(filename, lineno, f'invalid rule {head!r}')
+            node = root = _KvNode(head, lineno)
+        if block:
+            _kv_parse_block(block, node, filename)
+    return directives, rules, root
+
+def _kv_chains(value, filename, lineno):
+    """Maximal ``name.attr...`` chains read by a property expression."""
+    import ast
+    try:
+        tree = ast.parse(value.strip(), mode='eval')
+    except SyntaxError as exc:
+        raise ParserException(filename, lineno, f'invalid expression: {exc.msg}') from None
+    chains, inner = [], set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Attribute) or id(node) in inner:
+            continue
+        path = []
+        while isinstance(node, ast.Attribute):
+            path.append(node.attr)
+            node = node.value
+            inner.add(id(node))
+        if isinstance(node, ast.Name):
+            chain = (node.id, tuple(reversed(path)))
+            if chain not in chains:
+                chains.append(chain)
+    return chains
+
+class _KvCompiler:
+    """Turns parsed KV into the source of a Python module (RULES, DYNAMIC, ROOT)."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.out = []
+        self.count = itertools.count(1)
+
+    def emit(self, depth, text):
+        self.out.append('    ' * depth + text)
+
+    def compile(self, directives, rules, root):
+        emit = self.emit
+        emit(0, f'# Compiled from {self.filename}')
+        for parts, lineno in directives:
+            if parts[0] == 'import' and len(parts) == 2 and len(parts[1].split()) == 2:
+                name, target = parts[1].split()
+                emit(0, f'{name} = _kv.import_name({target!r})')
+            elif parts[0] == 'set' and len(parts) == 2 and len(parts[1].split(None, 1)) == 2:
+                name, value = parts[1].split(None, 1)
+                emit(0, f'{name} = ({value})')
+            elif parts[0] == 'include' and len(parts) == 2:
+                emit(0, f'_kv.include({parts[1].split()[-1]!r})')
+            elif parts[0] != 'kivy':
+                raise ParserException(self.filename, lineno, f'unknown directive {parts[0]!r}')
+        dynamic, table = [], []
+        for selectors, dyn, node in rules:
+            if dyn is not None:
+                dynamic.append((dyn[0], dyn[1], tuple(key for key, _, _ in node.props)))
+            fn = f'_rule_{next(self.count)}'
+            emit(0, f'def {fn}(_kv, self, _ignored):')
+            self.rule_body(node, '_ignored')
+            table.append(f'({selectors!r}, {fn})')
+        emit(0, f'DYNAMIC = {dynamic!r}')
+        emit(0, f'RULES = [{", ".join(table)}]')
+        if root is not None:
+            emit(0, 'def ROOT(_kv):')
+            emit(1, f'self = _kv.create({root.name!r})')
+            self.rule_body(root, '()')
+            emit(1, 'return self')
+        else:
+            emit(0, 'ROOT = None')
+        return '\n'.join(self.out) + '\n'
+
+    def rule_body(self, node, ignored):
+        self.emit(1, 'root = self')
+        self.emit(1, 'ids = _kv.ids(root)')
+        self.emit(1, 'app = _kv.app()')
+        self.emit(1, '_watch = []')
+        self.node_body(node, 'self', ignored)
+        self.emit(1, '_kv.finish(_watch)')
+
+    def node_body(self, node, var, ignored):
+        emit = self.emit
+        if node.id:
+            emit(1, f'{node.id} = ids[{node.id!r}] = {var}')
+        for key, value, lineno in node.props:
+            chains = _kv_chains(value, self.filename, lineno)
+            watched = ''.join(f'(lambda self: {head}, {path!r}), '
+                              for head, path in chains if path)
+            emit(1, f'_watch.append(({var}, {key!r}, lambda self: ({value}\n), '
+                    f'({watched}), {ignored}, {self.filename!r}, {lineno}))')
+        for key, value, lineno in node.handlers:
+            fn = f'_handler_{next(self.count)}'
+            emit(1, f'def {fn}(*args, self={var}):')
+            for line in value.splitlines():
+                emit(2, line)
+            emit(1, f'{var}.fbind({key!r}, {fn})')
+        for key, block, lineno in node.canvas:
+            self.canvas_body(key, block, lineno, var)
+        for child in node.children:
+            child_var = f'_w{next(self.count)}'
+            emit(1, f'{child_var} = _kv.create({child.name!r})')
+            self.node_body(child, child_var, '()')
+            emit(1, f'{var}.add_widget({child_var})')
+
+    def canvas_body(self, key, block, lineno, var):
+        # Instructions are created and added in order; ``self`` in their
+        # expressions is still the widget, as in Kivy
+        if not block:
+            return
+        holder = _KvNode(key, lineno)
+        _kv_parse_block(block, holder, self.filename)
+        if holder.props or holder.handlers:
+            bad = (holder.props or holder.handlers)[0]
+            raise ParserException(self.filename, bad[2],
+                                  f'{key}: expected an instruction, got {bad[0]!r}')
+        for inst in holder.children:
+            if inst.children or inst.canvas or inst.handlers:
+                raise ParserException(self.filename, inst.lineno,
+                                      f'{inst.name}: instructions only take properties')
+            ivar = f'_g{next(self.count)}'
+            self.emit(1, f'{ivar} = _kv.create({inst.name!r})')
+            for name, value, plineno in inst.props:
+                chains = _kv_chains(value, self.filename, plineno)
+                watched = ''.join(f'(lambda _, self={var}: {head}, {path!r}), '
+                                  for head, path in chains if path)
+                self.emit(1, f'_watch.append(({ivar}, {name!r}, lambda _, self={var}: ({value}\n), '
+                             f'({watched}), (), {self.filename!r}, {plineno}))')
+            self.emit(1, f'{var}.{key}.add({ivar})')
+
+class _KvIds(dict):
+    """``root.ids``: dict with attribute access (``self.ids.slider``)."""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+class _KvWatcher:
+    """
+    Keeps ``widget.<name>`` equal to a KV expression.
+
+    Bound (fbind) to every property the expression reads; re-evaluated
+    once per frame when some of them changed, since notifications are
+    deferred and coalesced.  Chains through objects (``self.parent.width``)
+    are re-bound when an intermediate changes.
+    """
+    __slots__ = ('widget', 'name', 'expr', 'chains', 'where', 'bound', 'failed', '__weakref__')
+
+    def __init__(self, widget, name, expr, chains, where):
+        self.widget, self.name, self.expr, self.chains = widget, name, expr, chains
+        self.where, self.bound, self.failed = where, [], False
+
+    def update(self, *args):
+        widget = self.widget
+        try:
+            value = self.expr(widget)
+        except Exception as exc:
+            if not self.failed:   # typically self.parent.x before add_widget
+                self.failed = True
+                report_error(f'KV {self.where[0]}:{self.where[1]}: {self.name}: {exc!r}')
+        else:
+            self.failed = False
+            setattr(widget, self.name, value)
+        if not self.bound or any(len(path) > 1 for _, path in self.chains):
+            self.bind()
+
+    def bind(self):
+        for obj, attr in self.bound:
+            obj.funbind(attr, self.update)
+        bound = self.bound = []
+        for head, path in self.chains:
+            try:
+                obj = head(self.widget)
+            except Exception:
+                continue
+            for attr in path:
+                if hasattr(obj, 'fbind'):
+                    obj.fbind(attr, self.update)
+                    bound.append((obj, attr))
+                obj = getattr(obj, attr, None)
+                if obj is None:
+                    break
+
+class _KvRuntime:
+    """Helpers called by the compiled KV modules."""
+    def create(self, classname):
+        return Factory.get(classname)()
+
+    def ids(self, root):
+        ids = getattr(root, 'ids', None)
+        if not isinstance(ids, _KvIds):
+            ids = root.ids = _KvIds()
+        return ids
+
+    def app(self):
+        return _RUNNING_APP
+
+    def import_name(self, target):
+        try:
+            return importlib.import_module(target)
+        except ImportError:
+            module, _, name = target.rpartition('.')
+            return getattr(importlib.import_module(module), name)
+
+    def include(self, filename):
+        Builder.load_file(filename)
+
+    def finish(self, watch):
+        for widget, name, expr, chains, ignored, filename, lineno in watch:
+            if name in ignored:   # passed to the constructor: it wins
+                continue
+            if not chains:
+                try:
+                    setattr(widget, name, expr(widget))
+                except Exception as exc:
+                    raise BuilderException(filename, lineno, f'{name}: {exc!r}') from exc
+                continue
+            watcher = _KvWatcher(widget, name, expr, chains, (filename, lineno))
+            watchers = widget.__dict__.setdefault('_kv_watchers', [])
+            watchers.append(watcher)
+            watcher.update()
+
+_KV_RUNTIME = _KvRuntime()
+_KV_VERSION = '2'   # bump when the generated code changes (disk cache)
+
+class _KvRule:
+    __slots__ = ('selectors', 'apply', 'filename')
+
+    def __init__(self, selectors, apply, filename):
+        self.selectors, self.apply, self.filename = selectors, apply, filename
+
+class _Builder:
+    """
+    ``kivy.lang.Builder`` on top of the connector's widgets.
+
+    KV source is parsed once and compiled into a small Python module
+    (one function per rule).  The code object is cached by content hash in
+    memory and, marshalled, in the backend's cache directory: IndexedDB
+    (IDBFS) in the browser, so later page loads skip parsing and compiling.
+    Class rules (``<MyWidget>:``) are applied when such a widget is built
+    (``WidgetMetaclass.__call__``); property expressions are bound only
+    to the properties they read.
+    """
+    def __init__(self):
+        self.rules = _KV_RULES
+        self.files = []
+        self._code = {}         # content hash -> code object
+        self._by_class = {}     # class -> rules applied to it, MRO order
+        self.memory_hits = self.disk_hits = self.compiles = 0
+
+    def load_file(self, filename, **kwargs):
+        with open(filename, encoding='utf-8') as f:
+            source = f.read()
+        if filename not in self.files:
+            self.files.append(filename)
+        return self.load_string(source, filename=filename, **kwargs)
 
-# kivy.core.window
-kivy_core_window = types.ModuleType('kivy.core.window')
-kivy_core_window.Window = Window
-sys.modules['kivy.core.window'] = kivy_core_window
+    def unload_all(self):
+        """Forget every rule (app teardown); compiled code stays cached."""
+        del self.rules[:]
+        self.files.clear()
+        self._by_class.clear()
 
-# kivy.properties
-kivy_properties = types.ModuleType('kivy.properties')
-kivy_properties.ObjectProperty = ObjectProperty
-kivy_properties.StringProperty = StringProperty
-sys.modules['kivy.properties'] = kivy_properties
-setattr(kivy, 'properties', kivy_properties)
+    def unload_file(self, filename):
+        self.rules[:] = [rule for rule in self.rules if rule.filename != filename]
+        self._by_class.clear()
+        if filename in self.files:
+            self.files.remove(filename)
 
+    def load_string(self, string, filename='<string>', **kwargs):
+        """Load KV rules; returns the root widget if the source has one."""
+        code = self._compiled(string, filename)
+        namespace = {'__name__': 'kv', '_kv': _KV_RUNTIME, 'Factory': Factory}
+        exec(code, namespace)
+        for name, bases, properties in namespace['DYNAMIC']:
+            Factory.register(name, baseclasses=bases, properties=properties)
+        for selectors, apply in namespace['RULES']:
+            self.rules.append(_KvRule(selectors, apply, filename))
+        self._by_class.clear()
+        root = namespace['ROOT']
+        return root(_KV_RUNTIME) if root is not None else None
 
+    def _compiled(self, source, filename):
+        key = hashlib.sha256(f'{_KV_VERSION}\0{filename}\0{source}'.encode()).hexdigest()
+        code = self._code.get(key)
+        if code is not None:
+            self.memory_hits += 1
+            return code
+        cache_dir = get_backend().cache_dir()
+        path = (os.path.join(cache_dir, f'kv-{key[:32]}.{sys.implementation.cache_tag}')
+                if cache_dir else None)
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    code = marshal.loads(f.read())
+                self.disk_hits += 1
+            except (OSError, ValueError, EOFError):
+                code = None
+        if code is None:
+            self.compiles += 1
+            python = _KvCompiler(filename).compile(*_kv_parse(source, filename))
+            code = compile(python, filename, 'exec')
+            if path is not None:
+                try:
+                    with open(path, 'wb') as f:
+                        f.write(marshal.dumps(code))
+                    get_backend().sync_cache()
+                except OSError:
+                    pass
+        self._code[key] = code
+        return code
 
-kivy_uix_popup = types.ModuleType('kivy.uix.popup')
-kivy_uix_popup.Popup = Popup
-sys.modules['kivy.uix.popup'] = kivy_uix_popup
+    def compile_string(self, string, filename='<string>'):
+        """The Python source generated for ``string`` (debugging aid)."""
+        return _KvCompiler(filename).compile(*_kv_parse(string, filename))
 
-kivymd_menu = types.ModuleType('kivymd.uix.menu')
-kivymd_menu.MDDropdownMenu = MDDropdownMenu
-sys.modules['kivymd.uix.menu'] = kivymd_menu
+    def _rules_for(self, cls):
+        rules = self._by_class.get(cls)
+        if rules is None:
+            names = [base.__name__ for base in reversed(cls.__mro__)]
+            rules = self._by_class[cls] = [rule for name in names for rule in self.rules
+                                           if name in rule.selectors]
+        return rules
 
-# kivy.uix.*
-kivy_uix_screenmanager = types.ModuleType('kivy.uix.screenmanager')
-kivy_uix_screenmanager.Screen = Screen
-kivy_uix_screenmanager.ScreenManager = ScreenManager
-kivy_uix_screenmanager.FadeTransition = FadeTransition
-sys.modules['kivy.uix.screenmanager'] = kivy_uix_screenmanager
+    def apply(self, widget, ignored=()):
+        """Apply the class rules matching ``widget`` (base classes first)."""
+        rules = self._rules_for(type(widget))
+        for rule in rules:
+            rule.apply(_KV_RUNTIME, widget, ignored)
+        return bool(rules)
 
+    def stats(self):
+        return {'rules': len(self.rules), 'files': len(self.files),
+                'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits,
+                'compiles': self.compiles}
 
-kivy_uix_boxlayout = types.ModuleType('kivy.uix.boxlayout')
-kivy_uix_boxlayout.BoxLayout = BoxLayout
-sys.modules['kivy.uix.boxlayout'] = kivy_uix_boxlayout
+Builder = _Builder()
 
-# kivy.uix.gridlayout
-kivy_uix_gridlayout = types.ModuleType('kivy.uix.gridlayout')
-kivy_uix_gridlayout.GridLayout = GridLayout
-sys.modules['kivy.uix.gridlayout'] = kivy_uix_gridlayout
-setattr(kivy_uix, 'gridlayout', kivy_uix_gridlayout)
+def _load_app_kv(app, module):
+    """Root from the app's kv file (``MyApp`` -> ``my.kv`` next to its module)."""
+    name = type(app).__name__
+    kv_file = getattr(app, 'kv_file', None)
+    if kv_file is None:
+        base = name[:-3] if name.endswith('App') else name
+        kv_file = os.path.join(os.path.dirname(getattr(module, '__file__', '') or '.'),
+                               base.lower() + '.kv')
+    if not os.path.exists(kv_file):
+        return None
+    return Builder.load_file(kv_file)
 
-kivy_uix_scrollview = types.ModuleType('kivy.uix.scrollview')
-kivy_uix_scrollview.ScrollView = ScrollView
-sys.modules['kivy.uix.scrollview'] = kivy_uix_scrollview
+# ------------------------------------------------------------
+#  Faux modules kivy.* / kivymd.* : construits à la demande (import hook)
+# ------------------------------------------------------------
+# module -> names it re-exports from this file.  Parent packages (kivy,
+# kivy.uix, kivymd, ...) are derived from the table.
+_KIVY_MODULES = {
+    'kivy.clock': ('Clock', 'ClockEvent'),
+    'kivy.animation': ('Animation', 'AnimationTransition', 'Sequence', 'Parallel'),
+    'kivy.metrics': ('dp',),
+    'kivy.lang': ('Builder', 'ParserException', 'BuilderException'),
+    'kivy.storage.jsonstore': ('JsonStore',),
+    'kivy.storage.dictstore': ('DictStore',),
+    'kivy.factory': ('Factory', 'FactoryException'),
+    'kivy.properties': ('Property', 'NumericProperty', 'StringProperty', 'BooleanProperty',
+                        'ObjectProperty', 'OptionProperty', 'ListProperty', 'DictProperty',
+                        'ReferenceListProperty'),
+    'kivy.graphics': ('Color', 'Line', 'Ellipse', 'Rectangle', 'RoundedRectangle', 'Mesh',
+                      'Instruction', 'InstructionGroup', 'Canvas', 'CanvasBase'),
+    'kivy.graphics.instructions': ('Instruction', 'InstructionGroup', 'Canvas', 'CanvasBase'),
+    'kivy.graphics.context_instructions': ('Color',),
+    'kivy.graphics.vertex_instructions': ('Line', 'Ellipse', 'Rectangle', 'RoundedRectangle',
+                                          'Mesh', 'VertexInstruction'),
+    'kivy.core.window': ('Window',),
+    'kivy.input.motionevent': ('MotionEvent',),
+    'kivy.uix.widget': ('Widget',),
+    'kivy.uix.label': ('Label',),
+    'kivy.uix.button': ('Button',),
+    'kivy.uix.textinput': ('TextInput',),
+    'kivy.uix.slider': ('Slider',),
+    'kivy.uix.switch': ('Switch',),
+    'kivy.uix.progressbar': ('ProgressBar',),
+    'kivy.uix.image': ('Image', 'AsyncImage'),
+    'kivy.uix.spinner': ('Spinner',),
+    'kivy.uix.popup': ('Popup',),
+    'kivy.uix.layout': ('Layout',),
+    'kivy.uix.boxlayout': ('BoxLayout',),
+    'kivy.uix.gridlayout': ('GridLayout',),
+    'kivy.uix.scrollview': ('ScrollView',),
+    'kivy.uix.recycleview': ('RecycleView',),
+    'kivy.uix.recycleboxlayout': ('RecycleBoxLayout',),
+    'kivy.uix.screenmanager': ('Screen', 'ScreenManager', 'FadeTransition'),
+    'kivymd.app': ('MDApp',),
+    'kivymd.uix.toolbar': ('MDTopAppBar', 'MDToolbar'),
+    'kivymd.uix.button': ('MDRaisedButton', 'MDFlatButton', 'MDIconButton'),
+    'kivymd.icon_definitions': ('md_icons',),
+    'kivymd.uix.label': ('MDLabel',),
+    'kivymd.uix.textfield': ('MDTextField',),
+    'kivymd.uix.dialog': ('MDDialog',),
+    'kivymd.uix.menu': ('MDDropdownMenu',),
+    'kivymd.uix.list': ('MDList', 'OneLineListItem'),
+    'kivymd.uix.card': ('MDCard',),
+    'kivymd.uix.selectioncontrol': ('MDCheckbox',),
+    'kivymd.uix.slider': ('MDSlider',),
+    'kivymd.uix.progressbar': ('MDProgressBar',),
+}
+_KIVY_PACKAGES = frozenset(name.rsplit('.', depth)[0]
+                           for name in _KIVY_MODULES
+                           for depth in range(1, name.count('.') + 1))
 
-kivy_uix_spinner = types.ModuleType('kivy.uix.spinner')
-kivy_uix_spinner.Spinner = Spinner
-sys.modules['kivy.uix.spinner'] = kivy_uix_spinner
+class _KivyModuleFinder:
+    """
+    ``sys.meta_path`` hook serving the faux ``kivy`` / ``kivymd`` tree.
 
+    Only the module objects are lazy: each is created on its first import
+    and re-exports the names listed in ``_KIVY_MODULES``, while the classes
+    themselves are defined with connector.py.  Packages also resolve their
+    submodules as attributes (``kivy.metrics.dp``).  The hook comes after
+    the path finders, so an installed Kivy is never hidden.
+    """
+    def find_spec(self, fullname, path=None, target=None):
+        root = sys.modules.get(fullname.partition('.')[0])
+        if root is not None and not isinstance(getattr(root, '__loader__', None),
+                                               _KivyModuleFinder):
+            return None   # a real kivy package: leave its submodules alone
+        if fullname in _KIVY_MODULES or fullname in _KIVY_PACKAGES:
+            return importlib.util.spec_from_loader(
+                fullname, self, is_package=fullname in _KIVY_PACKAGES)
+        return None
 
-kivy_uix_image = types.ModuleType('kivy.uix.image')
-kivy_uix_image.Image = Image
-sys.modules['kivy.uix.image'] = kivy_uix_image
+    def create_module(self, spec):
+        return None
 
-# kivy.uix.textinput
-kivy_uix_textinput = types.ModuleType('kivy.uix.textinput')
-kivy_uix_textinput.TextInput = TextInput
-sys.modules['kivy.uix.textinput'] = kivy_uix_textinput
-setattr(kivy_uix, 'textinput', kivy_uix_textinput)
+    def exec_module(self, module):
+        name = module.__name__
+        namespace = globals()
+        for attr in _KIVY_MODULES.get(name, ()):
+            setattr(module, attr, namespace[attr])
+        if name in _KIVY_PACKAGES:
+            def __getattr__(attr, _prefix=name + '.'):
+                if _prefix + attr in _KIVY_MODULES or _prefix + attr in _KIVY_PACKAGES:
+                    return importlib.import_module(_prefix + attr)
+                raise AttributeError(f"module {name!r} has no attribute {attr!r}")
+            module.__getattr__ = __getattr__
 
-# kivymd.* modules
-kivymd_app = types.ModuleType('kivymd.app')
-kivymd_app.MDApp = MDApp
-sys.modules['kivymd.app'] = kivymd_app
+def _install_kivy_finder():
+    # Re-running this file (tests, reload) replaces the previous tree
+    sys.meta_path[:] = [f for f in sys.meta_path if type(f).__name__ != '_KivyModuleFinder']
+    for name in [n for n, m in sys.modules.items()
+                 if type(getattr(m, '__loader__', None)).__name__ == '_KivyModuleFinder']:
+        del sys.modules[name]
+    # Last: the real kivy / kivymd win when installed (CPython)
+    sys.meta_path.append(_KivyModuleFinder())
 
-kivymd_toolbar = types.ModuleType('kivymd.uix.toolbar')
-kivymd_toolbar.MDTopAppBar = MDTopAppBar
-sys.modules['kivymd.uix.toolbar'] = kivymd_toolbar
+_install_kivy_finder()
 
-kivymd_button = types.ModuleType('kivymd.uix.button')
-kivymd_button.MDRaisedButton = MDRaisedButton
-kivymd_button.MDFlatButton = MDFlatButton
-kivymd_button.MDIconButton = MDIconButton
-sys.modules['kivymd.uix.button'] = kivymd_button
+# ------------------------------------------------------------
+#  Rechargement à chaud (mode dev) : seule l'app est ré-exécutée
+# ------------------------------------------------------------
+_APP_RUN = None     # the running app: module, listeners, loop state (run_kivy_app)
+_HOT_STATE = None   # widget state carried over by reload_app()
 
-kivymd_label = types.ModuleType('kivymd.uix.label')
-kivymd_label.MDLabel = MDLabel
-sys.modules['kivymd.uix.label'] = kivymd_label
+# What a reload keeps, per widget class (matched by KV id)
+_HOT_STATE_PROPS = ((TextInput, ('text',)), (Slider, ('value',)), (Switch, ('active',)),
+                    (ScrollView, ('scroll_y',)))
 
-kivymd_dialog = types.ModuleType('kivymd.uix.dialog')
-kivymd_dialog.MDDialog = MDDialog
-sys.modules['kivymd.uix.dialog'] = kivymd_dialog
+def _hot_walk(app):
+    """``(key, widget)`` for the app's root, screen manager and every KV id."""
+    seen = Counter()
+    def walk(widget):
+        ids = getattr(widget, 'ids', None)
+        if isinstance(ids, _KvIds):
+            for name, target in ids.items():
+                key = (type(widget).__name__, name)
+                seen[key] += 1   # same rule used several times: keep them apart
+                yield key + (seen[key],), target
+        children = list(getattr(widget, 'children', ()))
+        if isinstance(widget, ScreenManager):
+            children += list(widget.screens.values())
+        for child in children:
+            yield from walk(child)
+    for key, widget in (('<root>', app.root), ('<screen_manager>',
+                                                getattr(app, 'screen_manager', None))):
+        if widget is not None:
+            yield key, widget
+            yield from walk(widget)
 
-kivymd_textfield = types.ModuleType('kivymd.uix.textfield')
-kivymd_textfield.MDTextField = MDTextField
-sys.modules['kivymd.uix.textfield'] = kivymd_textfield
+def _collect_hot_state(app):
+    state = {}
+    for key, widget in _hot_walk(app):
+        if isinstance(widget, ScreenManager):
+            if widget.current is not None:
+                state[key] = {'current': widget.current.name}
+            continue
+        for cls, props in _HOT_STATE_PROPS:
+            if isinstance(widget, cls):
+                state[key] = {name: getattr(widget, name) for name in props}
+                break
+    return state
 
-kivymd_list = types.ModuleType('kivymd.uix.list')
-kivymd_list.MDList = MDList
-kivymd_list.OneLineListItem = OneLineListItem
-sys.modules['kivymd.uix.list'] = kivymd_list
+def _restore_hot_state(app, state):
+    for key, widget in list(_hot_walk(app)):
+        values = state.get(key)
+        if not values:
+            continue
+        try:
+            if isinstance(widget, ScreenManager):
+                widget.switch_to(values['current'])
+            else:
+                for name, value in values.items():
+                    setattr(widget, name, value)
+        except Exception as exc:
+            report_error(f'Hot reload: cannot restore {key}:', exc)
 
-kivymd_card = types.ModuleType('kivymd.uix.card')
-kivymd_card.MDCard = MDCard
-sys.modules['kivymd.uix.card'] = kivymd_card
+def stop_kivy_app():
+    """
+    Tear the running app down: its event listeners, frame loop, timers,
+    bridges, Clock events, tweens, pending bindings and KV rules.  Pyodide, the
+    connector, the backend and the caches (bitmaps, glyphs, compiled KV)
+    stay.  Calls ``app.on_stop()`` if defined; returns the old app.
+    """
+    global _APP_RUN, _REQUEST_FRAME, _RUNNING_APP
+    run = _APP_RUN
+    if run is None:
+        return None
+    _APP_RUN = None
+    run['alive'] = False   # an already requested frame returns at once
+    backend = run['backend']
+    for event, handler in run['listeners']:
+        backend.remove_listener(event, handler)
+    timer = run['timer']
+    if timer is not None and timer['id'] is not None:
+        backend.clear_timeout(timer['id'])
+    app = run['app']
+    on_stop = getattr(app, 'on_stop', None)
+    if on_stop is not None:
+        try:
+            on_stop()
+        except Exception:
+            report_error('on_stop error:', traceback.format_exc())
+    close_bridges()   # their callbacks would reach the old widgets
+    _REQUEST_FRAME = _RUNNING_APP = None
+    Clock.clear()
+    ANIMATIONS.clear()
+    _PENDING_BINDINGS.clear()
+    _LAYOUT_QUEUE.clear()
+    Window.focus_widget = None
+    HIT_INDEX.root = None
+    HIT_INDEX.invalidate()
+    LAYER_CACHE.clear()
+    Builder.unload_all()
+    flush_stores()
+    return app
 
+def reload_app(changed=(), keep_state=True):
+    """
+    Re-run the app module without restarting Pyodide (dev mode).
 
-setattr(kivy_uix, 'widget', kivy_uix_widget)
-setattr(kivy_uix, 'boxlayout', kivy_uix_boxlayout)
-setattr(kivy_uix, 'spinner', kivy_uix_spinner)
-setattr(kivy_uix, 'image',    kivy_uix_image)
-setattr(kivy_uix, 'screenmanager', kivy_uix_screenmanager)
-setattr(kivy_uix, 'boxlayout', kivy_uix_boxlayout)
-setattr(kivy_uix, 'scrollview', kivy_uix_scrollview)
+    ``changed`` lists other modified files (``helpers.py``): those modules
+    are dropped from ``sys.modules`` so the app imports them afresh.  The
+    source is compiled first: on a syntax error the running app is kept.
+    With ``keep_state``, text inputs, slider values, switches, scroll
+    positions and the current screen are carried over, matched by KV id.
+    Returns the new app, or None.
+    """
+    global _HOT_STATE
+    run = _APP_RUN
+    if run is None or not run['path']:
+        report_error('Hot reload: no running app')
+        return None
+    try:
+        with open(run['path'], encoding='utf-8') as f:
+            compile(f.read(), run['path'], 'exec')
+    except (OSError, SyntaxError):
+        report_error('Hot reload: app kept,', traceback.format_exc(limit=0))
+        return None
+    for name in changed:
+        module = os.path.splitext(os.path.basename(name))[0]
+        if name.endswith('.py') and module not in ('connector', 'wire'):
+            sys.modules.pop(module, None)
+    state = _collect_hot_state(run['app']) if keep_state else None
+    stop_kivy_app()
+    importlib.invalidate_caches()
+    _HOT_STATE = state
+    try:
+        if run['module'] == '__main__':
+            import runpy
+            runpy.run_path(run['path'], run_name='__main__')
+        else:
+            sys.modules.pop(run['module'], None)
+            importlib.import_module(run['module'])
+        if _APP_RUN is None:   # the module does not start the app itself
+            run_kivy_app(run['module'], run['class'], backend=run['backend'], **run['options'])
+    except Exception:
+        report_error('Hot reload failed:', traceback.format_exc())
+    finally:
+        _HOT_STATE = None
+    mark_dirty()
+    return _RUNNING_APP
 
 # --- Launcher ---
-def run_kivy_app(app_module, app_class):
+def run_kivy_app(app_module, app_class, draw_list=True, backend=None, profile=False):
+    """Build ``app_module.app_class`` and start the frame loop on ``backend``.
+
+    Defaults to the Canvas2D backend in the browser and to a
+    RecordingBackend on plain CPython.  ``profile=True`` starts the
+    frame profiler with its overlay (F2 toggles it at any time).
+    Returns the app instance.
+    """
+    global _REQUEST_FRAME, _RUNNING_APP, _APP_RUN, ctx
+    if _APP_RUN is not None:
+        stop_kivy_app()   # re-run (hot reload): replace the running app
+    backend = set_backend(backend) if backend is not None else get_backend()
+    raw = backend.create_context()
+    # Batch canvas calls when the backend has a draw-list sink
+    sink = backend.draw_sink() if draw_list else None
+    ctx = DrawList(raw, sink) if sink is not None else ShadowContext(raw)
     mod = importlib.import_module(app_module)
     AppClass = getattr(mod, app_class)
-    app = AppClass(); root = getattr(app,'root',None) or app.build(); app.root=root
+    app = _RUNNING_APP = AppClass()
+    run = _APP_RUN = {'module': app_module, 'class': app_class, 'app': app,
+                      'path': getattr(mod, '__file__', None), 'backend': backend,
+                      'options': {'draw_list': draw_list, 'profile': profile},
+                      'listeners': [], 'alive': True, 'timer': None}
+    def listen(event, handler):
+        run['listeners'].append((event, handler))   # removed by stop_kivy_app()
+        backend.add_listener(event, handler)
+    root = getattr(app, 'root', None) or (app.build() if hasattr(app, 'build') else None)
+    if root is None:
+        root = _load_app_kv(app, mod)   # build() without return: myapp.kv
+    app.root = root
+    if _HOT_STATE:
+        _restore_hot_state(app, _HOT_STATE)
     # Ensure root takes the full browser viewport
-    root.size = (window.innerWidth, window.innerHeight)
+    root.size = backend.window_size()
     if hasattr(root, '_update_scalar_sizes'):
         root._update_scalar_sizes()
 
     # Keep root sized on window resize
     def _on_resize(evt):
-        root.size = (window.innerWidth, window.innerHeight)
+        backend.resize_surface()
+        ctx.reset_state()   # resizing the canvas resets its drawing state
+        root.size = backend.window_size()
         if hasattr(root, '_update_scalar_sizes'):
             root._update_scalar_sizes()
-    window.addEventListener('resize', create_proxy(_on_resize))
+        mark_dirty()
+    listen('resize', _on_resize)
     manager = getattr(app,'screen_manager',None)
-    handler = create_proxy(lambda e: (manager or root).on_touch_down(e))
-    window.addEventListener('mousedown',handler)
+    HIT_INDEX.root = manager or root
+    HIT_INDEX.invalidate()
+
+    # Pointer Events : un MotionEvent par pointeur (souris, stylet, doigts)
+    touches = {}   # pointerId -> MotionEvent while in contact
+    def _on_pointerdown(evt):
+        touch = MotionEvent.from_dom(evt, Clock.get_time())
+        stale = touches.pop(touch.id, None)
+        if stale is not None:
+            dispatch_touch_up(stale)   # its pointerup never arrived
+        touches[touch.id] = touch
+        if touch.device != 'touch':
+            Window.mouse_pos = touch.pos
+        dispatch_touch_down(touch)
+        mark_dirty()
+    def _on_pointermove(evt):
+        touch = touches.get(int(evt.pointerId or 0))
+        if touch is not None:
+            touch.move(float(evt.clientX), float(evt.clientY), Clock.get_time())
+            dispatch_touch_move(touch)
+            if touch.grab_list or touch.device == 'touch':
+                return
+        # Pointeur sans contact (ou sans grab) : survol uniquement
+        hover = _PointerEvent.from_dom(evt)
+        Window.mouse_pos = hover.pos
+        dispatch_hover(hover)
+    def _on_pointerup(evt):
+        touch = touches.pop(int(evt.pointerId or 0), None)
+        if touch is None:
+            return
+        now = Clock.get_time()
+        touch.move(float(evt.clientX), float(evt.clientY), now)
+        touch.time_end = now
+        dispatch_touch_up(touch)
+        request_frame()
+    listen('pointerdown', _on_pointerdown)
+    listen('pointermove', _on_pointermove)
+    listen('pointerup', _on_pointerup)
+    listen('pointercancel', _on_pointerup)
+
+    # Un seul rAF en attente à la fois ; aucun tant que l'arbre est propre
+    frame_pending = [False]
+    first_frame_done = [False]
+    clock_timer = run['timer'] = {'id': None, 'deadline': None}
+    def _on_clock_timer(*_):
+        clock_timer['id'] = clock_timer['deadline'] = None
+        request_frame()
+    def _arm_clock():
+        # Due events (or budget leftovers) → next frame ; otherwise a timer
+        if Clock.tick():
+            request_frame()
+            return
+        deadline = Clock.next_deadline()
+        if deadline is None or deadline == clock_timer['deadline']:
+            return
+        if clock_timer['id'] is not None:
+            backend.clear_timeout(clock_timer['id'])
+        delay_ms = max(0, (deadline - Clock.get_time()) * 1000)
+        clock_timer['deadline'] = deadline
+        clock_timer['id'] = backend.set_timeout(_on_clock_timer, delay_ms)
     def loop(_):
-        # Refresh root size each frame (in case of dynamic changes)
-        root.size = (window.innerWidth, window.innerHeight)
-        if hasattr(root, '_update_scalar_sizes'):
-            root._update_scalar_sizes()
-        ctx.clearRect(0,0,window.innerWidth,window.innerHeight)
+        global _NEEDS_REDRAW
+        frame_pending[0] = False
+        if not run['alive']:
+            return   # stopped (hot reload): a newer loop has taken over
+        prof = PROFILER if PROFILER.active else None
+        if prof:
+            prof.begin_frame()
+        backend.poll_input()
+        if prof:
+            prof.phase('events')
+        _arm_clock()
+        # Tweens : une passe groupée par frame tant qu'il en reste
+        if ANIMATIONS.active and ANIMATIONS.step(Clock.get_time()):
+            request_frame()
+        # Observateurs bind() : une notification par (widget, propriété)
+        if _PENDING_BINDINGS:
+            flush_bindings()
+        if prof:
+            prof.phase('bindings')
+        if _LAYOUT_QUEUE:
+            run_layouts()
+        if prof:
+            prof.phase('layout')
+        if not _NEEDS_REDRAW:
+            FRAME_STATS['skipped'] += 1
+            if prof:
+                prof.end_frame(False)
+            return  # idle until the next mark_dirty()/request_frame()
+        _NEEDS_REDRAW = False
+        width, height = backend.window_size()
+        ctx.clearRect(0, 0, width, height)
         try:
-            (manager or root).draw()
-#        except Exception as exc:
-#            from js import console
-#            console.error("Draw cycle error:", exc);
+            draw_widget(manager or root)
         except Exception as exc:
-            from js import console
-            tb = traceback.format_exc()
-            console.error("Draw cycle error:", exc, "\n", tb)
-        window.requestAnimationFrame(create_proxy(loop))
-    # Gestion clavier pour TextInput
+            report_error("Draw cycle error:", exc, "\n", traceback.format_exc())
+        if prof:
+            prof.phase('draw')
+            if prof.overlay:
+                prof.draw_overlay(width, height)
+        _flush_ctx()
+        if prof:
+            prof.phase('flush')
+            prof.end_frame(True)
+        FRAME_STATS['rendered'] += 1
+        if not first_frame_done[0]:
+            first_frame_done[0] = True
+            backend.first_frame()
+        # Layout done during draw may have changed the tree: settle next frame
+        if _NEEDS_REDRAW:
+            request_frame()
+    def _request():
+        if not frame_pending[0]:
+            frame_pending[0] = True
+            backend.request_frame(loop)
+    _REQUEST_FRAME = _request
+    # Input queued while idle wakes the loop, which polls it once per frame
+    backend.on_input(request_frame)
+
+    # Gestion clavier : widget ayant le focus (TextInput)
     def key_handler(evt):
-        if ACTIVE_TEXTINPUT is None:
+        if evt.key == PROFILER.toggle_key:
+            PROFILER.toggle()
             return
-        key = evt.key
-        if key == 'Backspace':
-            ACTIVE_TEXTINPUT.text = ACTIVE_TEXTINPUT.text[:-1]
-        elif len(key) == 1:
-            ACTIVE_TEXTINPUT.text += key
-    window.addEventListener('keydown', create_proxy(key_handler))
-    # Drag support pour Slider
-    def mouse_move(evt):
-        if ACTIVE_SLIDER is not None:
-            ACTIVE_SLIDER._set_value_from_x(evt.clientX)
-    def mouse_up(evt):
-        global ACTIVE_SLIDER
-        ACTIVE_SLIDER = None
-    window.addEventListener('mousemove', create_proxy(mouse_move))
-    window.addEventListener('mouseup', create_proxy(mouse_up))
-    window.requestAnimationFrame(create_proxy(loop))
+        if evt.key == PROFILER.save_key and PROFILER.active:
+            PROFILER.export_trace('webkivy-trace.json')
+            return
+        handler = getattr(Window.focus_widget, 'on_key_down', None)
+        if handler is not None and handler(evt.key):
+            mark_dirty()
+    listen('keydown', key_handler)
+    def mouse_wheel(evt):
+        # deltaMode 1 = lines (Firefox), otherwise pixels
+        dy = float(evt.deltaY) * (16 if int(evt.deltaMode or 0) == 1 else 1)
+        dispatch_wheel(_PointerEvent.from_dom(evt), dy)
+    listen('wheel', mouse_wheel)
+    if profile:
+        PROFILER.start()
+    mark_dirty()
+    return app
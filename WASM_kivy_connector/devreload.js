@@ -0,0 +1,65 @@
+// devreload.js
+// ─────────────────────────────────────────────────────────────
+// Mode dev (?dev) : surveille les sources de l'app sur le serveur
+// local et les recharge à chaud, sans relancer Pyodide.  Un HEAD
+// par fichier et par intervalle (Last-Modified / ETag, servis par
+// python3 -m http.server) ; le contenu n'est relu qu'en cas de
+// changement, puis connector.reload_app() reconstruit l'app.
+// ─────────────────────────────────────────────────────────────
+
+// Changing the runtime itself needs a full restart
+const RUNTIME = new Set(['connector.py', 'wire.py']);
+
+async function signature(name) {
+  const r = await fetch(name, { method: 'HEAD', cache: 'no-store' });
+  if (!r.ok) return null;
+  const tag = [r.headers.get('ETag'), r.headers.get('Last-Modified'),
+               r.headers.get('Content-Length')].join('|');
+  // No validators (other dev servers): compare the content itself
+  return tag === '||' ? (await fetch(name, { cache: 'no-store' }).then(r => r.text())) : tag;
+}
+
+// Poll `files` and call onChange(changed, texts) with the new sources
+export function watchSources(files, onChange, interval = 1000) {
+  const known = new Map();
+  let busy = false;
+  const poll = async () => {
+    if (busy) return;
+    busy = true;
+    try {
+      const changed = [];
+      for (const name of files) {
+        const sig = await signature(name).catch(() => null);
+        if (sig === null) continue;
+        if (known.has(name) && known.get(name) !== sig) changed.push(name);
+        known.set(name, sig);
+      }
+      if (changed.length) {
+        const texts = await Promise.all(changed.map(f => fetch(f, { cache: 'no-store' }).then(r => r.text())));
+        await onChange(changed, texts);
+      }
+    } catch (err) {
+      console.warn('webkivy dev:', err);
+    } finally {
+      busy = false;
+    }
+  };
+  poll();
+  return setInterval(poll, interval);
+}
+
+// Write the changed sources to the Pyodide FS and rebuild the app in place
+export function installHotReload(pyodide, files, dir = '/webkivy', interval = 1000) {
+  return watchSources(files, async (changed, texts) => {
+    if (changed.some(name => RUNTIME.has(name))) {
+      if (typeof document !== 'undefined') location.reload();
+      else self.postMessage({ type: 'reload' });   // worker: the page reloads
+      return;
+    }
+    changed.forEach((name, i) => pyodide.FS.writeFile(`${dir}/${name}`, texts[i]));
+    const t = performance.now();
+    pyodide.globals.set('_webkivy_changed', pyodide.toPy(changed));
+    await pyodide.runPythonAsync('import connector; connector.reload_app(_webkivy_changed)');
+    console.log(`webkivy dev: reloaded ${changed.join(', ')} in ${(performance.now() - t).toFixed(0)} ms`);
+  }, interval);
+}
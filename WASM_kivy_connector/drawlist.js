@@ -0,0 +1,265 @@
+// drawlist.js
+// ─────────────────────────────────────────────────────────────
+// Interpréteur du « draw-list » construit par connector.DrawList.
+// Python remplit un buffer d'opcodes et l'envoie ici une fois par
+// frame : un seul passage Python → JS au lieu d'un par appel ctx.
+// Les tables d'opcodes doivent rester synchrones avec connector.py.
+// ─────────────────────────────────────────────────────────────
+
+const CALLS = [
+  ['clearRect', 4], ['fillRect', 4], ['strokeRect', 4], ['rect', 4],
+  ['fillText', -2], ['strokeText', -2],
+  ['save', 0], ['restore', 0], ['beginPath', 0], ['closePath', 0],
+  ['fill', 0], ['stroke', 0], ['clip', 0],
+  ['moveTo', 2], ['lineTo', 2], ['arc', 5], ['ellipse', 7], ['roundRect', 5],
+  ['translate', 2], ['scale', 2], ['rotate', 1], ['setTransform', 6],
+  ['quadraticCurveTo', 4], ['bezierCurveTo', 6],
+];
+// Offscreen layers (connector.LayerCache), decoded bitmaps (connector.ImageCache),
+// glyph atlas (connector.IconAtlas)
+const LAYER_BEGIN = 24, LAYER_END = 25, LAYER_DRAW = 26, LAYER_DROP = 27;
+const IMAGE_DRAW = 28, IMAGE_DROP = 29;
+const ATLAS_PUT = 30, ATLAS_DRAW = 31;
+// Cached Path2D geometry (connector.PathCache), numbered after the state ops
+const PATH_DEFINE = 46, PATH_FILL = 47, PATH_STROKE = 48, PATH_DROP = 49;
+// Commands inside a PATH_DEFINE (connector._PATH_*)
+const P_MOVE = 0, P_LINE = 1, P_CLOSE = 2, P_POLY = 3, P_ELLIPSE = 4, P_RECT = 5,
+      P_ROUND_RECT = 6;
+// [property, isString]
+const STATE = [
+  ['fillStyle', true], ['strokeStyle', true], ['font', true],
+  ['globalAlpha', false], ['lineWidth', false], ['shadowColor', true],
+  ['shadowBlur', false], ['shadowOffsetX', false], ['shadowOffsetY', false],
+  ['textAlign', true], ['textBaseline', true], ['lineCap', true],
+  ['lineJoin', true], ['globalCompositeOperation', true],
+];
+const STATE_BASE = 32;
+
+// id -> { canvas, ctx } ; survives between frames until LAYER_DROP
+const layers = new Map();
+// id -> ImageBitmap ; until IMAGE_DROP
+const images = new Map();
+// id -> Path2D ; until PATH_DROP
+const paths = new Map();
+// { canvas, ctx } : one square atlas, cells are managed by Python
+let atlas = null;
+
+// Fetch + decode off the frame loop, downscaled to fit maxW x maxH when
+// those are > 0, then done(id, width, height) ; width = -1 on failure.
+export async function loadImage(id, url, maxW, maxH, done) {
+  try {
+    const response = await fetch(url);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    let bitmap = await createImageBitmap(await response.blob());
+    if (maxW > 0 && maxH > 0 && (bitmap.width > maxW || bitmap.height > maxH)) {
+      const scale = Math.min(maxW / bitmap.width, maxH / bitmap.height);
+      const full = bitmap;
+      bitmap = await createImageBitmap(full, {
+        resizeWidth: Math.max(1, Math.round(full.width * scale)),
+        resizeHeight: Math.max(1, Math.round(full.height * scale)),
+        resizeQuality: 'high',
+      });
+      full.close();
+    }
+    images.set(id, bitmap);
+    done(id, bitmap.width, bitmap.height);
+  } catch (err) {
+    console.warn('webkivy: image', url, err);
+    done(id, -1, -1);
+  }
+}
+
+// Register a font file (icon fonts), then done(family, ok)
+export async function loadFont(family, url, done) {
+  try {
+    const face = new FontFace(family, `url("${url}")`);
+    await face.load();
+    (globalThis.document ? document.fonts : globalThis.fonts).add(face);
+    done(family, true);
+  } catch (err) {
+    console.warn('webkivy: font', url, err);
+    done(family, false);
+  }
+}
+
+// Hand a generated file to the user (connector.Backend.save_text): a
+// download on the page, relayed to the page from a worker
+export function saveText(name, text) {
+  if (typeof document === 'undefined') {
+    self.postMessage({ type: 'save', name, text });
+    return;
+  }
+  const url = URL.createObjectURL(new Blob([text], { type: 'application/json' }));
+  const a = document.createElement('a');
+  a.href = url;
+  a.download = name;
+  a.click();
+  setTimeout(() => URL.revokeObjectURL(url), 0);
+}
+
+function makeCanvas(w, h) {
+  if (typeof OffscreenCanvas !== 'undefined') return new OffscreenCanvas(w, h);
+  const c = document.createElement('canvas');
+  c.width = w; c.height = h;
+  return c;
+}
+
+function beginLayer(id, x, y, w, h) {
+  let layer = layers.get(id);
+  if (!layer || layer.canvas.width !== w || layer.canvas.height !== h) {
+    const canvas = makeCanvas(w, h);
+    layer = { canvas, ctx: canvas.getContext('2d') };
+    layers.set(id, layer);
+  }
+  const lctx = layer.ctx;
+  lctx.setTransform(1, 0, 0, 1, 0, 0);
+  lctx.clearRect(0, 0, w, h);
+  // Widgets draw in page coordinates: shift them into the layer
+  lctx.setTransform(1, 0, 0, 1, -x, -y);
+  return lctx;
+}
+
+function atlasPut(glyph, font, color, x, y, w, h, size) {
+  if (!atlas || atlas.canvas.width !== size) {
+    const canvas = makeCanvas(size, size);
+    atlas = { canvas, ctx: canvas.getContext('2d') };
+    atlas.ctx.textAlign = 'center';
+    atlas.ctx.textBaseline = 'middle';
+  }
+  const actx = atlas.ctx;
+  actx.save();
+  actx.beginPath();
+  actx.rect(x, y, w, h);
+  actx.clip();
+  actx.clearRect(x, y, w, h);
+  actx.font = font;
+  actx.fillStyle = color;
+  actx.fillText(glyph, x + w / 2, y + h / 2);
+  actx.restore();
+}
+
+// Build a Path2D from nums[start, end): P_POLY is followed by a point count
+// and the points (moveTo the first, lineTo the others)
+function definePath(nums, start, end) {
+  const path = new Path2D();
+  let n = start;
+  while (n < end) {
+    switch (nums[n]) {
+      case P_MOVE: path.moveTo(nums[n + 1], nums[n + 2]); n += 3; break;
+      case P_LINE: path.lineTo(nums[n + 1], nums[n + 2]); n += 3; break;
+      case P_CLOSE: path.closePath(); n += 1; break;
+      case P_POLY: {
+        const last = n + 2 + 2 * nums[n + 1];
+        path.moveTo(nums[n + 2], nums[n + 3]);
+        for (let i = n + 4; i < last; i += 2) path.lineTo(nums[i], nums[i + 1]);
+        n = last;
+        break;
+      }
+      case P_ELLIPSE: path.ellipse(...nums.subarray(n + 1, n + 8)); n += 8; break;
+      case P_RECT: path.rect(nums[n + 1], nums[n + 2], nums[n + 3], nums[n + 4]); n += 5; break;
+      case P_ROUND_RECT:
+        path.roundRect(nums[n + 1], nums[n + 2], nums[n + 3], nums[n + 4],
+                       Array.from(nums.subarray(n + 5, n + 9)));
+        n += 9;
+        break;
+      default:
+        throw new Error(`webkivy: bad path command ${nums[n]}`);
+    }
+  }
+  return path;
+}
+
+export function runDrawList(ctx, ops, nums, strs) {
+  const targets = [];
+  let n = 0;
+  for (let i = 0; i < ops.length; i++) {
+    const op = ops[i];
+    if (op >= LAYER_BEGIN && op <= LAYER_DROP) {
+      if (op === LAYER_BEGIN) {
+        targets.push(ctx);
+        ctx = beginLayer(nums[n], nums[n + 1], nums[n + 2], nums[n + 3], nums[n + 4]);
+        n += 5;
+      } else if (op === LAYER_END) {
+        ctx = targets.pop();
+      } else if (op === LAYER_DRAW) {
+        const layer = layers.get(nums[n]);
+        if (layer) ctx.drawImage(layer.canvas, nums[n + 1], nums[n + 2]);
+        n += 3;
+      } else {
+        layers.delete(nums[n]);
+        n += 1;
+      }
+      continue;
+    }
+    if (op === IMAGE_DRAW) {
+      const bitmap = images.get(nums[n]);
+      if (bitmap) ctx.drawImage(bitmap, nums[n + 1], nums[n + 2], nums[n + 3], nums[n + 4]);
+      n += 5;
+      continue;
+    }
+    if (op === IMAGE_DROP) {
+      const bitmap = images.get(nums[n]);
+      if (bitmap) bitmap.close();
+      images.delete(nums[n]);
+      n += 1;
+      continue;
+    }
+    if (op === ATLAS_PUT) {
+      atlasPut(strs[nums[n]], strs[nums[n + 1]], strs[nums[n + 2]],
+               nums[n + 3], nums[n + 4], nums[n + 5], nums[n + 6], nums[n + 7]);
+      n += 8;
+      continue;
+    }
+    if (op === ATLAS_DRAW) {
+      if (atlas) {
+        const w = nums[n + 2], h = nums[n + 3];
+        ctx.drawImage(atlas.canvas, nums[n], nums[n + 1], w, h, nums[n + 4], nums[n + 5], w, h);
+      }
+      n += 6;
+      continue;
+    }
+    if (op >= PATH_DEFINE) {
+      const id = nums[n];
+      if (op === PATH_DEFINE) {
+        const start = n + 2, end = start + nums[n + 1];
+        paths.set(id, definePath(nums, start, end));
+        n = end;
+        continue;
+      }
+      const path = paths.get(id);
+      if (op === PATH_FILL) { if (path) ctx.fill(path); }
+      else if (op === PATH_STROKE) { if (path) ctx.stroke(path); }
+      else paths.delete(id);
+      n += 1;
+      continue;
+    }
+    if (op >= STATE_BASE) {
+      const [prop, isString] = STATE[op - STATE_BASE];
+      const v = nums[n++];
+      ctx[prop] = isString ? strs[v] : v;
+      continue;
+    }
+    const [name, arity] = CALLS[op];
+    switch (arity) {
+      case 0: ctx[name](); break;
+      case 1: ctx[name](nums[n]); n += 1; break;
+      case 2: ctx[name](nums[n], nums[n + 1]); n += 2; break;
+      case -2: ctx[name](strs[nums[n]], nums[n + 1], nums[n + 2]); n += 3; break;
+      case 4: ctx[name](nums[n], nums[n + 1], nums[n + 2], nums[n + 3]); n += 4; break;
+      default: {
+        ctx[name](...nums.subarray(n, n + arity));
+        n += arity;
+      }
+    }
+  }
+}
+
+// Expose `webkivyFlush(ops, nums, strs)` for connector.DrawList and
+// `webkivyLoadImage(...)` / `webkivyLoadFont(...)` / `webkivySave(...)`
+// for connector.Canvas2DBackend
+export function installDrawList(getCtx, scope = globalThis) {
+  scope.webkivyFlush = (ops, nums, strs) => runDrawList(getCtx(), ops, nums, strs);
+  scope.webkivyLoadImage = loadImage;
+  scope.webkivyLoadFont = loadFont;
+  scope.webkivySave = saveText;
+}
@@ -0,0 +1,118 @@
+// input.js
+// ─────────────────────────────────────────────────────────────
+// File d'entrées compacte (Pointer Events : souris, stylet, doigts).
+// Les événements sont empilés côté JS ; Python récupère un seul lot
+// par frame (webkivyInput.take()).  Les déplacements d'un même
+// pointeur sont fusionnés jusqu'au prochain lot.  Format partagé
+// avec connector.InputBatch (à garder synchrone) : 7 float64 par
+// événement → kind, x, y, button, delta, key, pointer.
+// ─────────────────────────────────────────────────────────────
+
+export const KINDS = ['pointerdown', 'pointerup', 'pointermove', 'wheel', 'keydown', 'resize',
+                      'pointercancel'];
+export const POINTER_TYPES = ['mouse', 'pen', 'touch'];
+const NAMED_KEYS = ['Backspace', 'Enter', 'Tab', 'Escape', 'Delete', 'ArrowLeft',
+                    'ArrowRight', 'ArrowUp', 'ArrowDown', 'Home', 'End',
+                    'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8', 'F9', 'F10', 'F11', 'F12'];
+export const RECORD = 7;
+const [DOWN, UP, MOVE, WHEEL, KEY, RESIZE, CANCEL] = KINDS.keys();
+
+// Code point of a one-character key, -(index + 1) for named keys, else 0
+export function keyCode(key) {
+  if (key.length === 1) return key.codePointAt(0);
+  const i = NAMED_KEYS.indexOf(key);
+  return i < 0 ? 0 : -(i + 1);
+}
+
+export class InputBatch {
+  constructor(capacity = 64) {
+    this.buf = new Float64Array(capacity * RECORD);
+    this.length = 0;
+    this.moves = new Map();   // pointer id -> offset of its pending move
+    this.onwake = null;       // called when the queue stops being empty
+  }
+
+  push(kind, x = 0, y = 0, button = 0, delta = 0, key = 0, pointer = 0) {
+    let at = kind === MOVE ? this.moves.get(pointer) : undefined;
+    if (at === undefined) {
+      if (!this.length && this.onwake) this.onwake();
+      at = this.length * RECORD;
+      if (at + RECORD > this.buf.length) {
+        const grown = new Float64Array(this.buf.length * 2);
+        grown.set(this.buf);
+        this.buf = grown;
+      }
+      this.length++;
+      if (kind === MOVE) this.moves.set(pointer, at);
+      else if (kind === DOWN || kind === UP || kind === CANCEL) this.moves.delete(pointer);
+    }
+    const buf = this.buf;
+    buf[at] = kind; buf[at + 1] = x; buf[at + 2] = y; buf[at + 3] = button;
+    buf[at + 4] = delta; buf[at + 5] = key; buf[at + 6] = pointer;
+  }
+
+  // Queue the records of a batch taken elsewhere (worker side)
+  pushBuffer(buffer) {
+    const records = new Float64Array(buffer);
+    for (let i = 0; i < records.length; i += RECORD) {
+      this.push(...records.subarray(i, i + RECORD));
+    }
+  }
+
+  // Transferable ArrayBuffer with the queued records (null when empty)
+  take() {
+    if (!this.length) return null;
+    const out = this.buf.slice(0, this.length * RECORD).buffer;
+    this.length = 0;
+    this.moves.clear();
+    return out;
+  }
+}
+
+function listen(target, batch) {
+  const pointer = kind => e => batch.push(kind, e.clientX, e.clientY, e.button,
+                                          Math.max(0, POINTER_TYPES.indexOf(e.pointerType)),
+                                          0, e.pointerId);
+  target.addEventListener('pointerdown', pointer(DOWN));
+  target.addEventListener('pointerup', pointer(UP));
+  target.addEventListener('pointermove', pointer(MOVE));
+  target.addEventListener('pointercancel', pointer(CANCEL));
+  target.addEventListener('wheel', e => batch.push(WHEEL, e.clientX, e.clientY, 0,
+                                                   e.deltaY * (e.deltaMode === 1 ? 16 : 1)));
+  target.addEventListener('keydown', e => batch.push(KEY, 0, 0, 0, 0, keyCode(e.key)));
+  target.addEventListener('resize', () => batch.push(RESIZE, innerWidth, innerHeight));
+}
+
+// Main thread: queue events on `target`, polled by the connector each frame
+export function installInput(scope = globalThis, target = window) {
+  const batch = new InputBatch();
+  listen(target, batch);
+  scope.webkivyInput = batch;
+  return batch;
+}
+
+// Worker mode, page side: hand `send(buffer)` one batch per animation frame
+export function forwardInput(send, target = window) {
+  const batch = new InputBatch();
+  let scheduled = false;
+  batch.onwake = () => {
+    if (!scheduled) {
+      scheduled = true;
+      requestAnimationFrame(() => {
+        scheduled = false;
+        const buffer = batch.take();
+        if (buffer) send(buffer);
+      });
+    }
+  };
+  listen(target, batch);
+  return batch;
+}
+
+// Worker mode, worker side: the queue the connector polls, fed with the
+// page's batches (moves coalesce again if Python falls behind)
+export function receiveInput(scope = self) {
+  const batch = new InputBatch();
+  scope.webkivyInput = batch;
+  return buffer => batch.pushBuffer(buffer);
+}
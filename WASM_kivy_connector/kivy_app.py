@@ -10,22 +10,21 @@ from connector import (
     BoxLayout, GridLayout, Screen, ScreenManager,
     MDCard, MDToolbar, MDIconButton, MDRaisedButton,
     MDCheckbox, MDSlider, MDProgressBar, Rectangle,
-    run_kivy_app
+    Window, run_kivy_app
 )
-from js import window
 
 class MyKivyApp:
     def build(self):
         # --- Écran principal ---
         home = Screen(name='home')
         # Barre d’outils
-        toolbar = MDToolbar(x=0, y=0, size=(window.innerWidth, 50), title='Kivy-Web Demo')
+        toolbar = MDToolbar(x=0, y=0, size=(Window.width, 50), title='Kivy-Web Demo')
         home.add_widget(toolbar)
 
         # Conteneur principal
         content = BoxLayout(
             x=20, y=70,
-            size=(window.innerWidth-40, 200),
+            size=(Window.width-40, 200),
             orientation='vertical', spacing=10
         )
 
@@ -69,12 +68,12 @@ class MyKivyApp:
 
         # --- Écran Détails ---
         detail = Screen(name='detail')
-        toolbar2 = MDToolbar(x=0, y=0, size=(window.innerWidth, 50), title='Détails')
+        toolbar2 = MDToolbar(x=0, y=0, size=(Window.width, 50), title='Détails')
         detail.add_widget(toolbar2)
 
         # Grille de composants KivyMD
         grid = GridLayout(
-            x=20, y=70, size=(window.innerWidth-40, 200),
+            x=20, y=70, size=(Window.width-40, 200),
             cols=2
         )
 #        grid.add_widget(MDCard(x=0, y=0, size=(0,0), elevation=6))
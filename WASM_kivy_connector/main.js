@@ -10,40 +10,94 @@ if (location.protocol === 'file:') {
 
 // Import ES-module de Pyodide
 import { loadPyodide } from 'https://cdn.jsdelivr.net/pyodide/v0.26.0/full/pyodide.mjs';
+import { installDrawList, saveText } from './drawlist.js';
+import { forwardInput, installInput } from './input.js';
+import { installStore, mountCache } from './store.js';
+import { installHotReload } from './devreload.js';
+
+const FILES = ['connector.py', 'wire.py', 'kivy_app.py'];
+// ?dev : hot reload of the app sources (polls the local server)
+const DEV_MODE = new URLSearchParams(location.search).has('dev');
+const FLUSH_STORES = "import sys; sys.modules.get('connector') and sys.modules['connector'].flush_stores()";
+const t0 = performance.now();
+const marks = {};
 
 async function main() {
   try {
+    // Sources are fetched while Pyodide boots (no sequential round-trips)
+    const sources = Promise.all(FILES.map(f => fetch(f).then(r => r.text())));
+
     // 1) Initialiser Pyodide
     const pyodide = await loadPyodide({
       indexURL: 'https://cdn.jsdelivr.net/pyodide/v0.26.0/full/'
     });
+    marks.pyodide = performance.now() - t0;
 
-    // 2) Exposer le <canvas> côté Python
-    await pyodide.runPythonAsync(`
-import js
-canvas = js.document.getElementById("kivy-canvas")
-canvas.width  = js.window.innerWidth
-canvas.height = js.window.innerHeight
-ctx = canvas.getContext("2d")
-`);
-
-    // 3) (optionnel) charger micropip pour installer d’autres wheels Pyodide
-    await pyodide.loadPackage('micropip')
+    // 2) Interpréteur du draw-list (un seul appel JS par frame)
+    const canvasEl = document.getElementById('kivy-canvas');
+    installDrawList(() => canvasEl.getContext('2d'));
+    // File d'entrées (Pointer Events), lue une fois par frame par Python
+    installInput();
+    // JsonStore / DictStore persistants (IndexedDB)
+    installStore();
+    // Appelé par connector.py après la première frame dessinée
+    globalThis.webkivyFirstFrame = () => {
+      marks.first_frame = performance.now() - t0;
+      globalThis.webkivyTTFF = marks;
+      console.log(`webkivy: first frame after ${marks.first_frame.toFixed(0)} ms`, marks);
+    };
 
-    // 4) Charger le connecteur Kivy-Lite et votre application
-    await pyodide.runPythonAsync(await (await fetch('connector.py')).text())
-      // Enregistrer le code exécuté comme module "connector"
+    // 3) Écrire les sources dans le FS Pyodide puis importer le connecteur
+    //    comme un vrai module (plus d'exécution dans __main__ + copie)
+    //    (pour un bundle hors-ligne : python -m webkivy bundle kivy_app.py)
+    const files = await sources;
+    await mountCache(pyodide);   // compiled KV rules (IndexedDB)
+    pyodide.FS.mkdirTree('/webkivy');
+    FILES.forEach((name, i) => pyodide.FS.writeFile(`/webkivy/${name}`, files[i]));
     await pyodide.runPythonAsync(`
-import types, sys, __main__
-connector = types.ModuleType('connector')
-connector.__dict__.update(__main__.__dict__)
-sys.modules['connector'] = connector
-  `)
-    await pyodide.runPythonAsync(await (await fetch('kivy_app.py')).text())
+import sys, runpy
+sys.path.insert(0, '/webkivy')
+import connector
+runpy.run_module('kivy_app', run_name='__main__', alter_sys=True)
+`);
+    if (DEV_MODE) installHotReload(pyodide, FILES);
+    // Pending JsonStore writes go out before the page may be discarded
+    addEventListener('visibilitychange', () => {
+      if (document.visibilityState === 'hidden') {
+        pyodide.runPython(FLUSH_STORES);
+      }
+    });
 
   } catch (err) {
     console.error('Erreur Pyodide :', err)
   }
 }
 
-main();
+// Mode Web Worker (?worker) : Python hors du thread principal
+function startWorker() {
+  const canvasEl = document.getElementById('kivy-canvas');
+  const offscreen = canvasEl.transferControlToOffscreen();
+  const worker = new Worker(new URL('./worker.js', import.meta.url), { type: 'module' });
+  worker.onmessage = (e) => {
+    if (e.data.type === 'first_frame') {
+      marks.first_frame = performance.now() - t0;
+      globalThis.webkivyTTFF = marks;
+      console.log(`webkivy (worker): first frame after ${marks.first_frame.toFixed(0)} ms`, marks);
+    } else if (e.data.type === 'save') {
+      saveText(e.data.name, e.data.text);   // profiler trace...
+    } else if (e.data.type === 'reload') {
+      location.reload();                    // dev mode: connector.py changed
+    }
+  };
+  worker.postMessage({ type: 'init', canvas: offscreen, width: innerWidth,
+                       height: innerHeight, files: FILES, dev: DEV_MODE }, [offscreen]);
+  forwardInput(buf => worker.postMessage({ type: 'input', buf }, [buf]));
+  addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') worker.postMessage({ type: 'flush' });
+  });
+}
+
+const WORKER_MODE = new URLSearchParams(location.search).has('worker')
+  && 'transferControlToOffscreen' in HTMLCanvasElement.prototype;
+if (WORKER_MODE) startWorker();
+else main();
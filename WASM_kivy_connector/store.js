@@ -0,0 +1,80 @@
+// store.js
+// ─────────────────────────────────────────────────────────────
+// Stockage persistant côté navigateur : un object store IndexedDB
+// pour connector.JsonStore / DictStore (une transaction par flush,
+// les écritures sont regroupées côté Python) et un répertoire IDBFS
+// pour le cache des règles KV compilées.
+// ─────────────────────────────────────────────────────────────
+
+// Entries keyed [store name, key], values kept as JSON text
+let storeDB = null;
+function openStoreDB() {
+  if (!storeDB) {
+    storeDB = new Promise((resolve, reject) => {
+      const req = indexedDB.open('webkivy-store', 1);
+      req.onupgradeneeded = () => req.result.createObjectStore('entries');
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+  return storeDB;
+}
+const storeRange = name => IDBKeyRange.bound([name], [name, []]);
+const request = req => new Promise((resolve, reject) => {
+  req.onsuccess = () => resolve(req.result);
+  req.onerror = () => reject(req.error);
+});
+
+// done(JSON text of [[key, value text], ...]), '' on failure
+export async function storeLoad(name, done) {
+  try {
+    const db = await openStoreDB();
+    const store = db.transaction('entries').objectStore('entries');
+    const range = storeRange(name);
+    const [keys, values] = await Promise.all([request(store.getAllKeys(range)),
+                                              request(store.getAll(range))]);
+    done(JSON.stringify(keys.map((key, i) => [key[1], values[i]])));
+  } catch (err) {
+    console.warn('webkivy: store', name, err);
+    done('');
+  }
+}
+
+// One transaction per flush: puts = JSON {key: value text}, deletes = JSON [key]
+export async function storeWrite(name, puts, deletes, clear) {
+  const db = await openStoreDB();
+  const tx = db.transaction('entries', 'readwrite');
+  const store = tx.objectStore('entries');
+  if (clear) store.delete(storeRange(name));
+  for (const [key, text] of Object.entries(JSON.parse(puts))) store.put(text, [name, key]);
+  for (const key of JSON.parse(deletes)) store.delete([name, key]);
+  tx.onerror = () => console.warn('webkivy: store write', name, tx.error);
+}
+
+// Expose `webkivyStoreLoad(...)` / `webkivyStoreWrite(...)` for
+// connector.Canvas2DBackend.storage() (page or worker)
+export function installStore(scope = globalThis) {
+  if (!scope.indexedDB) return;   // the connector falls back to localStorage
+  scope.webkivyStoreLoad = storeLoad;
+  scope.webkivyStoreWrite = storeWrite;
+}
+
+// Persistent cache directory for connector.Backend.cache_dir() (compiled
+// KV rules): IDBFS, restored from IndexedDB before the app runs.  Writes
+// are flushed back (debounced) when the connector calls webkivySyncCache().
+export async function mountCache(pyodide, scope = globalThis, dir = '/webkivy-cache') {
+  try {
+    const FS = pyodide.FS;
+    FS.mkdirTree(dir);
+    FS.mount(FS.filesystems.IDBFS, {}, dir);
+    await new Promise((resolve, reject) => FS.syncfs(true, err => err ? reject(err) : resolve()));
+    let timer = null;
+    scope.webkivyCacheDir = dir;
+    scope.webkivySyncCache = () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => FS.syncfs(false, err => err && console.warn('webkivy: cache', err)), 500);
+    };
+  } catch (err) {
+    console.warn('webkivy: no persistent cache', err);   // private mode, file://...
+  }
+}
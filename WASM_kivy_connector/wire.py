@@ -0,0 +1,334 @@
+# wire.py
+"""
+Wire format of the WebSocket bridge, shared by ``connector.Bridge``
+(Pyodide or CPython) and the reference server (``webkivy/server.py``).
+
+* ``dumps`` / ``loads``: compact tagged binary encoding of None, bools,
+  ints, floats, str, bytes, lists and dicts (small ints, short strings
+  and short containers take a single tag byte).
+* ``diff`` / ``patch``: state deltas as a list of ``[path, value]``
+  (set) and ``[path]`` (delete) operations; lists are replaced whole.
+* Messages are lists ``[kind, ...]``; one WebSocket message carries a
+  batch (list) of them.
+* ``ws_frame`` / ``FrameReader``: minimal RFC 6455 framing, for the
+  headless client and the asyncio server (the browser has its own).
+
+Pure standard library, no dependency.
+"""
+import base64, hashlib, os, struct
+
+# ------------------------------------------------------------
+#  Encodage binaire
+# ------------------------------------------------------------
+NIL, FALSE, TRUE, INT, F32, F64, STR, BYTES, LIST, DICT = range(10)
+_FIXINT, _FIXSTR, _FIXLIST, _FIXDICT = 0x80, 0xC0, 0xE0, 0xF0
+_f32, _f64 = struct.Struct('<f'), struct.Struct('<d')
+
+def _varint(n, out):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _dump(obj, out):
+    kind = type(obj)
+    if obj is None:
+        out.append(NIL)
+    elif kind is bool:
+        out.append(TRUE if obj else FALSE)
+    elif kind is int:
+        if 0 <= obj < 64:
+            out.append(_FIXINT | obj)
+        else:
+            out.append(INT)
+            _varint(obj << 1 if obj >= 0 else (-obj << 1) - 1, out)   # zigzag
+    elif kind is float:
+        packed = _f32.pack(obj) if abs(obj) < 3.4e38 else None
+        if packed is not None and _f32.unpack(packed)[0] == obj:
+            out.append(F32)
+            out += packed
+        else:
+            out.append(F64)
+            out += _f64.pack(obj)
+    elif kind is str:
+        data = obj.encode('utf-8')
+        if len(data) < 32:
+            out.append(_FIXSTR | len(data))
+        else:
+            out.append(STR)
+            _varint(len(data), out)
+        out += data
+    elif kind is list or kind is tuple:
+        if len(obj) < 16:
+            out.append(_FIXLIST | len(obj))
+        else:
+            out.append(LIST)
+            _varint(len(obj), out)
+        for item in obj:
+            _dump(item, out)
+    elif kind is dict:
+        if len(obj) < 16:
+            out.append(_FIXDICT | len(obj))
+        else:
+            out.append(DICT)
+            _varint(len(obj), out)
+        for key, value in obj.items():
+            _dump(key, out)
+            _dump(value, out)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        out.append(BYTES)
+        _varint(len(data), out)
+        out += data
+    elif isinstance(obj, int):
+        _dump(int(obj), out)
+    elif isinstance(obj, float):
+        _dump(float(obj), out)
+    elif isinstance(obj, str):
+        _dump(str(obj), out)
+    elif isinstance(obj, (list, tuple)):
+        _dump(list(obj), out)
+    elif isinstance(obj, dict):
+        _dump(dict(obj), out)
+    else:
+        raise TypeError(f'cannot encode {kind.__name__} on the wire')
+
+def dumps(obj):
+    """Encode ``obj`` (tuples come back as lists)."""
+    out = bytearray()
+    _dump(obj, out)
+    return bytes(out)
+
+class _Reader:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data):
+        self.data, self.pos = data, 0
+
+    def varint(self):
+        data, pos = self.data, self.pos
+        n = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return n
+            shift += 7
+
+    def take(self, size):
+        start = self.pos
+        end = self.pos = start + size
+        if end > len(self.data):
+            raise ValueError('truncated message')
+        return self.data[start:end]
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag >= _FIXDICT:
+            return self.mapping(tag - _FIXDICT)
+        if tag >= _FIXLIST:
+            return [self.value() for _ in range(tag - _FIXLIST)]
+        if tag >= _FIXSTR:
+            return str(self.take(tag - _FIXSTR), 'utf-8')
+        if tag >= _FIXINT:
+            return tag - _FIXINT
+        if tag == NIL:
+            return None
+        if tag == FALSE:
+            return False
+        if tag == TRUE:
+            return True
+        if tag == INT:
+            n = self.varint()
+            return -((n + 1) >> 1) if n & 1 else n >> 1
+        if tag == F32:
+            return _f32.unpack(self.take(4))[0]
+        if tag == F64:
+            return _f64.unpack(self.take(8))[0]
+        if tag == STR:
+            return str(self.take(self.varint()), 'utf-8')
+        if tag == BYTES:
+            return bytes(self.take(self.varint()))
+        if tag == LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == DICT:
+            return self.mapping(self.varint())
+        raise ValueError(f'unknown tag 0x{tag:02x}')
+
+    def mapping(self, count):
+        result = {}
+        for _ in range(count):
+            key = self.value()
+            result[key] = self.value()
+        return result
+
+def loads(data):
+    """Decode one value encoded by ``dumps``."""
+    reader = _Reader(memoryview(data) if not isinstance(data, bytes) else data)
+    try:
+        value = reader.value()
+    except IndexError:
+        raise ValueError('truncated message') from None
+    if reader.pos != len(reader.data):
+        raise ValueError('trailing bytes after message')
+    return value
+
+# ------------------------------------------------------------
+#  Deltas d'état
+# ------------------------------------------------------------
+def _same(a, b):
+    return a is b or (type(a) is type(b) and a == b)
+
+def _diff(old, new, path, ops):
+    for key, value in new.items():
+        if key not in old:
+            ops.append([path + [key], value])
+        elif not _same(old[key], value):
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                _diff(old[key], value, path + [key], ops)
+            else:
+                ops.append([path + [key], value])
+    for key in old:
+        if key not in new:
+            ops.append([path + [key]])
+
+def diff(old, new):
+    """Operations turning dict ``old`` into dict ``new`` (empty if equal)."""
+    ops = []
+    _diff(old, new, [], ops)
+    return ops
+
+def patch(state, ops):
+    """Apply ``ops`` to dict ``state`` in place; returns the top-level keys changed."""
+    changed = set()
+    for op in ops:
+        path = op[0]
+        if not path:
+            continue
+        target = state
+        for key in path[:-1]:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            target = child
+        key = path[-1]
+        if len(op) == 1:
+            if key not in target:
+                continue
+            del target[key]
+        elif key in target and _same(target[key], op[1]):
+            continue
+        else:
+            target[key] = op[1]
+        changed.add(path[0])
+    return changed
+
+# ------------------------------------------------------------
+#  Messages (une liste par message, un lot par message WebSocket)
+# ------------------------------------------------------------
+CALL = 1      # [CALL, id, method, args]        client -> server
+RESULT = 2    # [RESULT, id, value]             server -> client
+ERROR = 3     # [ERROR, id, message]            server -> client
+SUB = 4       # [SUB, topic]                    client -> server
+UNSUB = 5     # [UNSUB, topic]                  client -> server
+PUB = 6       # [PUB, topic, value]             both ways
+STATE = 7     # [STATE, topic, version, data]   server -> client (snapshot)
+DELTA = 8     # [DELTA, topic, version, ops]    server -> client
+SET = 9       # [SET, topic, ops]               client -> server
+
+def pack_batch(messages):
+    return dumps(messages)
+
+def unpack_batch(data):
+    batch = loads(data)
+    if not isinstance(batch, list) or not all(isinstance(m, list) and m for m in batch):
+        raise ValueError('malformed batch')
+    return batch
+
+# ------------------------------------------------------------
+#  Trames WebSocket (RFC 6455), client headless et serveur
+# ------------------------------------------------------------
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0, 1, 2, 8, 9, 10
+_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def ws_key():
+    return base64.b64encode(os.urandom(16)).decode('ascii')
+
+def ws_accept(key):
+    """``Sec-WebSocket-Accept`` value for the client's ``key``."""
+    return base64.b64encode(hashlib.sha1(key.encode('ascii') + _GUID).digest()).decode('ascii')
+
+def _mask(payload, key):
+    n = len(payload)
+    if not n:
+        return b''
+    stream = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(stream, 'little')).to_bytes(n, 'little')
+
+def ws_frame(payload, opcode=OP_BINARY, mask=False):
+    """One final frame; clients must mask, servers must not."""
+    n = len(payload)
+    head = bytearray((0x80 | opcode,))
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head.append(bit | n)
+    elif n < 1 << 16:
+        head.append(bit | 126)
+        head += struct.pack('>H', n)
+    else:
+        head.append(bit | 127)
+        head += struct.pack('>Q', n)
+    if mask:
+        key = os.urandom(4)
+        return bytes(head) + key + _mask(bytes(payload), key)
+    return bytes(head) + bytes(payload)
+
+class FrameReader:
+    """
+    Incremental frame parser: ``feed(data)`` returns the complete
+    ``(opcode, payload)`` messages, fragments reassembled and unmasked.
+    """
+    def __init__(self, max_size=16 << 20):
+        self.max_size = max_size
+        self._buf = bytearray()
+        self._parts = []
+        self._opcode = None
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        messages = []
+        while len(buf) >= 2:
+            fin, opcode = buf[0] & 0x80, buf[0] & 0x0F
+            masked, n = buf[1] & 0x80, buf[1] & 0x7F
+            pos = 2
+            if n == 126:
+                if len(buf) < 4:
+                    break
+                n, pos = struct.unpack_from('>H', buf, 2)[0], 4
+            elif n == 127:
+                if len(buf) < 10:
+                    break
+                n, pos = struct.unpack_from('>Q', buf, 2)[0], 10
+            if n > self.max_size:
+                raise ValueError('frame too large')
+            end = pos + (4 if masked else 0) + n
+            if len(buf) < end:
+                break
+            payload = bytes(buf[end - n:end])
+            if masked:
+                payload = _mask(payload, bytes(buf[pos:pos + 4]))
+            del buf[:end]
+            if opcode >= OP_CLOSE:            # control frames are never fragmented
+                messages.append((opcode, payload))
+                continue
+            if opcode != OP_CONT:
+                self._opcode, self._parts = opcode, []
+            self._parts.append(payload)
+            if fin:
+                messages.append((self._opcode, b''.join(self._parts)))
+                self._parts = []
+        return messages
@@ -0,0 +1,59 @@
+// worker.js
+// ─────────────────────────────────────────────────────────────
+// Mode Web Worker (ouvrir la page avec ?worker) : Pyodide, le
+// connecteur et l'application tournent ici, hors du thread
+// principal.  La page transfère le <canvas> en OffscreenCanvas et
+// envoie les entrées en lots (input.js), fusionnés ici dans la file
+// que le connecteur lit à chaque frame ; le rendu réutilise
+// l'interpréteur du draw-list.
+// ─────────────────────────────────────────────────────────────
+import { loadPyodide } from 'https://cdn.jsdelivr.net/pyodide/v0.26.0/full/pyodide.mjs';
+import { installDrawList } from './drawlist.js';
+import { receiveInput } from './input.js';
+import { installStore, mountCache } from './store.js';
+import { installHotReload } from './devreload.js';
+
+// Batches arriving before the app runs simply wait in the queue
+const receive = receiveInput(self);
+let pyodide = null;
+const FLUSH_STORES = "import sys; sys.modules.get('connector') and sys.modules['connector'].flush_stores()";
+
+self.onmessage = async (e) => {
+  const msg = e.data;
+  if (msg.type === 'input') {
+    receive(msg.buf);
+  } else if (msg.type === 'flush') {
+    // Page hidden: write the pending JsonStore changes
+    pyodide?.runPython(FLUSH_STORES);
+  } else if (msg.type === 'init') {
+    try {
+      await start(msg);
+    } catch (err) {
+      console.error('webkivy worker:', err);
+    }
+  }
+};
+
+async function start({ canvas, width, height, files, dev }) {
+  const sources = Promise.all(files.map(f => fetch(f).then(r => r.text())));
+  pyodide = await loadPyodide({
+    indexURL: 'https://cdn.jsdelivr.net/pyodide/v0.26.0/full/'
+  });
+  installDrawList(() => canvas.getContext('2d'), self);
+  installStore(self);
+  self.webkivyCanvas = canvas;
+  self.webkivyFirstFrame = () => self.postMessage({ type: 'first_frame' });
+
+  const texts = await sources;
+  await mountCache(pyodide, self);
+  pyodide.FS.mkdirTree('/webkivy');
+  files.forEach((name, i) => pyodide.FS.writeFile(`/webkivy/${name}`, texts[i]));
+  await pyodide.runPythonAsync(`
+import sys, runpy, js
+sys.path.insert(0, '/webkivy')
+import connector
+connector.set_backend(connector.WorkerBackend(js.webkivyCanvas, ${width}, ${height}))
+runpy.run_module('kivy_app', run_name='__main__', alter_sys=True)
+`);
+  if (dev) installHotReload(pyodide, files);
+}
@@ -0,0 +1,32 @@
+# conftest.py
+# Headless tests: connector.py on plain CPython, with the RecordingBackend
+import sys, types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / 'WASM_kivy_connector'), str(ROOT)]
+
+import connector
+
+
+@pytest.fixture
+def backend():
+    """A fresh RecordingBackend; the app it ran is stopped afterwards."""
+    backend = connector.set_backend(connector.RecordingBackend(400, 300))
+    yield backend
+    connector.stop_kivy_app()
+
+
+@pytest.fixture
+def run_app(backend, monkeypatch):
+    """``run_app(build)``: run an app whose ``build()`` is ``build``, first frames drawn."""
+    def run(build):
+        module = types.ModuleType('webkivy_test_app')
+        module.TestApp = type('TestApp', (), {'build': lambda self: build()})
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+        app = connector.run_kivy_app(module.__name__, 'TestApp', backend=backend)
+        backend.run_until_idle()
+        return app
+    return run
@@ -0,0 +1,29 @@
+# test_animation.py
+# Animation: batched tweens, stop_property, on_complete
+from connector import Animation, Label
+
+
+def test_animation_reaches_its_targets(backend, run_app):
+    label = run_app(lambda: Label(text='move')).root
+    done = []
+    anim = Animation(x=40, opacity=0, d=0.2)
+    anim.bind(on_complete=lambda animation, widget: done.append(widget))
+    anim.start(label)
+    backend.run_until_idle()
+    assert done == [label]
+    assert label.x == 40 and label.opacity == 0
+    assert anim not in Animation._instances
+
+
+def test_animation_stop_property_completes_the_run(backend, run_app):
+    label = run_app(lambda: Label(text='move')).root
+    done = []
+    anim = Animation(x=10, y=20, d=0.5)
+    anim.bind(on_complete=lambda animation, widget: done.append(widget))
+    anim.start(label)
+    backend.step()
+    anim.stop_property(label, 'x')
+    backend.run_until_idle()
+    assert done == [label]
+    assert label.y == 20 and label.x != 10
+    assert anim not in Animation._instances
@@ -0,0 +1,118 @@
+# test_bridge.py
+# wire encoding and framing, Bridge batching and teardown (socket faked)
+import pytest
+
+import connector
+import wire
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 7, -1, 127, 128, -(1 << 40), 1 << 70, 0.5, 1e300, float('inf'),
+    '', 'é' * 40, 'x' * 1000, b'\x00\xff', [], [1, [2, [3]]], {}, {'a': {'b': [None, 1.5]}},
+    list(range(300)), {str(i): i for i in range(40)},
+])
+def test_dumps_loads_round_trip(value):
+    assert wire.loads(wire.dumps(value)) == value
+
+
+def test_small_values_take_one_byte():
+    assert len(wire.dumps(5)) == 1
+    assert len(wire.dumps('ab')) == 3
+    assert len(wire.dumps([])) == 1
+
+
+def test_diff_patch():
+    old = {'alice': 1, 'bob': 2, 'meta': {'round': 1, 'max': 9}, 'list': [1]}
+    new = {'alice': 1, 'carol': 3, 'meta': {'round': 2, 'max': 9}, 'list': [1, 2]}
+    ops = wire.diff(old, new)
+    assert sorted(map(str, ops)) == sorted(map(str, [
+        [['carol'], 3], [['meta', 'round'], 2], [['list'], [1, 2]], [['bob']]]))
+    state = {'alice': 1, 'bob': 2, 'meta': {'round': 1, 'max': 9}, 'list': [1]}
+    assert wire.patch(state, ops) == {'carol', 'meta', 'list', 'bob'}
+    assert state == new
+    assert wire.diff(new, new) == []
+    assert wire.patch(state, ops) == set()   # already applied
+
+
+def test_batch_and_frames():
+    batch = [[wire.CALL, 1, 'add', [2, 3]], [wire.SUB, 'scores']]
+    data = wire.pack_batch(batch)
+    assert wire.unpack_batch(data) == batch
+    with pytest.raises(ValueError):
+        wire.unpack_batch(wire.dumps([1, 2]))
+    big = bytes(range(256)) * 300
+    stream = wire.ws_frame(data, mask=True) + wire.ws_frame(big)
+    reader = wire.FrameReader()
+    messages = reader.feed(stream[:5]) + reader.feed(stream[5:])
+    assert messages == [(wire.OP_BINARY, data), (wire.OP_BINARY, big)]
+    assert wire.ws_accept('dGhlIHNhbXBsZSBub25jZQ==') == 's3pPLMBiTxaQ9kYGzzhZRbK+xOo='
+
+
+class FakeSocket:
+    def __init__(self, url, on_open, on_message, on_close):
+        self.on_open, self.on_message, self.on_close = on_open, on_message, on_close
+        self.sent, self.closed = [], False
+
+    def send(self, data):
+        self.sent.append(wire.unpack_batch(data))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def sockets(backend, monkeypatch):
+    opened = []
+    def open_socket(*args):
+        opened.append(FakeSocket(*args))
+        return opened[-1]
+    monkeypatch.setattr(backend, 'open_socket', open_socket)
+    return opened
+
+
+def test_bridge_batches_a_frame(backend, sockets):
+    bridge = connector.connect('ws://test/')
+    sockets[0].on_open()
+    results = []
+    bridge.call('add', 2, 3, callback=results.append)
+    bridge.publish('chat', 'hi')
+    assert sockets[0].sent == []   # sent from a zero-delay timer
+    backend.step()
+    assert sockets[0].sent == [[[wire.CALL, 1, 'add', [2, 3]], [wire.PUB, 'chat', 'hi']]]
+    sockets[0].on_message(wire.pack_batch([[wire.RESULT, 1, 5]]))
+    assert results == [5]
+    bridge.close()
+
+
+def test_bridge_reconnects_and_resubscribes(backend, sockets):
+    bridge = connector.connect('ws://test/', backoff=0.1)
+    sockets[0].on_open()
+    bridge.subscribe('news', lambda topic, value: None)
+    backend.step()
+    sockets[0].on_close()
+    assert not bridge.connected and len(sockets) == 1
+    backend.step(200)   # past the backoff
+    assert len(sockets) == 2
+    sockets[1].on_open()
+    assert sockets[1].sent == [[[wire.SUB, 'news']]]
+    bridge.close()
+
+
+def test_stop_kivy_app_closes_bridges(backend, sockets, run_app):
+    got, lost = [], []
+    def build():
+        bridge = connector.connect('ws://test/')
+        bridge.subscribe('news', lambda topic, value: got.append(value))
+        bridge.call('slow', errback=lost.append)
+        return connector.Label(text='bridge')
+    run_app(build)
+    socket = sockets[0]
+    socket.on_open()
+    backend.step()
+    connector.stop_kivy_app()
+    assert socket.closed
+    socket.on_message(wire.pack_batch([[wire.PUB, 'news', 1]]))
+    socket.on_close()
+    for _ in range(10):
+        backend.step(1000)
+    assert got == [] and lost == [] and len(sockets) == 1   # silent, no reconnect
@@ -0,0 +1,101 @@
+# test_image.py
+# Image + IMAGE_CACHE against a local static file server (RecordingBackend base_url)
+import functools, struct, threading, zlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import connector
+from connector import BoxLayout, Image, IMAGE_CACHE
+
+
+def png(width, height):
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+    rows = b''.join(b'\x00' + b'\x80' * (width * 3) for _ in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    for name in ('a.png', 'b.png', 'c.png'):
+        (tmp_path / name).write_bytes(png(64, 32))
+    handler = functools.partial(QuietHandler, directory=str(tmp_path))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}/'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def backend(server):
+    IMAGE_CACHE.clear()
+    backend = connector.set_backend(connector.RecordingBackend(400, 300, base_url=server))
+    yield backend
+    connector.stop_kivy_app()
+    IMAGE_CACHE.clear()
+    IMAGE_CACHE.set_budget(64 << 20)
+
+
+def images(*sources, size=(100, 100), **kwargs):
+    root = BoxLayout(orientation='vertical')
+    for source in sources:
+        root.add_widget(Image(source=source, size=size, size_hint=(None, None), **kwargs))
+    return root
+
+
+def test_placeholder_then_one_shared_decode(backend, run_app):
+    root = run_app(lambda: images('a.png', 'a.png')).root
+    first, last = backend.frames[0], backend.last_frame
+    assert not [op for op in first if op[0] == 'draw_image']
+    assert len([op for op in first if op[0] == 'fillRect']) >= 2   # gray placeholders
+    blits = [op for op in last if op[0] == 'draw_image']
+    assert len(blits) == 2 and blits[0][1] == blits[1][1]   # one bitmap id
+    stats = IMAGE_CACHE.stats()
+    assert stats['loads'] == 1 and stats['images'] == 1 and stats['bytes'] == 64 * 32 * 4
+    assert [child.texture_size for child in root.children] == [[64, 32], [64, 32]]
+    assert list(backend.images.values()) == [('a.png', 64, 32)]   # fetched from the server
+
+
+def test_lru_eviction_under_budget(backend, run_app):
+    root = run_app(lambda: images('a.png', 'b.png', 'c.png', size=(50, 50))).root
+    assert IMAGE_CACHE.stats()['images'] == 3
+    ids = {key[0]: entry.id for key, entry in IMAGE_CACHE.entries.items()}
+    a, b, c = root.children
+    root.remove_widget(a)
+    root.remove_widget(c)
+    backend.run_until_idle()
+    IMAGE_CACHE.set_budget(2 * 64 * 32 * 4)   # room for two: the LRU one goes
+    connector.mark_dirty()
+    backend.run_until_idle()
+    assert IMAGE_CACHE.stats()['evictions'] == 1
+    assert sorted(key[0] for key in IMAGE_CACHE.entries) == ['b.png', 'c.png']
+    assert ids['a.png'] not in backend.images
+
+    IMAGE_CACHE.set_budget(1)   # b is on screen: kept even over budget
+    assert [key[0] for key in IMAGE_CACHE.entries] == ['b.png']
+
+
+@pytest.mark.parametrize('size, options, expected', [
+    ((200, 200), {}, (64, 32)),
+    ((40, 40), {}, (40, 20)),
+    ((200, 200), {'allow_stretch': True}, (200, 100)),
+    ((200, 50), {'allow_stretch': True}, (100, 50)),
+    ((200, 200), {'allow_stretch': True, 'keep_ratio': False}, (200, 200)),
+])
+def test_norm_image_size(backend, run_app, size, options, expected):
+    root = run_app(lambda: images('a.png', size=size, **options)).root
+    image = root.children[0]
+    assert image.texture_size == [64, 32]
+    assert image.norm_image_size == pytest.approx(expected)
+    blit = [op for op in backend.last_frame if op[0] == 'draw_image'][0]
+    assert blit[4:6] == pytest.approx(expected)
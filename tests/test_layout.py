@@ -0,0 +1,49 @@
+# test_layout.py
+# Layout pass: BoxLayout / GridLayout arrangement
+import connector
+from connector import BoxLayout, GridLayout, Label
+
+
+def test_boxlayout_shares_space_by_hint(backend, run_app):
+    def build():
+        root = BoxLayout(orientation='horizontal', spacing=10, padding=5)
+        root.add_widget(Label(text='a', size_hint_x=1))
+        root.add_widget(Label(text='b', size_hint_x=3))
+        root.add_widget(Label(text='c', size_hint_x=None, size=(50, 20)))
+        return root
+    a, b, c = run_app(build).root.children
+    # 400 wide: 2 * 5 padding, 2 * 10 spacing, 50 fixed -> 320 shared 1:3
+    assert (a.x, a.size[0]) == (5, 80)
+    assert (b.x, b.size[0]) == (95, 240)
+    assert (c.x, c.size[0]) == (345, 50)
+    assert a.size[1] == 290
+
+
+def test_gridlayout_has_no_default_spacing(backend, run_app):
+    def build():
+        root = GridLayout(cols=2)
+        for i in range(4):
+            root.add_widget(Label(text=str(i)))
+        return root
+    root = run_app(build).root
+    assert root.spacing == 0
+    assert [(c.x, c.y, tuple(c.size)) for c in root.children] == [
+        (0, 0, (200, 150)), (200, 0, (200, 150)), (0, 150, (200, 150)), (200, 150, (200, 150))]
+
+
+def test_gridlayout_auto_grows_in_one_pass(backend, run_app, monkeypatch):
+    grid = GridLayout(cols=3, row_default_height=40, size_hint_y=None, size=(300, 0))
+    for i in range(5):
+        grid.add_widget(Label(text=str(i)))
+    def build():
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(grid)
+        return root
+    layouts = []
+    arrange = GridLayout._arrange
+    monkeypatch.setattr(GridLayout, '_arrange',
+                        lambda self, children: (layouts.append(self), arrange(self, children)))
+    run_app(build)
+    assert grid.size[1] == grid.minimum_height == 80
+    assert layouts.count(grid) == 1
+    assert not grid._layout_pending and grid not in connector._LAYOUT_QUEUE
@@ -0,0 +1,64 @@
+# test_recording.py
+# RecordingBackend: op log, step(), synthetic events, virtual-time Clock
+from connector import BoxLayout, Button, Clock, Label, FRAME_STATS
+
+
+def test_first_frame_is_recorded(backend, run_app):
+    run_app(lambda: Label(text='hello'))
+    texts = [op[1] for op in backend.last_frame if op[0] == 'fillText']
+    assert 'hello' in texts
+    assert backend.op_counts['fillText'] >= 1
+    assert backend.stats()['frames'] == len(backend.frames) >= 1
+    assert backend.first_frame_ms is not None
+    assert not backend.errors
+
+
+def test_step_runs_frames_only_when_requested(backend, run_app):
+    label = run_app(lambda: Label(text='a')).root
+    rendered, frames = FRAME_STATS['rendered'], len(backend.frames)
+    assert backend.step() is False   # idle: no frame requested
+    assert backend.run_until_idle() == 0
+    assert FRAME_STATS['rendered'] == rendered and len(backend.frames) == frames
+
+    time_ms = backend.time_ms
+    label.text = 'b'
+    assert backend.step(10) is True
+    assert backend.time_ms == time_ms + 10
+    assert FRAME_STATS['rendered'] == rendered + 1
+    assert 'b' in [op[1] for op in backend.last_frame if op[0] == 'fillText']
+
+
+def test_click_and_resize(backend, run_app):
+    pressed = []
+    def build():
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(Button(text='ok', on_press=lambda *args: pressed.append(1)))
+        return root
+    root = run_app(build).root
+    backend.click(200, 15)   # first row, DOM coordinates
+    backend.run_until_idle()
+    assert pressed == [1]
+
+    backend.resize(640, 480)
+    backend.run_until_idle()
+    assert tuple(root.size) == (640, 480)
+    evt = backend.dispatch('keydown', key='a')
+    assert evt.key == 'a'
+
+
+def test_clock_runs_on_virtual_time(backend, run_app):
+    run_app(lambda: Label(text='clock'))
+    fired, ticks = [], []
+    Clock.schedule_once(lambda dt: fired.append(backend.time_ms), 0.5)
+    event = Clock.schedule_interval(lambda dt: ticks.append(dt), 0.1)
+    start = backend.time_ms
+    backend.run_until_idle()   # the loop sleeps until the next deadline
+    while backend.time_ms - start < 1000:
+        backend.step()
+    assert len(fired) == 1 and fired[0] - start >= 500
+    assert 9 <= len(ticks) <= 10
+    Clock.unschedule(event)
+    count = len(ticks)
+    for _ in range(20):
+        backend.step()
+    assert len(ticks) == count
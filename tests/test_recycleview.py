@@ -0,0 +1,24 @@
+# test_recycleview.py
+# RecycleView: only the visible rows are built, viewclass looked up by name
+import pytest
+
+from connector import Factory, FactoryException, Label, RecycleView
+
+
+class FactoryRow(Label):
+    pass
+
+
+def test_recycleview_resolves_viewclass_by_name(backend, run_app):
+    rv = RecycleView(viewclass='FactoryRow', data=[{'text': f'row {i}'} for i in range(500)])
+    run_app(lambda: rv)
+    assert Factory.get('FactoryRow') is FactoryRow
+    rows = [child for child in rv.children if isinstance(child, FactoryRow)]
+    assert rows and len(rows) < 500   # only the visible rows are built
+    assert rows[0].text == 'row 0'
+
+
+def test_recycleview_unknown_viewclass(backend, run_app):
+    rv = RecycleView(viewclass='NoSuchRow', data=[{'text': 'x'}])
+    with pytest.raises(FactoryException, match='NoSuchRow'):
+        run_app(lambda: rv)
@@ -0,0 +1,64 @@
+# test_storage.py
+# JsonStore / DictStore: write-behind flushes, lazy load, teardown
+import json
+
+import connector
+from connector import DictStore, JsonStore
+
+
+class MemoryStorage:
+    """Storage that records each batched write."""
+    name = 'memory'
+
+    def __init__(self, saved=None):
+        self.saved = saved or {}
+        self.writes = []
+
+    def load(self, name, done):
+        done(dict(self.saved))
+
+    def write(self, store, puts, deletes, clear):
+        self.writes.append((dict(puts), list(deletes), clear))
+
+
+def test_puts_are_flushed_once_after_the_debounce(backend, tmp_path):
+    path = tmp_path / 'store.json'
+    store = JsonStore(str(path), debounce=0.1)
+    for i in range(1000):
+        store.put(f'k{i}', n=i)
+    assert not path.exists()   # write-behind
+    backend.step(50)
+    assert not path.exists()
+    backend.step(60)
+    assert store.stats['flushes'] == 1
+    data = json.loads(path.read_text())
+    assert len(data) == 1000 and data['k5'] == {'n': 5}
+
+    store.delete('k1')
+    store.flush()
+    assert 'k1' not in json.loads(path.read_text())
+    assert JsonStore(str(path)).get('k9') == {'n': 9}   # read back lazily
+
+
+def test_flush_sends_one_batch(backend):
+    storage = MemoryStorage({'old': '{"v": 0}'})
+    store = DictStore('db', storage=storage)
+    store.put('a', v=1)
+    store.put('a', v=2)
+    store.delete('old')
+    store.flush()
+    assert storage.writes == [({'a': '{"v": 2}'}, ['old'], False)]
+    store.flush()
+    assert len(storage.writes) == 1   # nothing pending
+
+
+def test_stop_kivy_app_flushes_stores(backend, run_app):
+    storage = MemoryStorage()
+    store = DictStore('db', storage=storage, debounce=10)
+    def build():
+        store.put('score', value=42)
+        return connector.Label(text='store')
+    run_app(build)
+    assert storage.writes == []
+    connector.stop_kivy_app()
+    assert storage.writes == [({'score': '{"value": 42}'}, [], False)]
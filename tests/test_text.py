@@ -0,0 +1,23 @@
+# test_text.py
+# Text metrics cache and Button font fitting
+from connector import BoxLayout, Button, TEXT_METRICS
+
+
+def test_fit_font_shrinks_to_the_width_only(backend):
+    size, width = TEXT_METRICS.fit_font('OK', 200)
+    assert size == 16 and width < 180
+    long = 'a much longer button label'
+    size, width = TEXT_METRICS.fit_font(long, 120)
+    assert 8 <= size < 16 and width <= 100
+    assert TEXT_METRICS.fit_font(long, 120) == (size, width)   # memoized
+    assert TEXT_METRICS.fit_font(long, 10)[0] == 8             # floor
+
+
+def test_short_button_keeps_its_font_size(backend, run_app):
+    def build():
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(Button(text='OK', size_hint_y=None, size=(200, 16)))
+        return root
+    run_app(build)
+    fonts = [op[1] for op in backend.frames[0] if op[0] == 'font']
+    assert '16px sans-serif' in fonts
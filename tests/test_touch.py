@@ -0,0 +1,62 @@
+# test_touch.py
+# Touch dispatch through the hit index
+from connector import BoxLayout, Label
+
+
+def test_parent_calling_super_does_not_repeat_a_child(backend, run_app):
+    log = []
+    class Child(Label):
+        def on_touch_down(self, touch):
+            log.append('child')
+            return False
+    class Parent(BoxLayout):
+        def on_touch_down(self, touch):
+            log.append('parent')
+            return super().on_touch_down(touch)
+    def build():
+        root = Parent()
+        root.add_widget(Child(text='child'))
+        return root
+    run_app(build)
+    backend.click(50, 50)
+    assert log == ['child', 'parent']
+
+
+def test_parent_still_walks_children_outside_the_touch(backend, run_app):
+    log = []
+    class Child(Label):
+        def on_touch_down(self, touch):
+            log.append(self.text)
+            return False
+    class Parent(BoxLayout):
+        def on_touch_down(self, touch):
+            log.append('parent')
+            return super().on_touch_down(touch)
+    def build():
+        root = Parent(orientation='vertical')
+        root.add_widget(Child(text='top'))
+        root.add_widget(Child(text='bottom'))
+        return root
+    root = run_app(build).root
+    top = root.children[0]
+    backend.click(10, top.y + 1)
+    assert log == ['top', 'parent', 'bottom']
+
+
+def test_consumed_touch_stops(backend, run_app):
+    log = []
+    class Child(Label):
+        def on_touch_down(self, touch):
+            log.append('child')
+            return True
+    class Parent(BoxLayout):
+        def on_touch_down(self, touch):
+            log.append('parent')
+            return super().on_touch_down(touch)
+    def build():
+        root = Parent()
+        root.add_widget(Child(text='child'))
+        return root
+    run_app(build)
+    backend.click(50, 50)
+    assert log == ['child']
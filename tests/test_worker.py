@@ -0,0 +1,113 @@
+# test_worker.py
+# Worker-mode input protocol: InputBatch (mirror of input.js) and LoopbackWorker
+import json, shutil, subprocess
+from pathlib import Path
+
+import pytest
+
+import connector
+from connector import BoxLayout, Button, InputBatch, INPUT_RECORD
+
+INPUT_JS = Path(connector.__file__).with_name('input.js')
+
+EVENTS = [
+    ('pointerdown', dict(clientX=10, clientY=20, button=0, pointerId=1, pointerType='mouse')),
+    ('pointermove', dict(clientX=11, clientY=21, pointerId=1, pointerType='mouse')),
+    ('pointermove', dict(clientX=30, clientY=40, pointerId=2, pointerType='touch')),
+    ('pointermove', dict(clientX=12, clientY=22, pointerId=1, pointerType='mouse')),
+    ('pointermove', dict(clientX=31, clientY=41, pointerId=2, pointerType='touch')),
+    ('wheel', dict(clientX=5, clientY=6, deltaY=3, deltaMode=1)),
+    ('keydown', dict(key='a')),
+    ('keydown', dict(key='Enter')),
+    ('keydown', dict(key='Shift')),
+    ('pointerup', dict(clientX=12, clientY=22, button=0, pointerId=1, pointerType='mouse')),
+    ('pointermove', dict(clientX=13, clientY=23, pointerId=1, pointerType='pen')),
+    ('resize', dict(width=640, height=480)),
+]
+
+
+def packed(events):
+    batch = InputBatch()
+    for type, fields in events:
+        batch.push(type, **fields)
+    return batch
+
+
+def test_pack_unpack_round_trip():
+    batch = packed(EVENTS)
+    assert batch.coalesced == 2   # one pending move per pointer
+    data = batch.pack()
+    assert len(data) == 10 * INPUT_RECORD * 8 and batch.pack() == b''
+    events = InputBatch.unpack(data)
+    assert [evt.type for evt in events] == [
+        'pointerdown', 'pointermove', 'pointermove', 'wheel', 'keydown', 'keydown',
+        'keydown', 'pointerup', 'pointermove', 'resize']
+    move1, move2 = events[1], events[2]
+    assert (move1.clientX, move1.clientY, move1.pointerId) == (12, 22, 1)
+    assert (move2.clientX, move2.pointerId, move2.pointerType) == (31, 2, 'touch')
+    assert events[3].deltaY == 48   # lines -> pixels
+    assert [evt.key for evt in events[4:7]] == ['a', 'Enter', 'Unidentified']
+    assert events[8].pointerType == 'pen'   # new move after the pointerup
+    assert (events[9].clientX, events[9].clientY) == (640, 480)
+
+
+def test_extend_coalesces_again():
+    first = packed(EVENTS[1:3]).pack()
+    second = packed(EVENTS[3:5]).pack()
+    inbox = InputBatch()
+    inbox.extend(first)
+    inbox.extend(second)
+    assert len(inbox) == 2 and inbox.coalesced == 2
+    events = InputBatch.unpack(inbox.pack())
+    assert [(evt.clientX, evt.pointerId) for evt in events] == [(12, 1), (31, 2)]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+def test_input_js_packs_the_same_bytes():
+    # input.js's own listeners, fed the same DOM events through a fake target
+    script = """
+    const src = require('fs').readFileSync(process.argv[1], 'utf8');
+    import('data:text/javascript,' + encodeURIComponent(src)).then(({installInput}) => {
+      const handlers = {};
+      const target = {addEventListener: (type, fn) => { handlers[type] = fn; }};
+      globalThis.innerWidth = 0; globalThis.innerHeight = 0;
+      const batch = installInput({}, target);
+      for (const [type, e] of JSON.parse(process.argv[2])) {
+        if (type === 'resize') { innerWidth = e.width; innerHeight = e.height; }
+        handlers[type]({button: 0, deltaMode: 0, ...e});
+      }
+      process.stdout.write(Buffer.from(batch.take()).toString('hex'));
+    });
+    """
+    out = subprocess.run(['node', '-e', script, str(INPUT_JS), json.dumps(EVENTS)],
+                         capture_output=True, text=True, check=True).stdout
+    assert bytes.fromhex(out) == packed(EVENTS).pack()
+
+
+@pytest.fixture
+def backend():
+    backend = connector.set_backend(connector.LoopbackWorker(400, 300))
+    yield backend
+    connector.stop_kivy_app()
+
+
+def test_loopback_worker_dispatches_on_step(backend, run_app):
+    pressed = []
+    def build():
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(Button(text='ok', on_press=lambda *args: pressed.append(1)))
+        return root
+    run_app(build)
+    for x in range(50):
+        backend.page_event('pointermove', clientX=x, clientY=15, pointerId=1)
+    backend.page_event('pointerdown', clientX=50, clientY=15, pointerId=1)
+    backend.page_event('pointerup', clientX=50, clientY=15, pointerId=1)
+    assert pressed == []   # nothing crosses before the next step
+    batches = backend.batches
+    backend.step()
+    assert pressed == [1]
+    assert backend.batches == batches + 1
+    assert backend.page.coalesced == 49
+    backend.page_event('resize', width=320, height=200)
+    backend.run_until_idle()
+    assert backend.window_size() == (320, 200)
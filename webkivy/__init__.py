@@ -0,0 +1,10 @@
+"""
+Build tools for WebKivy apps (run from the repository root).
+
+``python -m webkivy bundle app.py`` builds an offline bundle, see
+``webkivy.bundle``; ``python -m webkivy serve`` runs the reference
+WebSocket server for ``connector.Bridge``, see ``webkivy.server``.
+"""
+from .bundle import BundleError, build_bundle
+
+__all__ = ['BundleError', 'build_bundle']
@@ -0,0 +1,49 @@
+"""Command line: ``python -m webkivy bundle app.py [-o dist] [--single-file]``,
+``python -m webkivy serve [--port 8765] [--app module]``."""
+import argparse
+import sys
+
+from .bundle import PYODIDE_VERSION, BundleError, build_bundle, print_report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m webkivy')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bundle = commands.add_parser('bundle', help='build an offline bundle of an app')
+    bundle.add_argument('app', help="the app's main .py file")
+    bundle.add_argument('-o', '--out', help='output directory (or .html with --single-file)')
+    bundle.add_argument('--single-file', action='store_true',
+                        help='emit one self-contained .html')
+    bundle.add_argument('--pyodide', metavar='DIR',
+                        help='local Pyodide distribution (no download)')
+    bundle.add_argument('--pyodide-version', default=PYODIDE_VERSION)
+    bundle.add_argument('--offline', action='store_true',
+                        help='never download; use --pyodide or the cache only')
+    bundle.add_argument('--no-compile', action='store_true',
+                        help='ship .py sources instead of bytecode')
+
+    serve = commands.add_parser('serve', help='run the reference WebSocket server')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--app', metavar='MODULE',
+                       help='module whose setup(server) registers the handlers (default: demo)')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        from .server import serve as run_server
+        run_server(args.host, args.port, args.app)
+        return 0
+    try:
+        report = build_bundle(args.app, out=args.out, single_file=args.single_file,
+                              pyodide=args.pyodide, version=args.pyodide_version,
+                              compile_bytecode=not args.no_compile, offline=args.offline)
+    except BundleError as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 1
+    print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
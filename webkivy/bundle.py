@@ -0,0 +1,483 @@
+"""
+Offline bundle generator: ``python -m webkivy bundle app.py``.
+
+Produces a directory (or a single ``.html`` with ``--single-file``) that
+runs the app without any network access:
+
+* a vendored Pyodide subset (core runtime + only the packages the app
+  imports, with their dependencies),
+* ``app.zip`` holding the connector, the app and its local modules,
+  compiled to bytecode when the host Python matches Pyodide's,
+  written to the Pyodide FS and put on ``sys.path``,
+* ``drawlist.js``, ``input.js``, ``store.js`` and a small loader that logs the time to first frame
+  (``window.webkivyTTFF``).
+
+Pyodide files come from ``--pyodide DIR`` (an extracted release), else
+from the cache (``$WEBKIVY_CACHE`` or ``~/.cache/webkivy``), downloaded
+from the CDN on first use.
+"""
+import ast
+import base64
+import importlib.util
+import io
+import json
+import marshal
+import os
+import shutil
+import sys
+import urllib.request
+import zipfile
+from pathlib import Path
+
+PYODIDE_VERSION = '0.26.0'
+PYODIDE_CDN = 'https://cdn.jsdelivr.net/pyodide/v{version}/full/'
+PYODIDE_CORE = ('pyodide.mjs', 'pyodide.asm.js', 'pyodide.asm.wasm',
+                'python_stdlib.zip', 'pyodide-lock.json')
+# Provided by the Pyodide runtime itself
+RUNTIME_IMPORTS = frozenset(('js', 'pyodide', 'pyodide_js', '_pyodide'))
+
+CONNECTOR_DIR = Path(__file__).resolve().parent.parent / 'WASM_kivy_connector'
+ZIP_NAME = 'app.zip'
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)   # reproducible archives
+
+# ------------------------------------------------------------
+#  Templates
+# ------------------------------------------------------------
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+  <meta charset="UTF-8">
+  <title>{title}</title>
+  <style>
+    body, html {{ margin: 0; padding: 0; height: 100%; overflow: hidden; }}
+    #kivy-canvas {{ display: block; touch-action: none; }}
+  </style>
+</head>
+<body>
+  <canvas id="kivy-canvas"></canvas>
+{scripts}
+</body>
+</html>
+"""
+
+# Shared by both layouts; {imports} provides loadPyodide, installDrawList,
+# mountCache, installInput, installStore, appZip (a promise of bytes) and INDEX_URL.
+LOADER_TEMPLATE = """// Generated by `python -m webkivy bundle` - do not edit.
+const t0 = performance.now();
+const marks = {{}};
+{imports}
+async function main() {{
+  try {{
+    const pyodide = await loadPyodide({{ indexURL: INDEX_URL }});
+    marks.pyodide = performance.now() - t0;
+    const packages = {packages};
+    if (packages.length) {{
+      await pyodide.loadPackage(packages);
+      marks.packages = performance.now() - t0;
+    }}
+    const canvasEl = document.getElementById('kivy-canvas');
+    installDrawList(() => canvasEl.getContext('2d'));
+    installInput();
+    installStore();
+    globalThis.webkivyFirstFrame = () => {{
+      marks.first_frame = performance.now() - t0;
+      globalThis.webkivyTTFF = marks;
+      console.log(`webkivy: first frame after ${{marks.first_frame.toFixed(0)}} ms`, marks);
+    }};
+    await mountCache(pyodide);
+    pyodide.FS.mkdirTree('/webkivy');
+    pyodide.FS.writeFile('/webkivy/{zip_name}', await appZip);
+    marks.app_zip = performance.now() - t0;
+    await pyodide.runPythonAsync(`
+import sys, runpy
+sys.path.insert(0, '/webkivy/{zip_name}')
+runpy.run_module({app_module!r}, run_name='__main__', alter_sys=True)
+`);
+  }} catch (err) {{
+    console.error('webkivy:', err);
+  }}
+}}
+
+main();
+"""
+
+DIR_IMPORTS = """import { loadPyodide } from './pyodide/pyodide.mjs';
+import { installDrawList } from './drawlist.js';
+import { installInput } from './input.js';
+import { installStore, mountCache } from './store.js';
+const INDEX_URL = new URL('./pyodide/', import.meta.url).href;
+const appZip = fetch('./%s').then(r => r.arrayBuffer()).then(b => new Uint8Array(b));
+""" % ZIP_NAME
+
+# Single file: every asset is base64 in a JSON script tag; Pyodide's own
+# fetches under INDEX_URL are answered from it.
+SINGLE_IMPORTS = """const assets = JSON.parse(document.getElementById('webkivy-assets').textContent);
+const decoded = new Map();
+function bytes(name) {
+  let data = decoded.get(name);
+  if (!data) {
+    const bin = atob(assets[name]);
+    data = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) data[i] = bin.charCodeAt(i);
+    decoded.set(name, data);
+  }
+  return data;
+}
+const blobURL = (name, type) => URL.createObjectURL(new Blob([bytes(name)], { type }));
+const INDEX_URL = new URL('./pyodide/', location.href).href;
+const realFetch = globalThis.fetch.bind(globalThis);
+globalThis.fetch = (input, init) => {
+  const url = new URL(typeof input === 'string' ? input : input.url, location.href).href;
+  const name = url.startsWith(INDEX_URL) ? 'pyodide/' + url.slice(INDEX_URL.length) : null;
+  if (name && name in assets) {
+    const type = name.endsWith('.wasm') ? 'application/wasm' : 'application/octet-stream';
+    return Promise.resolve(new Response(bytes(name), { headers: { 'Content-Type': type } }));
+  }
+  return realFetch(input, init);
+};
+// pyodide.asm.js defines _createPyodideModule; loadPyodide then skips its own load
+await new Promise((resolve, reject) => {
+  const script = document.createElement('script');
+  script.src = blobURL('pyodide/pyodide.asm.js', 'text/javascript');
+  script.onload = resolve;
+  script.onerror = reject;
+  document.head.appendChild(script);
+});
+const { loadPyodide } = await import(blobURL('pyodide/pyodide.mjs', 'text/javascript'));
+const { installDrawList } = await import(blobURL('drawlist.js', 'text/javascript'));
+const { installInput } = await import(blobURL('input.js', 'text/javascript'));
+const { installStore, mountCache } = await import(blobURL('store.js', 'text/javascript'));
+const appZip = Promise.resolve(bytes('%s'));
+""" % ZIP_NAME
+
+
+class BundleError(Exception):
+    """Raised when a bundle cannot be built (missing files, bad input)."""
+
+
+# ------------------------------------------------------------
+#  Pyodide distribution
+# ------------------------------------------------------------
+def cache_dir():
+    return Path(os.environ.get('WEBKIVY_CACHE') or Path.home() / '.cache' / 'webkivy')
+
+
+class PyodideDist:
+    """A Pyodide release: a local directory, filled from the CDN on demand."""
+
+    def __init__(self, path=None, version=PYODIDE_VERSION, cdn=PYODIDE_CDN, offline=False):
+        self.version = version
+        self.local = Path(path) if path else None
+        self.cache = cache_dir() / f'pyodide-{version}'
+        self.base_url = cdn.format(version=version)
+        self.offline = offline or self.local is not None
+        self._lock = None
+
+    def fetch(self, name):
+        """Path of ``name`` in the distribution, downloading it if needed."""
+        for root in (self.local, self.cache):
+            if root is not None and (root / name).is_file():
+                return root / name
+        if self.offline:
+            where = self.local or self.cache
+            raise BundleError(f'{name} not found in {where}')
+        target = self.cache / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        url = self.base_url + name
+        print(f'downloading {url}', file=sys.stderr)
+        tmp = target.with_suffix(target.suffix + '.part')
+        try:
+            with urllib.request.urlopen(url) as response, open(tmp, 'wb') as out:
+                shutil.copyfileobj(response, out)
+        except OSError as exc:
+            raise BundleError(f'cannot download {url}: {exc}') from exc
+        tmp.replace(target)
+        return target
+
+    @property
+    def lock(self):
+        if self._lock is None:
+            self._lock = json.loads(self.fetch('pyodide-lock.json').read_text('utf-8'))
+        return self._lock
+
+    @property
+    def python_version(self):
+        """(major, minor) of the Pyodide interpreter, or None if unknown."""
+        version = self.lock.get('info', {}).get('python')
+        if not version:
+            return None
+        return tuple(int(part) for part in version.split('.')[:2])
+
+    def resolve_packages(self, imports):
+        """Pyodide packages providing ``imports``, plus their dependencies.
+
+        Returns ``(packages, unresolved)``; stdlib and runtime modules are
+        not reported as unresolved.
+        """
+        packages = self.lock.get('packages', {})
+        by_import = {}
+        for name, info in packages.items():
+            for imported in info.get('imports', ()):
+                by_import.setdefault(imported, name)
+        wanted, unresolved = set(), []
+        for module in sorted(imports):
+            if module in by_import:
+                wanted.add(by_import[module])
+            elif module not in sys.stdlib_module_names and module not in RUNTIME_IMPORTS:
+                unresolved.append(module)
+        closure, stack = set(), list(wanted)
+        while stack:
+            name = stack.pop()
+            if name in closure:
+                continue
+            closure.add(name)
+            stack.extend(packages.get(name, {}).get('depends', ()))
+        return sorted(closure), unresolved
+
+    def trimmed_lock(self, names):
+        lock = dict(self.lock)
+        packages = self.lock.get('packages', {})
+        lock['packages'] = {name: packages[name] for name in names if name in packages}
+        return lock
+
+
+# ------------------------------------------------------------
+#  Application sources
+# ------------------------------------------------------------
+def _top_level_imports(source, filename):
+    """Absolute top-level module names imported by ``source``."""
+    tree = ast.parse(source, filename)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def runtime_modules():
+    """(archive name, path) of the connector runtime shipped in every bundle."""
+    return [('connector.py', CONNECTOR_DIR / 'connector.py'),
+            ('wire.py', CONNECTOR_DIR / 'wire.py')]
+
+
+def served_modules():
+    """Top-level packages the connector serves itself (``kivy``, ``kivymd``).
+
+    Read from ``_KIVY_MODULES`` in connector.py, without importing it.
+    """
+    source = (CONNECTOR_DIR / 'connector.py').read_bytes()
+    for node in ast.parse(source, 'connector.py').body:
+        if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Dict)
+                and any(isinstance(t, ast.Name) and t.id == '_KIVY_MODULES'
+                        for t in node.targets)):
+            return {key.value.split('.')[0] for key in node.value.keys
+                    if isinstance(key, ast.Constant) and isinstance(key.value, str)}
+    return set()
+
+
+def collect_sources(app_path):
+    """
+    Files for ``app.zip`` and the third-party imports they need.
+
+    Walks the imports of the app and, recursively, of the modules or
+    packages found next to it.  Returns ``(files, imports)`` with
+    ``files`` a list of ``(archive name, path)``.
+    """
+    app_path = Path(app_path).resolve()
+    base = app_path.parent
+    files = dict(runtime_modules())
+    provided = {name.split('/')[0].rsplit('.', 1)[0] for name in files}
+    provided |= served_modules()
+    imports = set()
+    pending = [(app_path.name, app_path)]
+    seen = set()
+    while pending:
+        arcname, path = pending.pop()
+        if arcname in seen:
+            continue
+        seen.add(arcname)
+        files.setdefault(arcname, path)
+        for module in _top_level_imports(path.read_bytes(), str(path)):
+            if module in provided:
+                continue
+            if (base / f'{module}.py').is_file():
+                pending.append((f'{module}.py', base / f'{module}.py'))
+            elif (base / module / '__init__.py').is_file():
+                for sub in sorted((base / module).rglob('*.py')):
+                    pending.append((sub.relative_to(base).as_posix(), sub))
+            else:
+                imports.add(module)
+    # Third-party imports of the runtime itself (none today)
+    for arcname, path in runtime_modules():
+        imports |= _top_level_imports(path.read_bytes(), str(path)) - provided
+    return sorted(files.items()), imports
+
+
+def _pyc_bytes(source, filename):
+    """Unchecked hash-based .pyc (PEP 552): reproducible, no mtime."""
+    code = compile(source, filename, 'exec', dont_inherit=True)
+    data = bytearray(importlib.util.MAGIC_NUMBER)
+    data += (0b01).to_bytes(4, 'little')
+    data += importlib.util.source_hash(source)
+    data += marshal.dumps(code)
+    return bytes(data)
+
+
+def build_app_zip(files, compile_bytecode):
+    """Deterministic zip of the sources (or their bytecode)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for arcname, path in files:
+            source = Path(path).read_bytes()
+            if compile_bytecode:
+                data = _pyc_bytes(source, f'/webkivy/{ZIP_NAME}/{arcname}')
+                arcname += 'c'
+            else:
+                data = source
+            info = zipfile.ZipInfo(arcname, ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+    return buffer.getvalue()
+
+
+# ------------------------------------------------------------
+#  Bundle
+# ------------------------------------------------------------
+def _format_size(size):
+    for unit in ('B', 'kB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def _prepare_out_dir(out, protected, sources=()):
+    """
+    Empty ``out`` for a new bundle.  Only a directory left by a previous
+    build (it holds ``webkivy-report.json``) is replaced.  No ``protected``
+    path (the app, the connector) may be in it, and it may be neither in
+    nor around the ``sources`` directories (Pyodide).
+    """
+    out = out.resolve()
+    for path in list(protected) + list(sources):
+        path = path.resolve()
+        if path == out or out in path.parents:
+            raise BundleError(f'output {out} contains {path}')
+    for path in sources:
+        if path.resolve() in out.parents:
+            raise BundleError(f'output {out} is inside {path}')
+    if not out.exists():
+        return
+    if not out.is_dir():
+        raise BundleError(f'output {out} is not a directory')
+    if any(out.iterdir()):
+        if not (out / 'webkivy-report.json').is_file():
+            raise BundleError(f'output {out} is not empty and was not made by webkivy bundle')
+        shutil.rmtree(out)
+
+
+def build_bundle(app, out=None, single_file=False, pyodide=None,
+                 version=PYODIDE_VERSION, compile_bytecode=True, offline=False):
+    """
+    Build the offline bundle for ``app`` (path to the app's main .py).
+
+    Returns a report dict (sizes per asset, packages, bytecode flag),
+    also written as ``webkivy-report.json`` next to the output.
+    """
+    app = Path(app)
+    if not app.is_file():
+        raise BundleError(f'{app} not found')
+    dist = PyodideDist(pyodide, version=version, offline=offline)
+    files, imports = collect_sources(app)
+    packages, unresolved = dist.resolve_packages(imports)
+
+    py_version = dist.python_version
+    use_bytecode = compile_bytecode and py_version == sys.version_info[:2]
+    notes = []
+    if compile_bytecode and not use_bytecode:
+        notes.append(f'bytecode skipped: host Python {sys.version_info[0]}.{sys.version_info[1]}'
+                     f' != Pyodide {".".join(map(str, py_version or ("?",)))}, shipping sources')
+    if unresolved:
+        notes.append('not provided by Pyodide: ' + ', '.join(unresolved))
+
+    assets = {}   # bundle-relative name -> bytes
+    for name in PYODIDE_CORE:
+        if name == 'pyodide-lock.json':
+            continue
+        assets[f'pyodide/{name}'] = dist.fetch(name).read_bytes()
+    assets['pyodide/pyodide-lock.json'] = json.dumps(dist.trimmed_lock(packages)).encode('utf-8')
+    for name in packages:
+        file_name = dist.lock['packages'][name]['file_name']
+        assets[f'pyodide/{file_name}'] = dist.fetch(file_name).read_bytes()
+    assets[ZIP_NAME] = build_app_zip(files, use_bytecode)
+    for name in ('drawlist.js', 'input.js', 'store.js'):
+        assets[name] = (CONNECTOR_DIR / name).read_bytes()
+
+    loader_args = dict(packages=json.dumps(packages), zip_name=ZIP_NAME,
+                       app_module=app.stem)
+    title = f'{app.stem} - WebKivy'
+    if single_file:
+        out = Path(out) if out else Path('dist') / f'{app.stem}.html'
+        if out.is_dir() or out.resolve() == app.resolve():
+            raise BundleError(f'output {out} must be a new or generated .html file')
+        loader = LOADER_TEMPLATE.format(imports=SINGLE_IMPORTS, **loader_args)
+        blob = json.dumps({name: base64.b64encode(data).decode('ascii')
+                           for name, data in assets.items()})
+        scripts = ('  <script type="application/json" id="webkivy-assets">'
+                   + blob + '</script>\n'
+                   + '  <script type="module">\n' + loader.replace('</script', '<\\/script')
+                   + '  </script>')
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(HTML_TEMPLATE.format(title=title, scripts=scripts), 'utf-8')
+        written = {out.name: out.stat().st_size}
+        report_path = out.with_name('webkivy-report.json')
+    else:
+        out = Path(out) if out else Path('dist')
+        sources = [dist.cache] + ([dist.local] if dist.local is not None else [])
+        _prepare_out_dir(out, [app, CONNECTOR_DIR], sources)
+        assets['loader.js'] = LOADER_TEMPLATE.format(imports=DIR_IMPORTS, **loader_args).encode('utf-8')
+        assets['index.html'] = HTML_TEMPLATE.format(
+            title=title, scripts='  <script type="module" src="loader.js"></script>').encode('utf-8')
+        for name, data in assets.items():
+            target = out / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+        written = {name: len(data) for name, data in assets.items()}
+        report_path = out / 'webkivy-report.json'
+
+    report = {
+        'output': str(out),
+        'single_file': single_file,
+        'pyodide': version,
+        'packages': packages,
+        'bytecode': use_bytecode,
+        'modules': [name for name, _ in files],
+        'assets': {name: len(data) for name, data in assets.items()},
+        'total': sum(written.values()),
+        'notes': notes,
+    }
+    report_path.write_text(json.dumps(report, indent=2), 'utf-8')
+    return report
+
+
+def print_report(report, file=sys.stdout):
+    print(f"bundle: {report['output']}", file=file)
+    assets = report['assets']
+    groups = (
+        ('pyodide core', [n for n in assets if n.startswith('pyodide/')
+                          and n[len('pyodide/'):] in PYODIDE_CORE]),
+        (f"packages ({len(report['packages'])})",
+         [n for n in assets if n.startswith('pyodide/')
+          and n[len('pyodide/'):] not in PYODIDE_CORE]),
+        (ZIP_NAME + (' (bytecode)' if report['bytecode'] else ' (sources)'), [ZIP_NAME]),
+        ('loader + JS runtime', [n for n in assets if not n.startswith('pyodide/')
+                                  and n != ZIP_NAME]),
+    )
+    for label, names in groups:
+        print(f'  {label:<28}{_format_size(sum(assets[n] for n in names)):>10}', file=file)
+    print(f"  {'total on disk':<28}{_format_size(report['total']):>10}", file=file)
+    for note in report['notes']:
+        print(f'  note: {note}', file=file)
+    print('Time to first frame is logged in the browser console '
+          '(window.webkivyTTFF).', file=file)
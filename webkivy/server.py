@@ -0,0 +1,253 @@
+"""
+Reference WebSocket server for ``connector.Bridge``: ``python -m webkivy serve``.
+
+Plain asyncio (standard library only), speaking the ``wire`` protocol of
+``WASM_kivy_connector/wire.py``:
+
+* ``@server.rpc`` registers functions (sync or ``async``) callable with
+  ``bridge.call(name, *args)``;
+* ``server.publish(topic, value)`` / ``server.subscribe(topic, fn)``:
+  pub/sub, client publications are relayed to the other subscribers;
+* ``server.state(topic, initial)`` / ``server.update(topic, ...)``:
+  shared states, sent once as a snapshot then as deltas.
+
+Messages for a client are batched per event-loop iteration, like on the
+client side.  ``--app module`` imports a module whose ``setup(server)``
+registers the handlers; without it a small demo is served.
+"""
+import asyncio
+import copy
+import importlib
+import importlib.util
+import inspect
+import sys
+import time
+
+from .bundle import CONNECTOR_DIR
+
+
+def _load_wire():
+    """The connector's ``wire`` module (one codec for both sides)."""
+    module = sys.modules.get('wire')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('wire', CONNECTOR_DIR / 'wire.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules['wire'] = module
+    return module
+
+wire = _load_wire()
+
+
+class Connection:
+    """One client: its subscriptions and its outgoing batch."""
+
+    def __init__(self, server, writer):
+        self.server, self.writer = server, writer
+        self.topics = set()
+        self.peer = writer.get_extra_info('peername')
+        self._outbox = []
+
+    def send(self, message):
+        if not self._outbox:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self._outbox.append(message)
+
+    def flush(self):
+        if not self._outbox or self.writer.is_closing():
+            self._outbox = []
+            return
+        batch, self._outbox = self._outbox, []
+        self.writer.write(wire.ws_frame(wire.pack_batch(batch)))
+
+
+class Server:
+    def __init__(self):
+        self.methods = {}        # name -> callable
+        self.states = {}         # topic -> [version, data]
+        self.subscribers = {}    # topic -> set of Connection
+        self.hooks = {}          # topic -> [fn(topic, value, connection)]
+        self.connections = set()
+
+    # --- API -------------------------------------------------------------
+    def rpc(self, fn=None, *, name=None):
+        """Decorator: expose ``fn`` to ``bridge.call()``."""
+        def register(fn):
+            self.methods[name or fn.__name__] = fn
+            return fn
+        return register(fn) if fn is not None else register
+
+    def subscribe(self, topic, fn):
+        """``fn(topic, value, connection)`` for each value a client publishes."""
+        self.hooks.setdefault(topic, []).append(fn)
+
+    def publish(self, topic, value, exclude=None):
+        for conn in self.subscribers.get(topic, ()):
+            if conn is not exclude:
+                conn.send([wire.PUB, topic, value])
+
+    def state(self, topic, initial=None):
+        """The data of state ``topic`` (created with ``initial``); do not mutate it."""
+        if topic not in self.states:
+            self.states[topic] = [0, copy.deepcopy(initial or {})]
+        return self.states[topic][1]
+
+    def update(self, topic, changes=None, **kwargs):
+        """Change state ``topic``; subscribers get the delta only."""
+        data = self.state(topic)
+        new = dict(data)
+        new.update(changes or (), **kwargs)
+        self._apply(topic, wire.diff(data, copy.deepcopy(new)))
+
+    def _apply(self, topic, ops):
+        entry = self.states.setdefault(topic, [0, {}])
+        # The ops go out later (batched): the state must not share objects with them
+        if not ops or not wire.patch(entry[1], copy.deepcopy(ops)):
+            return
+        entry[0] += 1
+        message = [wire.DELTA, topic, entry[0], ops]
+        for conn in self.subscribers.get(topic, ()):
+            conn.send(message)
+
+    # --- protocole ---------------------------------------------------------
+    async def _handshake(self, reader, writer):
+        head = await reader.readuntil(b'\r\n\r\n')
+        headers = {}
+        for line in head.decode('latin-1').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if key is None or 'websocket' not in headers.get('upgrade', '').lower():
+            writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return False
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                      'Connection: Upgrade\r\n'
+                      f'Sec-WebSocket-Accept: {wire.ws_accept(key)}\r\n\r\n').encode('ascii'))
+        return True
+
+    async def handle(self, reader, writer):
+        conn = None
+        try:
+            if not await self._handshake(reader, writer):
+                return
+            conn = Connection(self, writer)
+            self.connections.add(conn)
+            frames = wire.FrameReader()
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for opcode, payload in frames.feed(data):
+                    if opcode == wire.OP_BINARY:
+                        self._dispatch(conn, payload)
+                    elif opcode == wire.OP_PING:
+                        writer.write(wire.ws_frame(payload, wire.OP_PONG))
+                    elif opcode == wire.OP_CLOSE:
+                        writer.write(wire.ws_frame(payload[:2], wire.OP_CLOSE))
+                        return
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            if conn is not None:
+                self.connections.discard(conn)
+                for topic in conn.topics:
+                    self.subscribers.get(topic, set()).discard(conn)
+            writer.close()
+
+    def _dispatch(self, conn, payload):
+        try:
+            batch = wire.unpack_batch(payload)
+        except ValueError as exc:
+            print(f'webkivy serve: bad message from {conn.peer}: {exc}', file=sys.stderr)
+            return
+        for message in batch:
+            kind = message[0]
+            if kind == wire.CALL:
+                self._call(conn, *message[1:4])
+            elif kind == wire.SUB:
+                topic = message[1]
+                conn.topics.add(topic)
+                self.subscribers.setdefault(topic, set()).add(conn)
+                if topic in self.states:
+                    version, data = self.states[topic]
+                    conn.send([wire.STATE, topic, version, copy.deepcopy(data)])
+            elif kind == wire.UNSUB:
+                conn.topics.discard(message[1])
+                self.subscribers.get(message[1], set()).discard(conn)
+            elif kind == wire.PUB:
+                self.publish(message[1], message[2], exclude=conn)
+                for fn in self.hooks.get(message[1], ()):
+                    fn(message[1], message[2], conn)
+            elif kind == wire.SET:
+                self._apply(message[1], message[2])
+
+    def _call(self, conn, call_id, method, args):
+        fn = self.methods.get(method)
+        if fn is None:
+            conn.send([wire.ERROR, call_id, f'unknown method {method!r}'])
+            return
+        try:
+            result = fn(*args)
+        except Exception as exc:
+            conn.send([wire.ERROR, call_id, f'{type(exc).__name__}: {exc}'])
+            return
+        if inspect.isawaitable(result):
+            async def finish():
+                try:
+                    conn.send([wire.RESULT, call_id, await result])
+                except Exception as exc:
+                    conn.send([wire.ERROR, call_id, f'{type(exc).__name__}: {exc}'])
+            asyncio.ensure_future(finish())
+        else:
+            conn.send([wire.RESULT, call_id, result])
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        """Start listening; returns the ``asyncio.Server``."""
+        return await asyncio.start_server(self.handle, host, port)
+
+    def run(self, host='127.0.0.1', port=8765, setup=None):
+        async def main():
+            server = await self.serve(host, port)
+            if setup is not None:
+                await setup(self)
+            print(f'webkivy serve: ws://{host}:{port}/')
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+
+
+def demo(server):
+    """Built-in demo: ``echo`` / ``add`` RPCs and a ``clock`` state ticking every second."""
+    server.rpc(lambda *args: list(args), name='echo')
+    server.rpc(lambda a, b: a + b, name='add')
+    server.state('clock', {'time': time.strftime('%H:%M:%S'), 'ticks': 0})
+
+    async def tick():
+        while True:
+            await asyncio.sleep(1)
+            server.update('clock', time=time.strftime('%H:%M:%S'),
+                          ticks=server.state('clock')['ticks'] + 1)
+
+    async def start(_):
+        asyncio.ensure_future(tick())
+    return start
+
+
+def serve(host='127.0.0.1', port=8765, app=None):
+    """``python -m webkivy serve``: ``app`` is a module with ``setup(server)``.
+
+    ``setup`` may return an async function, awaited once the server
+    listens (background tasks).
+    """
+    server = Server()
+    if app is not None:
+        sys.path.insert(0, '.')
+        result = importlib.import_module(app).setup(server)
+    else:
+        result = demo(server)
+    server.run(host, port, setup=result if callable(result) else None)
+    return server